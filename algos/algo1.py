@@ -1,36 +1,86 @@
 import concurrent.futures
 import logging
 import math
-import numpy
-import pandas as pd
 import time
 import datetime
 import statistics
 
+from data.minute_bars import MinuteBarArchive
+from .pipeline import PreOpenScreen
+from .rebalance import Rebalancer, weightsFromSignals
+from .signals import BarPanel, SignalEngine
+
+logger = logging.getLogger(__name__)
+
 class PennyAlgo(object):
     
-    def __init__(self, api):
+    def __init__(self, api, bars=None):
         """Return a new PennyAlgo object."""
         self.api = api
+        # Minute bars for the candidates, filled ahead of each trade window.
+        self.bars = bars or MinuteBarArchive()
         self.BuyFactor = .99
         self.SellFactor = 1.01
+        self.MinPrice = 1.00
+        self.MaxPrice = 5.00
         self.NY = 'America/New_York'
+        self.MaxPositions = 10
+        self.SignalWindow = 120
+        self.rebalancer = Rebalancer(self.BuyFactor, self.SellFactor)
+        self.signals = SignalEngine()
 
     def update_data(self, data=None):
         '''Updates position age and trading clock.'''
-        print('ran update_data')
-        return data.requestClock()
+        logger.info('ran update_data')
+        # The governor decides whether the clock, orders and positions are stale enough to refetch.
+        data.poll()
+        return data.clock
         
     def get_and_filter_candidate_stocks(self, data=None):
         '''Filters stocks based on price'''
-        print('ran get_and_filter_candidate_stocks')
-        return []
+        logger.info('ran get_and_filter_candidate_stocks')
+        # Cross-reference, price and SMA checks overlap instead of running one after another.
+        # Symbols reporting earnings before the next trading day are left out.
+        result = PreOpenScreen.fromData(data).run(self.MinPrice, self.MaxPrice, exclude_reporting=True)
+        # The screen read today's sources, so later phases work from the same universe.
+        data.assets = result.assets
+        data.polygon_symbols = result.polygon_symbols
+        data.earnings = result.earnings
+        data.earnings_table = data.buildEarningsTable()
+        return result.candidates
+
+    def candidate_symbols(self, data=None):
+        return [asset.symbol for asset in getattr(data, 'candidates', None) or []]
+
+    def prefetch_data(self, data=None):
+        '''Refreshes orders, positions, prices and the candidates' minute bars just ahead of a trade window.'''
+        data.applyOrders(data.requestOrders())
+        data.snapshots.refresh()
+        data.updatePositions(refresh_orders=False)
+        data.reconcileAccount()
+        self.bars.fillMany(self.api, self.candidate_symbols(data), end=data.clock.timestamp.date())
 
     def trade_stocks(self, data=None):
-        print('ran trade_stocks')
-        pass
+        '''
+        Ranks the candidates on their intraday signals and rebalances into the best
+        MaxPositions, weighted by score.  Held symbols that drop out are sold.
+        Returns the (PlannedOrder, order or exception) pairs submitted.
+        '''
+        logger.info('ran trade_stocks')
+        symbols = self.candidate_symbols(data)
+        if(not symbols):
+            # No screen ran today; leave the positions alone.
+            return []
+        panel = BarPanel.fromArchive(self.bars, symbols, window=self.SignalWindow)
+        ranked = self.signals.rank(panel)[:self.MaxPositions]
+        weights = weightsFromSignals(ranked['score'])
+        plan = self.rebalancer.planFor(data, list(ranked['symbol']), weights).approved(data.risk)
+        logger.info('Rebalance: %s', plan)
+        # One batch per trade window, so a retried window does not place its orders twice.
+        batch = data.clock.timestamp.strftime('%Y-%m-%dT%H')
+        return plan.submit(self.api, data.risk, tracer=data.tracer, strategy='penny', batch=batch)
 
     
     def close_specifics(self, data=None):
-        print('ran close_specifics')
+        logger.info('ran close_specifics')
         pass
\ No newline at end of file
@@ -0,0 +1,277 @@
+'''
+Pipelined pre-open screen.
+
+The sequential screen waits for each step to finish for every symbol before the next
+one starts: the Polygon pager, then the Alpaca cross-reference, then a price request per
+survivor, then an aggregate request per survivor for the SMA check.  Here each step is a
+Stage with its own worker threads, joined by bounded queues, so symbols from the first
+Polygon page are already being priced while later pages download.  The earnings scrape
+runs alongside on its own threads, one request per day.  End-to-end time approaches the
+slowest stage instead of the sum of all of them.
+
+    result = PreOpenScreen.fromData(data).run(min_price=1.0, max_price=5.0)
+    data.candidates = result.candidates
+'''
+import concurrent.futures
+import datetime
+import logging
+import queue
+import threading
+import time
+
+from data.alpaca_data import Clock
+from data.convert import earningsWindow, toAsset, toEarningsDate, toPolygonSymbol
+from data.earnings_table import EarningsTable
+
+logger = logging.getLogger(__name__)
+
+# Passed down the queues once per downstream worker when a stage has finished.
+_DONE = object()
+
+
+class Stage(object):
+    '''
+    One step of a Pipeline.  `function(item)` returns an iterable of items for the next
+    stage (or None), and runs on `workers` threads reading a queue of at most
+    `queue_size` items, so a fast producer blocks instead of buffering everything.
+    '''
+    def __init__(self, name, function, workers=1, queue_size=100):
+        """Return a new Stage object."""
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return '{}: {} in, {} out, {} errors, {:.2f}s busy over {} workers'.format(
+            self.name, self.processed, self.emitted, self.errors, self.busy, self.workers)
+
+
+class Pipeline(object):
+
+    def __init__(self, stages):
+        """Return a new Pipeline object."""
+        self.stages = stages
+        self.elapsed = None
+
+    def _work(self, stage, inbox, outbox, downstream_workers, finished):
+        while True:
+            item = inbox.get()
+            if(item is _DONE):
+                break
+            started = time.perf_counter()
+            try:
+                outputs = list(stage.function(item) or [])
+            except Exception as exc:
+                logger.warning('%s generated an exception: %s', stage.name, exc)
+                with stage.lock:
+                    stage.errors += 1
+                outputs = []
+            for output in outputs:
+                outbox.put(output)
+            with stage.lock:
+                stage.processed += 1
+                stage.emitted += len(outputs)
+                stage.busy += time.perf_counter() - started
+        with stage.lock:
+            finished[stage.name] += 1
+            last = finished[stage.name] == stage.workers
+        if(last):
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+    def _feed(self, source, outbox, workers):
+        try:
+            for item in source:
+                outbox.put(item)
+        except Exception as exc:
+            logger.warning('Pipeline source generated an exception: %s', exc)
+        finally:
+            for _ in range(workers):
+                outbox.put(_DONE)
+
+    def run(self, source):
+        '''Runs every item of `source` through the stages; returns the last stage's outputs.'''
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        # The sink is drained only at the end, so it must not block the last stage.
+        queues.append(queue.Queue())
+        finished = {stage.name: 0 for stage in self.stages}
+        threads = [threading.Thread(
+            target=self._feed, args=(source, queues[0], self.stages[0].workers), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            downstream = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, args=(stage, queues[i], queues[i + 1], downstream, finished), daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = []
+        while True:
+            item = queues[-1].get()
+            if(item is _DONE):
+                break
+            results.append(item)
+        self.elapsed = time.perf_counter() - started
+        return results
+
+
+class ScreenResult(object):
+
+    def __init__(self, candidates, polygon_symbols, earnings, stages, elapsed, assets=None):
+        """Return a new ScreenResult object."""
+        self.candidates = candidates
+        self.polygon_symbols = polygon_symbols
+        self.assets = assets
+        self.earnings = earnings
+        self.stages = stages
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return '{} candidates from {} symbols in {:.2f}s; {}'.format(
+            len(self.candidates), len(self.polygon_symbols), self.elapsed, '; '.join(str(stage) for stage in self.stages))
+
+
+class PreOpenScreen(object):
+    '''
+    The pre-open screen as a pipeline: Polygon symbol pages -> Alpaca cross-reference ->
+    price range -> SMA check, with the asset list and the earnings scrape fetched in the
+    background.  Anything passed in (assets, polygon_symbols, earnings) is used instead
+    of fetched; `request_assets` replaces the plain list_assets call.
+    '''
+    def __init__(
+        self,
+        api,
+        filter,
+        assets=None,
+        polygon_symbols=None,
+        earnings_calendar=None,
+        earnings=None,
+        request_assets=None,
+        price_workers=4,
+        sma_workers=8,
+        batch_size=50,
+        queue_size=20):
+        """Return a new PreOpenScreen object."""
+        self.api = api
+        self.filter = filter
+        self.assets = assets
+        self.polygon_symbols = polygon_symbols
+        self.earnings_calendar = earnings_calendar
+        self.earnings = earnings
+        self.request_assets = request_assets
+        self.price_workers = price_workers
+        self.sma_workers = sma_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._assets = None
+        self._assets_future = None
+
+    @classmethod
+    def fromData(cls, data, **kwargs):
+        '''
+        A screen over today's sources: Polygon symbols streamed page by page, assets
+        through the Data object's cache and a fresh earnings scrape, rather than the
+        lists Data loaded at start-up.
+        '''
+        return cls(
+            data.api,
+            data.filter,
+            earnings_calendar=getattr(data, 'earnings_calendar', None),
+            request_assets=getattr(data, 'requestAssets', None),
+            **kwargs)
+
+    def pages(self, collected, SORT='symbol', TYPE='cs', PER_PAGE=50, ISOTC='false'):
+        '''Batches of PolygonSymbols as the pager returns them (same query as Data).'''
+        if(self.polygon_symbols != None):
+            for i in range(0, len(self.polygon_symbols), self.batch_size):
+                batch = self.polygon_symbols[i:i + self.batch_size]
+                collected.extend(batch)
+                yield batch
+            return
+        page = 1
+        while True:
+            partialData = self.api.polygon.get(
+                path='/meta/symbols',
+                params={'sort': SORT, 'type': TYPE, 'perpage': PER_PAGE, 'page': page, 'isOTC': ISOTC})
+            batch = [toPolygonSymbol(partial) for partial in partialData['symbols']]
+            collected.extend(batch)
+            yield batch
+            if(len(partialData['symbols']) < PER_PAGE):
+                return
+            page += 1
+
+    def _requestAssets(self):
+        if(self.assets != None):
+            return self.assets
+        if(self.request_assets != None):
+            return self.request_assets()
+        return [toAsset(asset) for asset in self.api.list_assets(status='active')]
+
+    def _requestEarnings(self):
+        '''The same window as Data.requestEarnings, one scrape per day in parallel.'''
+        if(self.earnings != None or self.earnings_calendar == None):
+            return self.earnings or []
+        date_from, date_to = earningsWindow(Clock.now('America/New_York'))
+        days = [
+            (date_from + datetime.timedelta(days=offset)).date()
+            for offset in range((date_to.date() - date_from.date()).days + 1)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(days)) as executor:
+            results = list(executor.map(self._earningsOn, days))
+        return [toEarningsDate(ed) for day in results for ed in day]
+
+    def _earningsOn(self, day):
+        try:
+            return self.earnings_calendar.earnings_between(day, day)
+        except Exception as exc:
+            logger.warning('Earnings scrape for %s generated an exception: %s', day, exc)
+            return []
+
+    def crossReference(self, batch):
+        '''Alpaca assets for the batch's Polygon symbols, passed on as one batch.'''
+        if(self._assets == None):
+            # Only blocks if the first Polygon page beats the asset download.
+            self._assets = {asset.symbol: asset for asset in self._assets_future.result()}
+        assets = [self._assets[symbol.symbol] for symbol in batch if symbol.symbol in self._assets]
+        return [assets] if assets else []
+
+    def priceRange(self, assets, min_price, max_price):
+        snapshots = self.filter.snapshots
+        if(snapshots != None):
+            # Price just this batch, so the filter does not refresh the whole market per worker.
+            snapshots.refresh([asset.symbol for asset in assets])
+        return self.filter.filterPriceRange(assets, min_price, max_price)
+
+    def sma(self, asset):
+        return self.filter.filterSMA([asset])
+
+    def run(self, min_price=None, max_price=None, exclude_reporting=False):
+        started = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as background:
+            self._assets = None
+            self._assets_future = background.submit(self._requestAssets)
+            earnings = background.submit(self._requestEarnings)
+            stages = [
+                Stage('cross_reference', self.crossReference, 1, self.queue_size),
+                Stage('price_range', lambda batch: self.priceRange(batch, min_price, max_price),
+                      self.price_workers, self.queue_size),
+                Stage('sma', self.sma, self.sma_workers, self.queue_size * self.batch_size),
+            ]
+            collected = []
+            candidates = Pipeline(stages).run(self.pages(collected))
+            assets = self._assets_future.result()
+            earnings = earnings.result()
+        if(exclude_reporting and earnings):
+            # The scrape only covers the earnings window, so every report in it counts.
+            candidates = EarningsTable.fromEarningsDates(earnings).excludeReporting(candidates)
+        candidates.sort(key=lambda asset: asset.symbol)
+        result = ScreenResult(candidates, collected, earnings, stages, time.perf_counter() - started, assets)
+        logger.info('Pre-open screen: %s', result)
+        return result
@@ -0,0 +1,292 @@
+'''
+Portfolio-level order sizing.
+
+Rebalancer turns target weights (or raw signals) for a list of symbols into the orders
+that move the current positions there, in one numpy pass over all symbols: target
+quantities rounded down to whole lots, limit prices offset by the buy/sell factors and
+rounded to the tick, and buys scaled down together when they would spend more than
+the available buying power.  Held symbols missing from the targets are sold out.
+
+    plan = algo.rebalancer.planFor(data, symbols, weights)
+    plan = plan.approved(data.risk)
+    plan.submit(data.api, data.risk, tracer=data.tracer)
+'''
+import concurrent.futures
+import hashlib
+import logging
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+
+def tickSize(prices):
+    '''Alpaca accepts four decimals below $1 and two above.'''
+    return numpy.where(prices < 1.0, 0.0001, 0.01)
+
+
+def weightsFromSignals(signals, gross=1.0, long_only=True):
+    '''
+    Scales signals so the absolute weights sum to `gross`.  With long_only, negative
+    signals get no allocation rather than a short.
+    '''
+    signals = numpy.nan_to_num(numpy.asarray(signals, dtype=numpy.float64))
+    if(long_only):
+        signals = numpy.clip(signals, 0.0, None)
+    total = numpy.abs(signals).sum()
+    if(total == 0):
+        return numpy.zeros_like(signals)
+    return signals * (gross / total)
+
+
+def clientOrderId(batch, symbol, side):
+    '''
+    The same client_order_id every time a batch plans an order for a symbol and side, so
+    resubmitting the batch (a retried trade phase) is rejected by the broker as a
+    duplicate instead of placed twice.  Alpaca allows up to 48 characters.
+    '''
+    key = '{}:{}:{}'.format(batch, symbol, side).encode('utf-8')
+    return hashlib.sha1(key).hexdigest()[:40]
+
+
+class PlannedOrder(object):
+    '''
+    symbol
+        string  Symbol to trade
+    side
+        string  buy or sell
+    qty
+        int     Unsigned number of shares
+    limit_price
+        number  Limit price, already rounded to the tick
+    target_qty
+        number  Signed position the order moves towards
+    price
+        number  Market price the plan was sized at
+    '''
+    def __init__(self, symbol, side, qty, limit_price, target_qty=None, price=None):
+        """Return a new PlannedOrder object."""
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.limit_price = limit_price
+        self.target_qty = target_qty
+        self.price = price
+
+    def notional(self):
+        return self.qty * self.limit_price
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class OrderPlan(object):
+    '''
+    A batch of orders as parallel arrays (symbol, side, qty, limit_price, target_qty,
+    price), sells first so their proceeds are not counted on before they are placed.
+    '''
+    def __init__(self, symbol, side, qty, limit_price, target_qty, price):
+        """Return a new OrderPlan object."""
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.limit_price = limit_price
+        self.target_qty = target_qty
+        self.price = price
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def __iter__(self):
+        for i in range(len(self.symbol)):
+            yield PlannedOrder(
+                self.symbol[i], self.side[i], int(self.qty[i]), float(self.limit_price[i]), float(self.target_qty[i]),
+                float(self.price[i]))
+
+    def orders(self):
+        return list(self)
+
+    def take(self, mask):
+        mask = numpy.asarray(mask, dtype=bool)
+        return OrderPlan(
+            self.symbol[mask], self.side[mask], self.qty[mask], self.limit_price[mask], self.target_qty[mask],
+            self.price[mask])
+
+    def buyNotional(self):
+        return float(numpy.sum(numpy.where(self.side == 'buy', self.qty * self.limit_price, 0.0)))
+
+    def sellNotional(self):
+        return float(numpy.sum(numpy.where(self.side == 'sell', self.qty * self.limit_price, 0.0)))
+
+    def approved(self, risk):
+        '''The part of the plan RiskEngine.validate approves; rejections are logged.'''
+        decisions = risk.validate(self.orders())
+        for decision in decisions:
+            if(not decision.approved):
+                logger.info('Rebalance: dropped %s %s: %s', decision.order.side, decision.order.symbol, decision.reason)
+        return self.take([decision.approved for decision in decisions])
+
+    def submit(
+        self, api, risk=None, max_workers=8, time_in_force='day', tracer=None, strategy='rebalance', batch=None):
+        '''
+        Submits every order concurrently.  Returns (PlannedOrder, order or exception)
+        pairs in plan order; successful submissions reserve buying power on `risk`.
+        With an OrderTracer, each order is traced from the plan's prices.  With a `batch`
+        key (e.g. phase and trading day), client_order_ids are deterministic, and orders
+        a tracer already saw acknowledged are not sent again.
+        '''
+        planned = self.orders()
+        client_ids = [
+            clientOrderId(batch, order.symbol, order.side) if batch != None else None for order in planned]
+        traces = [
+            tracer.decide(order.symbol, order.side, order.qty, order.price, strategy, order.limit_price, client_id)
+            if tracer != None else None for order, client_id in zip(planned, client_ids)]
+        pending = []
+        for order, client_id, trace in zip(planned, client_ids, traces):
+            if(trace != None and trace.order_id != None):
+                logger.info('Rebalance: %s %s already submitted as %s', order.side, order.symbol, trace.order_id)
+                continue
+            pending.append((order, client_id, trace))
+
+        def send(order, client_id, trace):
+            if(trace != None):
+                client_id = trace.client_order_id
+                tracer.submitting(trace)
+            extra = {'client_order_id': client_id} if client_id != None else {}
+            try:
+                submitted = api.submit_order(
+                    order.symbol, order.qty, order.side, 'limit', time_in_force, limit_price=order.limit_price, **extra)
+            except Exception as exc:
+                if(trace != None):
+                    tracer.rejected(trace, exc)
+                raise
+            if(trace != None):
+                tracer.submitted(trace, submitted)
+            return submitted
+
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(send, order, client_id, trace) for order, client_id, trace in pending]
+            for (order, client_id, trace), future in zip(pending, futures):
+                try:
+                    submitted = future.result()
+                except Exception as exc:
+                    logger.warning('Rebalance: %s %s %s failed: %s', order.side, order.qty, order.symbol, exc)
+                    results.append((order, exc))
+                    continue
+                if(risk != None):
+                    risk.onOrderSubmitted(submitted.id, order.symbol, order.side, order.qty, order.limit_price)
+                results.append((order, submitted))
+        return results
+
+    def __str__(self):
+        return 'orders={}, buys={:.2f}, sells={:.2f}'.format(len(self), self.buyNotional(), self.sellNotional())
+
+
+class Rebalancer(object):
+    '''
+    Sizes orders for a whole portfolio at once.  Buys are placed at price * buy_factor
+    and sells at price * sell_factor, as PennyAlgo's BuyFactor and SellFactor.
+    '''
+    def __init__(
+        self,
+        buy_factor=.99,
+        sell_factor=1.01,
+        lot_size=1,
+        min_notional=1.0,
+        cash_buffer=0.0,
+        allow_short=False,
+        use_sell_proceeds=False):
+        """Return a new Rebalancer object."""
+        self.buy_factor = buy_factor
+        self.sell_factor = sell_factor
+        self.lot_size = lot_size
+        self.min_notional = min_notional
+        # Fraction of buying power left unspent.
+        self.cash_buffer = cash_buffer
+        self.allow_short = allow_short
+        # Limit sells may not fill, so by default their proceeds do not fund buys.
+        self.use_sell_proceeds = use_sell_proceeds
+
+    def plan(self, symbols, weights, prices, current_qty=None, equity=None, buying_power=None):
+        '''
+        Orders that move `current_qty` to `weights` of `equity`, all arguments aligned
+        with `symbols`.  Weights are fractions of equity (negative for shorts when
+        allow_short).  Symbols with no usable price are left alone.
+        '''
+        symbols = numpy.asarray(symbols, dtype=object)
+        weights = numpy.nan_to_num(numpy.asarray(weights, dtype=numpy.float64))
+        prices = numpy.asarray(prices, dtype=numpy.float64)
+        current = numpy.zeros(len(symbols)) if current_qty is None else numpy.asarray(current_qty, dtype=numpy.float64)
+        if(not self.allow_short):
+            weights = numpy.clip(weights, 0.0, None)
+        priced = numpy.isfinite(prices) & (prices > 0)
+        safe_prices = numpy.where(priced, prices, 1.0)
+
+        # Whole lots, rounded towards zero so a target is never overshot.
+        lots = numpy.trunc(weights * equity / (safe_prices * self.lot_size))
+        target = numpy.where(priced, lots * self.lot_size, current)
+        delta = target - current
+        if(not self.allow_short):
+            # Never sell more than is held.
+            delta = numpy.maximum(delta, -numpy.clip(current, 0.0, None))
+        buys = delta > 0
+        sells = delta < 0
+
+        tick = tickSize(safe_prices)
+        # Ticks rounded first so 3.0 * .99 / .01 = 296.99999... still floors to 297.
+        limit = numpy.where(
+            buys,
+            numpy.floor(numpy.round(safe_prices * self.buy_factor / tick, 6)) * tick,
+            numpy.ceil(numpy.round(safe_prices * self.sell_factor / tick, 6)) * tick)
+        limit = numpy.round(limit, 4)
+        qty = numpy.abs(delta)
+
+        if(buying_power != None):
+            available = buying_power * (1.0 - self.cash_buffer)
+            if(self.use_sell_proceeds):
+                available += numpy.sum(qty[sells] * limit[sells])
+            spend = numpy.sum(qty[buys] * limit[buys])
+            if(spend > available):
+                # Scale every buy by the same factor, then round down to whole lots.
+                scale = max(available, 0.0) / spend
+                scaled = numpy.floor(qty * scale / self.lot_size) * self.lot_size
+                qty = numpy.where(buys, scaled, qty)
+
+        keep = (qty > 0) & (qty * limit >= self.min_notional) & (buys | sells)
+        side = numpy.where(buys, 'buy', 'sell').astype(object)
+        signed = numpy.where(buys, qty, -qty)
+        # Sells first, then buys, each largest first.
+        order = numpy.lexsort((-qty * limit, buys))
+        order = order[keep[order]]
+        return OrderPlan(
+            symbols[order], side[order], qty[order], limit[order], (current + signed)[order], prices[order])
+
+    def planFor(self, data, symbols, weights, prices=None):
+        '''
+        plan() from a Data object: current quantities from the position book, equity and
+        buying power from the risk engine, prices from the snapshot table (falling back
+        to the position's current price).  Held symbols not in `symbols` are sold out.
+        '''
+        symbols = list(symbols)
+        weights = list(numpy.asarray(weights, dtype=numpy.float64))
+        book = data.position_book
+        listed = set(symbols)
+        for symbol in book.positions:
+            if(symbol not in listed):
+                symbols.append(symbol)
+                weights.append(0.0)
+        if(prices == None):
+            prices = data.snapshots.prices(symbols)
+        held = [book.get(symbol) for symbol in symbols]
+        current_qty = numpy.fromiter(
+            (position.qty if position != None else 0.0 for position in held), dtype=numpy.float64, count=len(symbols))
+        price_array = numpy.fromiter(
+            (prices.get(symbol) or (position.current_price if position != None else numpy.nan)
+             for symbol, position in zip(symbols, held)),
+            dtype=numpy.float64, count=len(symbols))
+        return self.plan(
+            symbols, weights, price_array, current_qty,
+            equity=data.risk.equity, buying_power=data.risk.availableBuyingPower())
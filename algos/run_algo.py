@@ -1,45 +1,139 @@
-from ..data.data import Data
-from .algo1 import AlgoOne
-import alpaca_trade_api as tradeapi
+from data.cache import LocalCache, RedisCache, SharedCache
+from data.coalesce import CoalescingAPI
+from data.alpaca_data import Clock
+from data.data import Data
+from data.history import HistoryStore
+from data.holding import HoldingTracker
+from data.indicators import IndicatorBook
+from data.minute_bars import MinuteBarArchive
+from data.replay import RecordingProxy, ReplayFinished, ReplaySession, SessionLog, VirtualClock
+from data.universe import UniverseStore
+from data.yahoo_earnings_calendar import YahooEarningsCalendar
+from .algo1 import PennyAlgo
+from .scheduler import PhaseScheduler
+from .supervisor import Checkpoint, PhaseFailed, Supervisor
+import logging
+import os
+import tempfile
 import time
 
-api = tradeapi.REST()
-# api = tradeapi.REST('<key_id>', '<secret_key>')
+logger = logging.getLogger(__name__)
+
+_api = None
+# Set to a `python -m simulator` address to trade against the local simulated exchange.
+SIMULATOR_URL = os.environ.get('ALGO_SIMULATOR_URL')
+
+
+def getApi():
+    '''
+    Builds the REST client on first use.  alpaca_trade_api pulls in pandas, so importing
+    this module stays cheap until main actually needs the client.
+    '''
+    global _api
+    if(_api == None and SIMULATOR_URL):
+        from simulator.client import connect
+        _api = connect(SIMULATOR_URL)
+    if(_api == None):
+        import alpaca_trade_api as tradeapi
+        _api = tradeapi.REST()
+        # _api = tradeapi.REST('<key_id>', '<secret_key>')
+    return _api
+
+
+# Set ALGO_RECORD to a log path to record a live session, or ALGO_REPLAY to re-run one offline.
+RECORD_PATH = os.environ.get('ALGO_RECORD')
+REPLAY_PATH = os.environ.get('ALGO_REPLAY')
+# Replay speed relative to real time; 0 runs as fast as possible.
+REPLAY_SPEED = float(os.environ.get('ALGO_REPLAY_SPEED', 0))
+# A replay gets a throwaway state directory so it never overwrites the live indicators,
+# holdings, checkpoint or history.
+STATE_DIR = tempfile.mkdtemp(prefix='algo-replay-') if REPLAY_PATH else os.environ.get('ALGO_STATE_DIR', 'state')
+INDICATORS_PATH = os.path.join(STATE_DIR, 'indicators.pkl')
+PHASE_STATS_PATH = os.path.join(STATE_DIR, 'phase_stats.json')
+CHECKPOINT_PATH = os.path.join(STATE_DIR, 'checkpoint.pkl')
+HOLDINGS_PATH = os.path.join(STATE_DIR, 'holdings.pkl')
+UNIVERSE_DIR = os.path.join(STATE_DIR, 'universe')
+HISTORY_DIR = os.path.join(STATE_DIR, 'history')
+MINUTE_BARS_DIR = os.path.join(STATE_DIR, 'minute_bars')
+LOOP_INTERVAL = 0.25
+
+def getCache():
+    '''Shares datasets across dynos through Redis when REDIS_URL is set.'''
+    if(os.environ.get('REDIS_URL')):
+        return SharedCache(RedisCache())
+    return SharedCache(LocalCache())
 
 def main():
-    data = Data(api)
-    algo = AlgoOne(api)
+    calendar = YahooEarningsCalendar()
+    sleep = time.sleep
+    if(REPLAY_PATH):
+        logger.info('Replaying %s with state in %s', REPLAY_PATH, STATE_DIR)
+        log = SessionLog(REPLAY_PATH)
+        clock = VirtualClock(log.firstTimestamp(), speed=REPLAY_SPEED)
+        clock.install()
+        session = ReplaySession(log, clock)
+        client = session.proxy('api')
+        calendar = session.proxy('yahoo')
+        sleep = clock.sleep
+    elif(RECORD_PATH):
+        log = SessionLog(RECORD_PATH)
+        client = RecordingProxy(getApi(), log)
+        calendar = RecordingProxy(calendar, log, 'yahoo')
+    else:
+        client = getApi()
+    # Outermost, so recordings and replays only see the requests that reach the network.
+    client = CoalescingAPI(client, widen_days=100)
+
+    data = Data(
+        client, calendar, cache=getCache(), holdings=HoldingTracker.load(HOLDINGS_PATH),
+        history=HistoryStore(HISTORY_DIR))
+    data.holdings.save(HOLDINGS_PATH)
+    algo = PennyAlgo(client, MinuteBarArchive(MINUTE_BARS_DIR))
+    data.filter.indicators = IndicatorBook.load(INDICATORS_PATH)
+    scheduler = PhaseScheduler(PHASE_STATS_PATH)
+    supervisor = Supervisor(scheduler, Checkpoint.load(CHECKPOINT_PATH), sleep=sleep, fatal=(ReplayFinished,))
+    supervisor.resume(data, Clock.now())
+    trading_days = set(str(date.date)[:10] for date in data.calendar_dates)
+    phases = {
+        'get_and_filter_candidate_stocks': lambda: screen(algo, data),
+        'prefetch': lambda: algo.prefetch_data(data),
+        'trade_stocks': lambda: algo.trade_stocks(data),
+        'update_data': lambda: algo.update_data(data),
+        'close_specifics': lambda: algo.close_specifics(data),
+    }
     while True:
+        idle = LOOP_INTERVAL
         try:
             if(data.clock != None and data.orders != None):
-                # Prepare Candidate stocks to trade.
-                if(data.clock.beforeMarketOpen(minute=15)):
-                    print('Executing get_and_filter_candidate_stocks')
-                    data.candidates = algo.get_and_filter_candidate_stocks(data)
-                    time.sleep(120)
-                # Buy and Sell Stocks
-                if(
-                    data.clock.afterMarketOpen(minute=1) or
-                    data.clock.afterMarketOpen(hour=1, minute=1) or
-                    data.clock.afterMarketOpen(hour=2, minute=1) or
-                    data.clock.afterMarketOpen(hour=3, minute=1) or
-                    data.clock.afterMarketOpen(hour=4, minute=1) or
-                    data.clock.afterMarketOpen(hour=5, minute=1) or
-                    data.clock.afterMarketOpen(hour=6, minute=1)
-                ):
-                    print('Executing trade_stocks')
-                    algo.trade_stocks(data)
-                    time.sleep(120)
-                    
-                if(data.clock.beforeMarketClose(minute=10)):
-                    print('Executing close_specifics')
-                    algo.update_data(data)
-
-                if(data.clock.afterMarketClose(minute=30)):
-                    print('Executing close_specifics')
-                    algo.close_specifics(data)
-
+                now = Clock.now()
+                completed = supervisor.checkpoint.completedOn(now.date())
+                for window in scheduler.due(data.clock, now, trading_days, completed):
+                    logger.info('Executing %s', window)
+                    try:
+                        supervisor.run(window, phases[window.phase], now, data)
+                    except PhaseFailed as exc:
+                        logger.error('%s', exc)
+                    data.holdings.save(HOLDINGS_PATH)
+                data.poll()
+                idle = min(
+                    scheduler.secondsUntilNext(Clock.now()),
+                    data.governor.secondsUntilDue(working_orders=data.workingOrders(), clock=data.clock))
+            supervisor.loopSucceeded()
+        except ReplayFinished:
+            logger.info('Replay finished')
+            break
         except Exception as exc:
-            print('Exception: {}'.format(exc))
+            idle = supervisor.loopFailed()
+            logger.exception('Exception: {}; backing off {:.0f}s'.format(exc, idle))
+        sleep(max(idle, LOOP_INTERVAL))
 
 
+def screen(algo, data):
+    # The screen refreshes data.assets (through the cache) and data.polygon_symbols (paged today).
+    data.candidates = algo.get_and_filter_candidate_stocks(data)
+    data.filter.indicators.save(INDICATORS_PATH)
+    try:
+        # Keep a point-in-time record of the universe the screen ran against.
+        UniverseStore(UNIVERSE_DIR).record(Clock.now().date(), data.assets, data.polygon_symbols)
+    except Exception as exc:
+        logger.warning('Could not record the universe: {}'.format(exc))
@@ -0,0 +1,202 @@
+import datetime
+import json
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseStats(object):
+    '''
+    Measured durations of one phase: an exponentially weighted mean plus the recent
+    maximum, so the estimate reacts to slow days without being dominated by one outlier.
+    '''
+    def __init__(self, default=30.0, alpha=0.3, history=20):
+        """Return a new PhaseStats object."""
+        self.default = default
+        self.alpha = alpha
+        self.mean = None
+        self.recent = deque(maxlen=history)
+
+    def record(self, seconds):
+        self.recent.append(seconds)
+        if(self.mean == None):
+            self.mean = seconds
+        else:
+            self.mean += self.alpha * (seconds - self.mean)
+
+    def expected(self):
+        '''Conservative estimate: the larger of the mean and the recent 80th percentile.'''
+        if(self.mean == None):
+            return self.default
+        ordered = sorted(self.recent)
+        return max(self.mean, ordered[int(0.8 * (len(ordered) - 1))])
+
+
+class Window(object):
+    '''
+    A phase scheduled at a wall-clock instant.  Prefetch windows are placed ahead of
+    their trade window by the prefetch phase's expected duration.
+    '''
+    def __init__(self, name, phase, at):
+        """Return a new Window object."""
+        self.name = name
+        self.phase = phase
+        self.at = at
+
+    def __str__(self):
+        return '{} {} at {}'.format(self.name, self.phase, self.at)
+
+
+class PhaseScheduler(object):
+    '''
+    Schedules the daily phases from the market clock and the measured phase durations.
+
+    Trade windows are at open + N hours + 1 minute, as in run_algo.  Each one gets a
+    prefetch window that starts early enough for fresh data to be ready at the trade
+    time.  Windows that are missed by more than `late_tolerance` seconds are reported
+    and skipped.  A phase that runs past the start of the next window is reported as
+    an overrun.
+    '''
+    def __init__(self, path=None, margin=5.0, late_tolerance=300.0, trade_hours=7, catch_up=('screen',)):
+        """Return a new PhaseScheduler object."""
+        self.path = path
+        # Windows that still run when late, because later windows depend on them.
+        self.catch_up = catch_up
+        self.margin = margin
+        self.late_tolerance = late_tolerance
+        self.trade_hours = trade_hours
+        self.stats = {}
+        self.day = None
+        self.windows = []
+        self.done = set()
+        self.overruns = []
+        self.missed = []
+        self.load()
+
+    def statsFor(self, phase):
+        stats = self.stats.get(phase)
+        if(stats == None):
+            stats = PhaseStats()
+            self.stats[phase] = stats
+        return stats
+
+    def buildWindows(self, clock, now):
+        '''
+        Today's windows from the clock's open and close time of day, the same way the
+        Clock offset checks read them.
+        '''
+        tz = now.tzinfo
+        today = now.date()
+        open_at = datetime.datetime.combine(today, clock.next_open.astimezone(tz).time()).replace(tzinfo=tz)
+        close_at = datetime.datetime.combine(today, clock.next_close.astimezone(tz).time()).replace(tzinfo=tz)
+        windows = [Window('screen', 'get_and_filter_candidate_stocks', open_at - datetime.timedelta(minutes=15))]
+        prefetch_lead = self.statsFor('prefetch').expected() + self.margin
+        for hour in range(self.trade_hours):
+            at = open_at + datetime.timedelta(hours=hour, minutes=1)
+            if(at >= close_at):
+                break
+            name = 'trade+{}h'.format(hour)
+            windows.append(Window(name + ':prefetch', 'prefetch', at - datetime.timedelta(seconds=prefetch_lead)))
+            windows.append(Window(name, 'trade_stocks', at))
+        windows.append(Window('update', 'update_data', close_at - datetime.timedelta(minutes=10)))
+        windows.append(Window('close', 'close_specifics', close_at + datetime.timedelta(minutes=30)))
+        windows.sort(key=lambda window: window.at)
+        return windows
+
+    def due(self, clock, now, trading_days=None, completed=()):
+        '''
+        Returns the windows to run now, in order.  Call it every loop iteration.
+        `completed` names windows already run today by an earlier process; it is read
+        when the day starts.
+        '''
+        if(self.day != now.date()):
+            self.day = now.date()
+            self.done = set(completed)
+            is_trading_day = trading_days == None or now.date().isoformat() in trading_days
+            self.windows = self.buildWindows(clock, now) if is_trading_day else []
+            # Windows that were already over when the worker started are not misses.
+            # Catching up is only worth it while a trade window is still ahead.
+            trading_ahead = any(window.phase == 'trade_stocks' and window.at > now for window in self.windows)
+            skipped = 0
+            for window in self.windows:
+                if(window.name in self.done or (trading_ahead and window.name in self.catch_up)):
+                    continue
+                if((now - window.at).total_seconds() > self.late_tolerance):
+                    self.done.add(window.name)
+                    skipped += 1
+            if(skipped):
+                logger.info('Started after %d of today\'s windows', skipped)
+        due = []
+        for window in self.windows:
+            if(window.name in self.done or window.at > now):
+                continue
+            self.done.add(window.name)
+            lateness = (now - window.at).total_seconds()
+            if(lateness > self.late_tolerance and window.name in self.catch_up):
+                logger.warning('Running %s %.0fs late', window, lateness)
+            elif(lateness > self.late_tolerance):
+                self.missed.append(window)
+                logger.warning('Missed window %s by %.0fs', window, lateness)
+                continue
+            due.append(window)
+        return due
+
+    def nextWindow(self, now):
+        for window in self.windows:
+            if(window.name not in self.done and window.at > now):
+                return window
+        return None
+
+    def secondsUntilNext(self, now, idle=30.0):
+        '''Time to sleep before the next window, capped at `idle`.'''
+        window = self.nextWindow(now)
+        if(window == None):
+            return idle
+        return max(0.0, min(idle, (window.at - now).total_seconds()))
+
+    def run(self, window, function, now=None):
+        '''Runs a window's phase, records its duration and reports overruns.'''
+        started = time.monotonic()
+        try:
+            return function()
+        finally:
+            elapsed = time.monotonic() - started
+            self.statsFor(window.phase).record(elapsed)
+            next_window = self.nextWindow(window.at)
+            if(now != None and next_window != None and
+                now + datetime.timedelta(seconds=elapsed) > next_window.at):
+                self.overruns.append((window, elapsed))
+                logger.warning('Phase %s took %.1fs and overran %s', window, elapsed, next_window)
+            else:
+                logger.info('Phase %s took %.1fs', window, elapsed)
+            self.save()
+
+    def load(self):
+        if(self.path == None or not os.path.exists(self.path)):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except Exception as exc:
+            logger.warning('Could not load phase stats from %s: %s', self.path, exc)
+            return
+        for phase, values in saved.items():
+            stats = self.statsFor(phase)
+            stats.mean = values.get('mean')
+            stats.recent.extend(values.get('recent', []))
+
+    def save(self):
+        if(self.path == None):
+            return
+        directory = os.path.dirname(self.path)
+        if(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                phase: {'mean': stats.mean, 'recent': list(stats.recent)}
+                for phase, stats in self.stats.items()}, f)
+        os.replace(tmp_path, self.path)
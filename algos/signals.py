@@ -0,0 +1,208 @@
+'''
+Intraday signals over minute bars, computed for the whole candidate set at once.
+
+BarPanel holds the last `window` minutes of every candidate as (symbols x minutes)
+arrays on a shared minute grid.  It is filled from MinuteBarArchive (cached bars) or
+one bar at a time from a stream, and rolls forward as new minutes arrive.
+SignalEngine turns the panel into cross-sectional features (returns, volume z-scores,
+VWAP distance, position in the rolling high/low range) with array operations only, and
+ranks the symbols on a weighted sum of per-feature percentile ranks.
+
+    panel = BarPanel.fromArchive(archive, candidates, window=120)
+    features = SignalEngine().features(panel)      # ColumnTable, one row per symbol
+    top = SignalEngine().rank(panel)[:20]          # best scores first
+'''
+import warnings
+
+import numpy
+
+from data.clock import toNs
+from data.decode import ColumnTable
+
+MINUTE_NS = 60 * 1000000000
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Momentum with volume confirmation; pass `weights` to SignalEngine for other blends.
+WEIGHTS = {
+    'return_15': 1.0,
+    'return_60': 1.0,
+    'volume_z': 0.5,
+    'vwap_distance': 0.5,
+    'range_position': 0.25,
+}
+
+
+class BarPanel(object):
+    '''
+    Minute bars for many symbols on one grid: self.close[i, j] is symbol i's close in
+    minute end_minute - window + 1 + j (epoch minutes).  Minutes without a bar are NaN
+    (volume 0).
+    '''
+    def __init__(self, symbols, window=120, end=None):
+        """Return a new BarPanel object."""
+        self.symbols = list(symbols)
+        self.rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.window = window
+        self.end_minute = None if end == None else toNs(end) // MINUTE_NS
+        shape = (len(self.symbols), window)
+        for field in FIELDS:
+            setattr(self, field, numpy.zeros(shape) if field == 'volume' else numpy.full(shape, numpy.nan))
+
+    @classmethod
+    def fromArchive(cls, archive, symbols, window=120, end=None):
+        '''Fills the panel from MinuteBarArchive bars before `end` (or the latest bars).'''
+        panel = cls(symbols, window, end)
+        if(panel.end_minute == None):
+            last = [archive.lastTimestamp(symbol) for symbol in panel.symbols]
+            last = [timestamp for timestamp in last if timestamp != None]
+            if(not last):
+                return panel
+            panel.end_minute = max(last) // MINUTE_NS
+        end_ns = (panel.end_minute + 1) * MINUTE_NS
+        start_ns = end_ns - window * MINUTE_NS
+        for symbol in panel.symbols:
+            panel.addBars(symbol, archive.bars(symbol, start_ns, end_ns))
+        return panel
+
+    def addBars(self, symbol, bars):
+        '''Writes a BAR_DTYPE array into the symbol's row; bars outside the grid are ignored.'''
+        row = self.rows.get(symbol)
+        if(row == None or len(bars) == 0 or self.end_minute == None):
+            return 0
+        columns = bars['timestamp'] // MINUTE_NS - (self.end_minute - self.window + 1)
+        inside = (columns >= 0) & (columns < self.window)
+        columns = columns[inside]
+        for field in FIELDS:
+            getattr(self, field)[row, columns] = bars[field][inside]
+        return len(columns)
+
+    def roll(self, minute):
+        '''Moves the grid so it ends at epoch minute `minute`, dropping the oldest minutes.'''
+        if(self.end_minute == None):
+            self.end_minute = minute
+            return
+        shift = minute - self.end_minute
+        if(shift <= 0):
+            return
+        for field in FIELDS:
+            values = getattr(self, field)
+            empty = 0.0 if field == 'volume' else numpy.nan
+            if(shift >= self.window):
+                values[:] = empty
+            else:
+                values[:, :-shift] = values[:, shift:]
+                values[:, -shift:] = empty
+        self.end_minute = minute
+
+    def update(self, symbol, bar):
+        '''
+        Applies one streamed bar (anything with timestamp and open/high/low/close/volume
+        attributes, or a BAR_DTYPE record).  Newer minutes roll the whole panel forward.
+        '''
+        row = self.rows.get(symbol)
+        if(row == None):
+            return False
+        timestamp = int(bar['timestamp']) if isinstance(bar, numpy.void) else toNs(bar)
+        minute = timestamp // MINUTE_NS
+        if(self.end_minute == None or minute > self.end_minute):
+            self.roll(minute)
+        column = minute - (self.end_minute - self.window + 1)
+        if(column < 0):
+            return False
+        for field in FIELDS:
+            getattr(self, field)[row, column] = bar[field] if isinstance(bar, numpy.void) else getattr(bar, field)
+        return True
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+def _lastValid(values):
+    '''Last non-NaN value of each row (NaN for empty rows).'''
+    valid = ~numpy.isnan(values)
+    positions = numpy.where(valid, numpy.arange(values.shape[1]), -1).max(axis=1)
+    last = values[numpy.arange(len(values)), numpy.maximum(positions, 0)]
+    return numpy.where(positions >= 0, last, numpy.nan)
+
+
+def _forwardFill(values):
+    '''Carries each row's last close forward over minutes without a trade.'''
+    valid = ~numpy.isnan(values)
+    index = numpy.where(valid, numpy.arange(values.shape[1]), 0)
+    numpy.maximum.accumulate(index, axis=1, out=index)
+    return values[numpy.arange(len(values))[:, None], index]
+
+
+def percentileRank(values):
+    '''Cross-sectional rank in [0, 1] (ties share the lower rank); NaN ranks 0.'''
+    values = numpy.asarray(values, dtype=numpy.float64)
+    result = numpy.zeros(len(values))
+    valid = ~numpy.isnan(values)
+    count = int(valid.sum())
+    if(count > 1):
+        ordered = numpy.sort(values[valid])
+        result[valid] = numpy.searchsorted(ordered, values[valid], side='left') / (count - 1)
+    return result
+
+
+class SignalEngine(object):
+
+    def __init__(self, horizons=(5, 15, 60), volume_window=5, weights=None, min_bars=10):
+        """Return a new SignalEngine object."""
+        self.horizons = horizons
+        self.volume_window = volume_window
+        self.weights = dict(WEIGHTS if weights == None else weights)
+        # Symbols with fewer bars than this in the window are not ranked.
+        self.min_bars = min_bars
+
+    def features(self, panel):
+        '''One ColumnTable row per panel symbol with every feature column.'''
+        close = _forwardFill(panel.close)
+        volume = panel.volume
+        last = _lastValid(close)
+        columns = {'symbol': numpy.array(panel.symbols, dtype=object), 'close': last}
+        with warnings.catch_warnings(), numpy.errstate(divide='ignore', invalid='ignore'):
+            # All-NaN rows are expected for symbols without bars; they come out as NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for horizon in self.horizons:
+                if(horizon < panel.window):
+                    columns['return_{}'.format(horizon)] = last / close[:, -1 - horizon] - 1.0
+
+            mean = volume.mean(axis=1)
+            std = volume.std(axis=1)
+            recent = volume[:, -self.volume_window:].mean(axis=1)
+            columns['volume_z'] = numpy.where(
+                std > 0, (recent - mean) / (std / numpy.sqrt(self.volume_window)), 0.0)
+
+            typical = (panel.high + panel.low + panel.close) / 3.0
+            priced = ~numpy.isnan(typical)
+            traded = numpy.where(priced, typical * volume, 0.0).sum(axis=1)
+            total_volume = numpy.where(priced, volume, 0.0).sum(axis=1)
+            vwap = numpy.where(total_volume > 0, traded / total_volume, numpy.nan)
+            columns['vwap'] = vwap
+            columns['vwap_distance'] = last / vwap - 1.0
+
+            high = numpy.nanmax(panel.high, axis=1)
+            low = numpy.nanmin(panel.low, axis=1)
+            columns['rolling_high'] = high
+            columns['rolling_low'] = low
+            columns['range_position'] = numpy.where(high > low, (last - low) / (high - low), 0.5)
+        columns['bars'] = (~numpy.isnan(panel.close)).sum(axis=1)
+        return ColumnTable(columns)
+
+    def score(self, features):
+        '''Weighted sum of percentile ranks; symbols short of min_bars score NaN.'''
+        score = numpy.zeros(len(features))
+        for name, weight in self.weights.items():
+            if(name in features.columns):
+                score += weight * percentileRank(features[name])
+        return numpy.where(features['bars'] >= self.min_bars, score, numpy.nan)
+
+    def rank(self, panel, features=None):
+        '''The features table with a `score` column, best first, unscored symbols dropped.'''
+        features = self.features(panel) if features == None else features
+        score = self.score(features)
+        features.columns['score'] = score
+        order = numpy.argsort(-score, kind='stable')
+        order = order[~numpy.isnan(score[order])]
+        return features[order]
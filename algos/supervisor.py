@@ -0,0 +1,234 @@
+import logging
+import os
+import pickle
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseTimeout(Exception):
+    pass
+
+
+class PhaseFailed(Exception):
+    pass
+
+
+class RetryPolicy(object):
+    '''
+    How a phase is retried: up to `attempts` tries, each limited to `timeout` seconds
+    (None for no limit), sleeping `initial` * `backoff` ** n seconds (capped at
+    `max_delay`) between them.  A timed-out attempt keeps running, so it is only retried
+    with `retry_timeout`, and then not before its thread has finished.
+    '''
+    def __init__(self, attempts=3, timeout=None, initial=1.0, backoff=2.0, max_delay=60.0, retry_timeout=True):
+        """Return a new RetryPolicy object."""
+        self.attempts = attempts
+        self.timeout = timeout
+        self.initial = initial
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.retry_timeout = retry_timeout
+
+    def delay(self, attempt):
+        return min(self.max_delay, self.initial * self.backoff ** attempt)
+
+
+# The screen is long and safe to repeat.  Phases that place orders are retried at most
+# once after an error and never after a timeout, since the timed-out attempt may still
+# be submitting; their orders carry deterministic client_order_ids (see OrderPlan.submit)
+# so a retried batch cannot be placed twice.
+POLICIES = {
+    'get_and_filter_candidate_stocks': RetryPolicy(attempts=3, timeout=900, initial=10.0),
+    'prefetch': RetryPolicy(attempts=3, timeout=120, initial=2.0),
+    'trade_stocks': RetryPolicy(attempts=2, timeout=300, initial=5.0, retry_timeout=False),
+    'update_data': RetryPolicy(attempts=3, timeout=120, initial=5.0),
+    'close_specifics': RetryPolicy(attempts=2, timeout=300, initial=10.0, retry_timeout=False),
+}
+
+
+class Checkpoint(object):
+    '''
+    Phase outputs that must survive a restart: the day's completed windows, the last
+    completed phase, the candidate list and the position ages.  Written atomically
+    after every completed window.
+    '''
+    def __init__(self, path=None):
+        """Return a new Checkpoint object."""
+        self.path = path
+        self.day = None
+        self.completed = []
+        self.last_phase = None
+        self.last_completed_at = None
+        self.candidates = None
+        self.position_ages = {}
+
+    def record(self, window, now, data):
+        day = now.date().isoformat()
+        if(self.day != day):
+            self.day = day
+            self.completed = []
+            self.candidates = None
+        self.completed.append(window.name)
+        self.last_phase = window.phase
+        self.last_completed_at = now.isoformat()
+        self.candidates = getattr(data, 'candidates', self.candidates)
+        book = getattr(data, 'position_book', None)
+        if(book != None):
+            self.position_ages = {symbol: book.age(symbol) for symbol in book.positions}
+        self.save()
+
+    def completedOn(self, day):
+        return set(self.completed) if self.day == day.isoformat() else set()
+
+    def restore(self, data, now):
+        '''
+        Puts the checkpointed candidates (same day only) and position ages back on `data`.
+        Returns the window names already completed today.
+        '''
+        book = getattr(data, 'position_book', None)
+        holdings = getattr(data, 'holdings', None)
+        if(book != None):
+            for symbol, age in self.position_ages.items():
+                if(holdings != None and symbol in holdings and holdings.hasFillHistory()):
+                    # Fill history already dates this position.
+                    continue
+                position = book.get(symbol)
+                if(position != None):
+                    position.age = age
+            for position in getattr(data, 'positions', None) or []:
+                position.age = book.age(position.symbol)
+        completed = self.completedOn(now.date())
+        if(completed and self.candidates != None):
+            data.candidates = self.candidates
+        if(completed):
+            logger.info('Resuming after %s (%d windows done today)', self.last_phase, len(completed))
+        return completed
+
+    def save(self):
+        if(self.path == None):
+            return
+        directory = os.path.dirname(self.path)
+        if(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path):
+        checkpoint = cls(path)
+        try:
+            with open(path, 'rb') as f:
+                checkpoint.__dict__.update(pickle.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logger.warning('Could not load checkpoint from %s: %s', path, exc)
+        checkpoint.path = path
+        return checkpoint
+
+
+class Supervisor(object):
+    '''
+    Runs scheduled phases as supervised tasks: each attempt runs on its own thread with
+    the phase's timeout, failures are retried with exponential backoff, and every
+    completed window is checkpointed.  A phase that exhausts its attempts raises
+    PhaseFailed and is not checkpointed, so it is visible in the logs and not mistaken
+    for done.
+
+    The worker loop itself backs off too: the delay `loopFailed` returns grows while iterations keep
+    failing, instead of spinning on a broken API.
+    '''
+    def __init__(self, scheduler, checkpoint, policies=None, sleep=time.sleep, fatal=()):
+        """Return a new Supervisor object."""
+        self.scheduler = scheduler
+        # Exceptions that end the worker rather than count as a failed attempt.
+        self.fatal = fatal
+        self.checkpoint = checkpoint
+        self.policies = dict(POLICIES)
+        self.policies.update(policies or {})
+        self.sleep = sleep
+        self.failures = 0
+        self.loop_policy = RetryPolicy(initial=1.0, backoff=2.0, max_delay=300.0)
+        # Threads of timed-out attempts that may still be running, by phase.
+        self.abandoned = {}
+
+    def policy(self, phase):
+        return self.policies.get(phase) or RetryPolicy()
+
+    def attempt(self, function, timeout):
+        '''Runs `function` on a daemon thread; raises PhaseTimeout if it outlives `timeout`.'''
+        if(timeout == None):
+            return function()
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = function()
+            except BaseException as exc:
+                outcome['error'] = exc
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if(thread.is_alive()):
+            # Python threads cannot be killed; the attempt is abandoned, not stopped.
+            timeout_error = PhaseTimeout('timed out after {}s'.format(timeout))
+            timeout_error.thread = thread
+            raise timeout_error
+        if('error' in outcome):
+            raise outcome['error']
+        return outcome.get('result')
+
+    def stillRunning(self, phase, timeout=0):
+        '''Waits up to `timeout` for an abandoned attempt of `phase`; True if it is still running.'''
+        thread = self.abandoned.get(phase)
+        if(thread == None):
+            return False
+        thread.join(timeout)
+        if(thread.is_alive()):
+            return True
+        del self.abandoned[phase]
+        return False
+
+    def run(self, window, function, now, data=None):
+        policy = self.policy(window.phase)
+        if(self.stillRunning(window.phase)):
+            raise PhaseFailed('{} skipped: a timed-out attempt is still running'.format(window))
+        for attempt in range(policy.attempts):
+            try:
+                result = self.scheduler.run(window, lambda: self.attempt(function, policy.timeout), now)
+            except self.fatal:
+                raise
+            except PhaseTimeout as exc:
+                self.abandoned[window.phase] = exc.thread
+                if(not policy.retry_timeout):
+                    raise PhaseFailed('{} {}; not retried while it may still be running'.format(window, exc))
+                if(attempt + 1 >= policy.attempts):
+                    raise PhaseFailed('{} failed after {} attempts: {}'.format(window, policy.attempts, exc))
+                # Let the abandoned attempt finish before a retry races it for the same state.
+                if(self.stillRunning(window.phase, policy.timeout)):
+                    raise PhaseFailed('{} {} and is still running; not retried'.format(window, exc))
+                logger.warning('%s attempt %d %s; retrying', window, attempt + 1, exc)
+                continue
+            except Exception as exc:
+                if(attempt + 1 >= policy.attempts):
+                    raise PhaseFailed('{} failed after {} attempts: {}'.format(window, policy.attempts, exc))
+                delay = policy.delay(attempt)
+                logger.warning('%s attempt %d failed (%s); retrying in %.0fs', window, attempt + 1, exc, delay)
+                self.sleep(delay)
+                continue
+            self.checkpoint.record(window, now, data)
+            return result
+
+    def resume(self, data, now):
+        return self.checkpoint.restore(data, now)
+
+    def loopFailed(self):
+        self.failures += 1
+        return self.loop_policy.delay(self.failures - 1)
+
+    def loopSucceeded(self):
+        self.failures = 0
@@ -0,0 +1,82 @@
+'''
+Import-time benchmark.
+
+Times cold imports of the data package in fresh interpreters and reports which heavy
+modules each import drags in.  Pass --baseline <git ref> to run the same statements
+against an older tree for comparison:
+
+    python benchmarks/import_time.py --baseline HEAD~1
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('pandas', 'numpy', 'requests', 'alpaca_trade_api')
+STATEMENTS = (
+    'import data',
+    'from data import Clock',
+    'from data import Data',
+    'from data.indicators import IndicatorBook',
+)
+PROBE = '''
+import sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(elapsed, ','.join(name for name in {heavy!r} if name in sys.modules))
+'''
+
+
+def timeStatement(statement, cwd, runs):
+    timings = []
+    loaded = ''
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY)],
+            cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if(result.returncode != 0):
+            return None, result.stderr.strip().splitlines()[-1]
+        elapsed, _, loaded = result.stdout.strip().partition(' ')
+        timings.append(float(elapsed))
+    return statistics.median(timings), loaded
+
+
+def exportTree(ref, directory):
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, stdout=subprocess.PIPE, check=True)
+    path = os.path.join(directory, 'tree.tar')
+    with open(path, 'wb') as f:
+        f.write(archive.stdout)
+    with tarfile.open(path) as tar:
+        tar.extractall(directory)
+    return directory
+
+
+def report(title, cwd, runs):
+    print(title)
+    for statement in STATEMENTS:
+        median, loaded = timeStatement(statement, cwd, runs)
+        if(median == None):
+            print('  {:<45} failed: {}'.format(statement, loaded))
+        else:
+            print('  {:<45} {:8.1f} ms  loads: {}'.format(statement, median * 1000, loaded or '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--baseline', help='git ref to compare against')
+    args = parser.parse_args()
+
+    report('current tree', ROOT, args.runs)
+    if(args.baseline):
+        with tempfile.TemporaryDirectory() as directory:
+            report('baseline {}'.format(args.baseline), exportTree(args.baseline, directory), args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+'''
+Load test against the simulated exchange.
+
+Starts a simulator in-process (or uses --url), then runs --workers threads, each with its
+own REST client, through a mix of the calls the worker makes: clock, account, orders,
+positions, snapshots, daily aggregates and order submit/cancel.  Reports throughput,
+latency percentiles per call and the status codes the server saw.  --pipeline also builds
+a full Data object (the pre-open load) against the simulator and times it.
+
+    python benchmarks/load_test.py --workers 16 --seconds 20 --latency 0.02 --error-rate 0.01
+'''
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from simulator import (  # noqa: E402
+    EarningsCalendar, Exchange, FaultInjector, MarketModel, SimulatedTime, SimulatorServer, connect)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def workload(api, symbols, rng):
+    '''One call from the worker's request mix; returns its name.'''
+    roll = rng.random()
+    if(roll < 0.25):
+        api.get_clock()
+        return 'get_clock'
+    if(roll < 0.40):
+        api.list_orders(status='open')
+        return 'list_orders'
+    if(roll < 0.55):
+        api.list_positions()
+        return 'list_positions'
+    if(roll < 0.65):
+        api.get_account()
+        return 'get_account'
+    if(roll < 0.75):
+        api.polygon.get(
+            path='/snapshot/locale/us/markets/stocks/tickers',
+            params={'tickers': ','.join(rng.sample(symbols, 50))}, version='v2')
+        return 'snapshot'
+    if(roll < 0.90):
+        to = datetime.date.today()
+        api.polygon.historic_agg('day', rng.choice(symbols), _from=to - datetime.timedelta(days=60), to=to)
+        return 'historic_agg'
+    symbol = rng.choice(symbols)
+    price = float(api.polygon.last_trade(symbol).price)
+    order = api.submit_order(symbol, 1, 'buy', 'limit', 'day', limit_price=round(price * 0.99, 2))
+    api.cancel_order(order.id)
+    return 'submit_cancel'
+
+
+def worker(url, symbols, deadline, seed, results, errors, lock):
+    api = connect(url)
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            name = workload(api, symbols, rng)
+        except Exception as exc:
+            with lock:
+                key = type(exc).__name__
+                errors[key] = errors.get(key, 0) + 1
+            continue
+        elapsed = time.perf_counter() - started
+        with lock:
+            results.setdefault(name, []).append(elapsed)
+
+
+def runPipeline(url, market):
+    from data.data import Data
+    api = connect(url)
+    started = time.perf_counter()
+    data = Data(api, EarningsCalendar(market))
+    elapsed = time.perf_counter() - started
+    print('pipeline: Data() loaded {} assets, {} symbols, {} orders in {:.2f}s'.format(
+        len(data.assets), len(data.polygon_symbols), len(data.orders), elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='use a running simulator instead of starting one')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None, help='requests per minute per key (default unlimited)')
+    parser.add_argument('--start', default='2019-06-04T10:00', help='simulated start time (New York)')
+    parser.add_argument('--pipeline', action='store_true')
+    args = parser.parse_args()
+
+    # Keep the client's own 429/504 retries short so they show up in the latencies.
+    os.environ.setdefault('APCA_RETRY_WAIT', '1')
+    market = MarketModel(args.symbols)
+    server = None
+    url = args.url
+    if(url == None):
+        exchange = Exchange(market, SimulatedTime(datetime.datetime.fromisoformat(args.start)), cash=1e9)
+        faults = FaultInjector(args.latency, args.jitter, args.error_rate, seed=1)
+        server = SimulatorServer(exchange, faults=faults, rate_limit=args.rate_limit).start()
+        url = server.url
+
+    results = {}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(url, market.symbols, deadline, seed, results, errors, lock))
+        for seed in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(timings) for timings in results.values())
+    print('{} workers, {:.1f}s: {} calls, {:.0f} calls/s, errors: {}'.format(
+        args.workers, elapsed, total, total / elapsed, errors or '-'))
+    print('  {:<16} {:>7} {:>9} {:>9} {:>9}'.format('call', 'count', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name in sorted(results):
+        timings = results[name]
+        print('  {:<16} {:>7} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            name, len(timings), statistics.median(timings) * 1000,
+            percentile(timings, 0.95) * 1000, percentile(timings, 0.99) * 1000))
+    if(server != None):
+        print('server statuses: {}'.format({
+            key: count for key, count in sorted(server.stats().items()) if not key.startswith(('GET', 'POST', 'DELETE'))} or '-'))
+    if(args.pipeline):
+        runPipeline(url, market)
+    if(server != None):
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
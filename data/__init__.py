@@ -1,5 +1,73 @@
-from .alpaca_data import Account, Asset, Calendar, Clock, Order, Position
-from .earnings_data import EarningsDate
-from .filter import Filter
-from .polygon_data import PolygonSymbol
-from .data import Data
\ No newline at end of file
+'''
+Submodules are imported on first use (PEP 562) so that importing the package, or a
+single lightweight class from it, does not pull in pandas, numpy or requests.
+'''
+import importlib
+
+_EXPORTS = {
+    'Account': '.alpaca_data',
+    'Asset': '.alpaca_data',
+    'Calendar': '.alpaca_data',
+    'Clock': '.alpaca_data',
+    'Order': '.alpaca_data',
+    'Position': '.alpaca_data',
+    'LocalCache': '.cache',
+    'RedisCache': '.cache',
+    'SharedCache': '.cache',
+    'SingleFlight': '.cache',
+    'MarketTimes': '.clock',
+    'setTimeSource': '.clock',
+    'CoalescingAPI': '.coalesce',
+    'ColumnTable': '.decode',
+    'RowView': '.decode',
+    'EarningsDate': '.earnings_data',
+    'EarningsTable': '.earnings_table',
+    'Filter': '.filter',
+    'PollingGovernor': '.governor',
+    'HistoryStore': '.history',
+    'HoldingTracker': '.holding',
+    'Lot': '.holding',
+    'EMA': '.indicators',
+    'IndicatorBook': '.indicators',
+    'RollingSMA': '.indicators',
+    'RollingVariance': '.indicators',
+    'VWAP': '.indicators',
+    'ThrottledLogger': '.logs',
+    'setupLogging': '.logs',
+    'MinuteBarArchive': '.minute_bars',
+    'PolygonSymbol': '.polygon_data',
+    'PositionBook': '.positions',
+    'TrackedPosition': '.positions',
+    'RiskDecision': '.risk',
+    'RiskEngine': '.risk',
+    'PriceSnapshot': '.snapshot',
+    'SnapshotTable': '.snapshot',
+    'LatencyHistogram': '.tracing',
+    'OrderTrace': '.tracing',
+    'OrderTracer': '.tracing',
+    'Universe': '.universe',
+    'UniverseStore': '.universe',
+    'Data': '.data',
+    'AsyncData': '.async_data',
+    'RecordingProxy': '.replay',
+    'ReplayFinished': '.replay',
+    'ReplayProxy': '.replay',
+    'ReplaySession': '.replay',
+    'SessionLog': '.replay',
+    'VirtualClock': '.replay',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if(module == None):
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,4 +1,24 @@
-import pandas as pd
+import datetime
+import weakref
+
+from .clock import HOUR_NS, MINUTE_NS, MarketTimes, nowNs, offsetNs
+
+try:
+    from zoneinfo import ZoneInfo as _zone
+except ImportError:
+    from dateutil.tz import gettz as _zone
+
+_ZONES = {}
+# Clock.times() results, kept off the instances so they stay out of __str__ and pickles.
+_MARKET_TIMES = weakref.WeakKeyDictionary()
+
+
+def _tz(timezone):
+    zone = _ZONES.get(timezone)
+    if(zone == None):
+        zone = _zone(timezone)
+        _ZONES[timezone] = zone
+    return zone
 
 class Account(object):
     '''
@@ -261,88 +281,43 @@ class Clock(object):
         self.is_open = is_open
         self.next_open = next_open
         self.next_close = next_close
+
+    @classmethod
+    def now(cls, timezone='America/New_York'):
+        '''Current time in `timezone`; follows clock.setTimeSource (replay.VirtualClock, tests).'''
+        return datetime.datetime.fromtimestamp(nowNs() / 1e9, tz=_tz(timezone))
+
+    def times(self):
+        '''next_open and next_close as epoch nanoseconds, converted once (again if either is reassigned).'''
+        cached = _MARKET_TIMES.get(self)
+        if(cached == None or cached[0] is not self.next_open or cached[1] is not self.next_close):
+            cached = (self.next_open, self.next_close, MarketTimes(self.next_open, self.next_close))
+            _MARKET_TIMES[self] = cached
+        return cached[2]
     
     '''
     afterMarketClose and afterMarketOpen these methods will not specify a day due to these dates changing if the data is pulled after market opens or closes to the next date.
     '''
     def afterMarketClose(self, timezone='America/New_York', hour=0, minute=0, second=0):
-        now = pd.Timestamp.now(tz=timezone)
-        nextClose = self.next_close
-        if( now.hour == nextClose.hour + hour and 
-            now.minute == nextClose.minute + minute and 
-            now.second == nextClose.second + second):
-            return True
-        return False
+        return self.times().afterClose(_tz(timezone), offsetNs(hour, minute, second), nowNs())
         
     def afterMarketOpen(self, timezone='America/New_York', hour=0, minute=0, second=0):
-        now = pd.Timestamp.now(tz=timezone)
-        nextOpen = self.next_open
-        if( now.hour == nextOpen.hour + hour and 
-            now.minute == nextOpen.minute + minute and 
-            now.second == nextOpen.second + second):
-            return True
-        return False
+        return self.times().afterOpen(_tz(timezone), offsetNs(hour, minute, second), nowNs())
     
     def duringMarketHoursRunPerMinute(self, timezone='America/New_York', second=1):
-        now = pd.Timestamp.now(tz=timezone)
-        nextOpen = self.next_open
-        nextClose = self.next_close
-        if( now.hour >= nextOpen.hour and
-            now.hour <= nextClose.hour and
-            now.second == second):
-            if ((nextClose.hour == now.hour and
-                nextClose.minute < now.minute) or
-                (nextOpen.hour == now.hour and
-                nextOpen.minute > now.minute)):
-                return False
-            if ((nextClose.hour == now.hour and
-                nextClose.minute == now.minute and
-                nextClose.second < second) or
-                (nextOpen.hour == now.hour and
-                nextOpen.minute == now.minute and
-                nextOpen.second > second)):
-                return False
-            return True
-        return False
+        return self.times().duringHours(_tz(timezone), nowNs(), MINUTE_NS, offsetNs(second=second))
     
     def duringMarketHoursRunPerHour(self, timezone='America/New_York', minute=1, second=1):
-        now = pd.Timestamp.now(tz=timezone)
-        nextOpen = self.next_open
-        nextClose = self.next_close
-        if( now.hour >= nextOpen.hour and
-            now.hour <= nextClose.hour and
-            now.minute == minute and
-            now.second == second):
-            if ((nextClose.hour == now.hour and
-                nextClose.minute < now.minute) or
-                (nextOpen.hour == now.hour and
-                nextOpen.minute > now.minute)):
-                return False
-            return True
-        return False
+        return self.times().duringHours(_tz(timezone), nowNs(), HOUR_NS, offsetNs(minute=minute, second=second))
         
     def beforeMarketClose(self, timezone='America/New_York', hour=0, minute=0, second=0):
-        now = pd.Timestamp.now(tz=timezone)
-        nextClose = self.next_close
-        if( now.day == nextClose.day and
-            now.hour == nextClose.hour - hour and 
-            now.minute == nextClose.minute - minute and 
-            now.second == nextClose.second - second):
-            return True
-        return False
+        return self.times().beforeClose(offsetNs(hour, minute, second), nowNs())
         
     def beforeMarketOpen(self, timezone='America/New_York', hour=0, minute=0, second=0):
-        now = pd.Timestamp.now(tz=timezone)
-        nextOpen = self.next_open
-        if( now.day == nextOpen.day and
-            now.hour == nextOpen.hour - hour and 
-            now.minute == nextOpen.minute - minute and 
-            now.second == nextOpen.second - second):
-            return True
-        return False
+        return self.times().beforeOpen(offsetNs(hour, minute, second), nowNs())
         
     def testHours(self, timezone='America/New_York', hour=0, minute=0, second=0):
-        now = pd.Timestamp.now(tz=timezone)
+        now = self.now(timezone)
         if( now.hour == now.hour - hour and 
             now.minute == now.minute - minute and 
             now.second == now.second - second):
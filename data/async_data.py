@@ -0,0 +1,268 @@
+'''
+asyncio-native counterpart of Data.
+
+AsyncData mirrors the Data.request* methods over a single aiohttp session, so a strategy
+can gather many requests at once instead of waiting on each one:
+
+    client = AsyncData()
+    clock, orders, positions = await client.gather(
+        client.requestClock(), client.requestOrders(), client.requestPositions())
+
+Both clients build their results with the same functions in convert.py.
+aiohttp is only needed when AsyncData is actually used.
+'''
+import asyncio
+import datetime
+import os
+
+from .alpaca_data import Clock
+from .clock import nowNs
+from .convert import (
+    ORDER_PAGE, earningsWindow, newestFirst, nextOrdersAfter, toAccount, toAsset, toCalendar,
+    toClock, toEarningsDate, toOrder, toPolygonSymbol, toPosition)
+from .yahoo_earnings_calendar.scraper import BASE_URL as YAHOO_EARNINGS_URL
+from .yahoo_earnings_calendar.scraper import YahooEarningsCalendar
+
+TIMESTAMP_FIELDS = (
+    'timestamp', 'next_open', 'next_close', 'created_at', 'updated_at', 'submitted_at',
+    'filled_at', 'expired_at', 'canceled_at', 'failed_at')
+
+
+class _Entity(dict):
+    '''
+    Attribute access over a raw JSON object, converting timestamp fields to pandas
+    Timestamps the way alpaca_trade_api entities do.
+    '''
+    def __getattr__(self, key):
+        if(key not in self):
+            raise AttributeError(key)
+        value = self[key]
+        if(key in TIMESTAMP_FIELDS and isinstance(value, str)):
+            import pandas as pd
+            return pd.Timestamp(value)
+        return value
+
+
+class AsyncData(object):
+
+    def __init__(
+        self,
+        key_id=None,
+        secret_key=None,
+        base_url=None,
+        polygon_url='https://api.polygon.io',
+        api_version=None,
+        api=None,
+        connections=50,
+        session=None):
+        """Return a new AsyncData object."""
+        self.key_id = key_id or os.environ.get('APCA_API_KEY_ID')
+        self.secret_key = secret_key or os.environ.get('APCA_API_SECRET_KEY')
+        self.base_url = (base_url or os.environ.get(
+            'APCA_API_BASE_URL', 'https://api.alpaca.markets')).rstrip('/')
+        self.polygon_url = polygon_url.rstrip('/')
+        self.api_version = api_version or os.environ.get('APCA_API_VERSION', 'v1')
+        # Sync REST client handed to Order objects so Order.cancelOrder keeps working.
+        self.api = api
+        self.connections = connections
+        self.retry_max = int(os.environ.get('APCA_RETRY_MAX', 3))
+        self.retry_wait = int(os.environ.get('APCA_RETRY_WAIT', 3))
+        self.session = session
+
+    async def _session(self):
+        if(self.session == None or self.session.closed):
+            import aiohttp
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections))
+        return self.session
+
+    async def close(self):
+        if(self.session != None and not self.session.closed):
+            await self.session.close()
+
+    async def __aenter__(self):
+        await self._session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _request(self, url, params=None, headers=None, raw=False):
+        session = await self._session()
+        retry = self.retry_max
+        while True:
+            async with session.get(url, params=params, headers=headers) as response:
+                if(response.status == 429 and retry > 0):
+                    retry -= 1
+                    await asyncio.sleep(self.retry_wait)
+                    continue
+                response.raise_for_status()
+                if(raw):
+                    return await response.read()
+                return await response.json()
+
+    async def _alpaca(self, path, params=None):
+        headers = {
+            'APCA-API-KEY-ID': self.key_id,
+            'APCA-API-SECRET-KEY': self.secret_key,
+        }
+        return await self._request('{}/{}{}'.format(self.base_url, self.api_version, path), params, headers)
+
+    async def _polygon(self, path, params=None, version='v1'):
+        params = dict(params or {})
+        params['apiKey'] = self.key_id
+        return await self._request('{}/{}{}'.format(self.polygon_url, version, path), params)
+
+    async def gather(self, *requests):
+        return await asyncio.gather(*requests)
+
+    async def requestAccount(self):
+        return toAccount(_Entity(await self._alpaca('/account')))
+
+    async def requestAssets(self, status='active', asset_class='us_equity'):
+        assets_json = await self._alpaca('/assets', {'status': status, 'asset_class': asset_class})
+        return [toAsset(_Entity(asset)) for asset in assets_json]
+
+    async def requestCalendar(self, start='2018-01-01', end=None):
+        params = {'start': start}
+        if(end != None):
+            params['end'] = end
+        calendar_json = await self._alpaca('/calendar', params)
+        return [toCalendar(_Entity(date)) for date in calendar_json]
+
+    async def requestClock(self):
+        return toClock(_Entity(await self._alpaca('/clock')))
+
+    async def requestEarnings(self, next_market_close=None):
+        '''Scrapes every day of the earnings window concurrently.'''
+        now = Clock.now('America/New_York')
+        date_from, date_to = earningsWindow(now)
+        days = []
+        current_date = date_from
+        while current_date <= date_to:
+            days.append(current_date)
+            current_date += datetime.timedelta(days=1)
+        pages = await asyncio.gather(*[
+            self._request(
+                YAHOO_EARNINGS_URL, {'day': day.strftime('%Y-%m-%d')}, raw=True)
+            for day in days])
+        earnings = []
+        for content in pages:
+            rows = YahooEarningsCalendar._earnings_rows(YahooEarningsCalendar._parse_data_dict(content))
+            earnings += [toEarningsDate(ed) for ed in rows]
+        return earnings
+
+    async def requestOrders(self, status='all', limit=None, after=None):
+        '''
+        Orders newest first, like Data.requestOrders.  From an `after` cutoff every page
+        is fetched (oldest first), so the oldest open order is never cut off by the
+        page limit.
+        '''
+        params = {'status': status}
+        if(limit != None):
+            params['limit'] = limit
+        if(after == None):
+            orders_json = await self._alpaca('/orders', params)
+            return [toOrder(_Entity(order), self.api) for order in orders_json]
+        limit = params.setdefault('limit', ORDER_PAGE)
+        params['direction'] = 'asc'
+        orders = {}
+        while True:
+            params['after'] = after
+            page = [_Entity(order) for order in await self._alpaca('/orders', params)]
+            for order in page:
+                orders[order.id] = order
+            after = nextOrdersAfter(page, after, limit)
+            if(after == None):
+                break
+        return [toOrder(order, self.api) for order in newestFirst(orders.values())]
+
+    async def requestPolygonSymbols(self, SORT='symbol', TYPE='cs', PER_PAGE=50, page=1, ISOTC='false', concurrency=8):
+        '''
+        Same result as Data.requestPolygonSymbols, fetching `concurrency` pages at a time
+        until a short page marks the end.
+        '''
+        polygonSymbolList = []
+        while True:
+            pages = await asyncio.gather(*[
+                self._polygon('/meta/symbols', {
+                    'sort': SORT,
+                    'type': TYPE,
+                    'perpage': PER_PAGE,
+                    'page': page + offset,
+                    'isOTC': ISOTC})
+                for offset in range(concurrency)])
+            for partialData in pages:
+                for partial in partialData['symbols']:
+                    polygonSymbolList.append(toPolygonSymbol(partial))
+                if(len(partialData['symbols']) < PER_PAGE):
+                    return polygonSymbolList
+            page += concurrency
+
+    async def requestPositions(self, ages={}):
+        positions_json = await self._alpaca('/positions')
+        return [
+            toPosition(_Entity(position), ages.get(position['symbol'], 0))
+            for position in positions_json]
+
+    async def requestHistoricAgg(self, symbol, size='day', _from=None, to=None, limit=None):
+        '''
+        Polygon aggregates as entities with open/high/low/close/volume/timestamp,
+        like api.polygon.historic_agg.
+        '''
+        import pandas as pd
+        params = {}
+        if(_from != None):
+            params['from'] = str(_from)
+        if(to != None):
+            params['to'] = str(to)
+        if(limit != None):
+            params['limit'] = limit
+        raw = await self._polygon('/historic/agg/{}/{}'.format(size, symbol), params)
+        aggs = []
+        for tick in raw.get('ticks') or []:
+            aggs.append(_Entity(
+                open=tick['o'],
+                high=tick['h'],
+                low=tick['l'],
+                close=tick['c'],
+                volume=tick['v'],
+                # Minute ticks carry 't'; daily ticks may carry only 'd'.
+                timestamp=pd.Timestamp(tick.get('t', tick.get('d')), unit='ms', tz='America/New_York')))
+        return aggs
+
+    async def requestHistoricAggs(self, symbols=[], **kwargs):
+        '''Fetches aggregates for many symbols concurrently; returns {symbol: aggs}.'''
+        results = await asyncio.gather(
+            *[self.requestHistoricAgg(symbol, **kwargs) for symbol in symbols],
+            return_exceptions=True)
+        return dict(zip(symbols, results))
+
+    async def refresh(self, data, now=None):
+        '''
+        Data.poll with the due requests made concurrently: the same polling governor
+        decides what is due, and the results go through the same Data.apply* methods.
+        Positions are only requested when the position book is due a reconcile.
+        Returns the names of the streams that were refreshed.
+        '''
+        polled = data.dueStreams(now)
+        reconcile = 'positions' in polled and data.position_book.needsReconcile()
+        requests = {}
+        if('clock' in polled):
+            requests['clock'] = self.requestClock()
+        if('orders' in polled or reconcile):
+            after = data.history.ordersAfter() if data.history != None else None
+            requests['orders'] = self.requestOrders(limit=ORDER_PAGE, after=after)
+        if(reconcile):
+            requested_at = nowNs()
+            requests['positions'] = self.requestPositions()
+        results = dict(zip(requests, await asyncio.gather(*requests.values())))
+        if('clock' in results):
+            data.applyClock(results['clock'])
+        if('orders' in results):
+            data.applyOrders(results['orders'])
+        if(reconcile):
+            data.applyPositions(results['positions'], requested_at)
+        elif('positions' in polled):
+            data.updatePositions(refresh_orders=False)
+        return polled
@@ -0,0 +1,243 @@
+'''
+Shared cache for API datasets.
+
+SharedCache sits in front of a pluggable backend: LocalCache (in-process LRU) for a single
+worker, or RedisCache so every dyno and one-off script shares one copy of each dataset.
+Each dataset type has its own TTL, and getOrFetch coalesces fetches so that only one caller
+(thread or node) downloads a given key while the others wait for its result.
+'''
+import collections
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+
+from .convert import decodeEntities, encodeEntities
+
+# Serialization format marker; bump when the encoding changes so old entries are ignored.
+FORMAT = b'C1'
+
+TTLS = {
+    'assets': 6 * 3600,
+    'asset_table': 6 * 3600,
+    'calendar': 24 * 3600,
+    'polygon_symbols': 6 * 3600,
+    'polygon_symbol_table': 6 * 3600,
+    'aggregates': 3600,
+    'earnings': 3600,
+}
+DEFAULT_TTL = 60
+
+
+def dumps(value):
+    return FORMAT + zlib.compress(pickle.dumps(encodeEntities(value), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def loads(payload):
+    if(payload == None or not payload.startswith(FORMAT)):
+        return None
+    return decodeEntities(pickle.loads(zlib.decompress(payload[len(FORMAT):])))
+
+
+class SingleFlight(object):
+    '''
+    In-process request coalescing: concurrent calls for the same key share one execution
+    of the function and all receive its result (or its exception).
+    '''
+    def __init__(self):
+        """Return a new SingleFlight object."""
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, function):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call == None
+            if(leader):
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self.calls[key] = call
+        if(not leader):
+            call['event'].wait()
+            if(call['error'] != None):
+                raise call['error']
+            return call['result']
+        try:
+            call['result'] = function()
+            return call['result']
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['event'].set()
+
+    def inFlight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+class LocalCache(object):
+    '''In-process LRU backend with per-entry expiry.'''
+
+    def __init__(self, max_entries=1024):
+        """Return a new LocalCache object."""
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if(entry == None):
+                return None
+            payload, expires = entry
+            if(expires < time.monotonic()):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, ttl):
+        with self.lock:
+            self.entries[key] = (payload, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while(len(self.entries) > self.max_entries):
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def acquireLock(self, key, ttl):
+        token = uuid.uuid4().hex
+        with self.lock:
+            held = self.locks.get(key)
+            if(held != None and held[1] > time.monotonic()):
+                return None
+            self.locks[key] = (token, time.monotonic() + ttl)
+        return token
+
+    def releaseLock(self, key, token):
+        with self.lock:
+            held = self.locks.get(key)
+            if(held != None and held[0] == token):
+                del self.locks[key]
+
+
+class RedisCache(object):
+    '''
+    Redis backend.  Pass a redis-py compatible client (fakeredis works for tests) or a URL;
+    REDIS_URL is used when neither is given.
+    '''
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client=None, url=None, prefix='algo:'):
+        """Return a new RedisCache object."""
+        if(client == None):
+            import redis
+            client = redis.Redis.from_url(url or os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, payload, ttl):
+        self.client.set(self.prefix + key, payload, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def acquireLock(self, key, ttl):
+        token = uuid.uuid4().hex
+        if(self.client.set(self.prefix + 'lock:' + key, token, nx=True, px=int(ttl * 1000))):
+            return token
+        return None
+
+    def releaseLock(self, key, token):
+        lock_key = self.prefix + 'lock:' + key
+        try:
+            self.client.eval(self.RELEASE, 1, lock_key, token)
+        except Exception:
+            # Servers or stand-ins without Lua: compare then delete.
+            held = self.client.get(lock_key)
+            if(held != None and held.decode() == token):
+                self.client.delete(lock_key)
+
+
+class SharedCache(object):
+    '''
+    Dataset cache over a backend with per-dataset TTLs and single-flight fetching.
+    '''
+    def __init__(self, backend=None, ttls=None, lock_ttl=60, poll_interval=0.1):
+        """Return a new SharedCache object."""
+        self.backend = backend if backend != None else LocalCache()
+        self.ttls = dict(TTLS)
+        self.ttls.update(ttls or {})
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, dataset):
+        return self.ttls.get(dataset, DEFAULT_TTL)
+
+    def get(self, dataset, key):
+        try:
+            return loads(self.backend.get('{}:{}'.format(dataset, key)))
+        except Exception as exc:
+            logging.warning('Cache read for {}:{} failed: {}'.format(dataset, key, exc))
+            return None
+
+    def set(self, dataset, key, value):
+        try:
+            self.backend.set('{}:{}'.format(dataset, key), dumps(value), self.ttl(dataset))
+        except Exception as exc:
+            logging.warning('Cache write for {}:{} failed: {}'.format(dataset, key, exc))
+
+    def invalidate(self, dataset, key):
+        self.backend.delete('{}:{}'.format(dataset, key))
+
+    def getOrFetch(self, dataset, key, fetch):
+        '''
+        Returns the cached value, or fetches it once across threads (SingleFlight) and
+        across nodes (a backend lock).  Nodes that lose the lock wait for the winner's
+        result, and fetch themselves only if the lock expires without one.
+        '''
+        value = self.get(dataset, key)
+        if(value != None):
+            self.hits += 1
+            return value
+        return self.flights.do((dataset, key), lambda: self._fetchOnce(dataset, key, fetch))
+
+    def _fetchOnce(self, dataset, key, fetch):
+        full_key = '{}:{}'.format(dataset, key)
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            value = self.get(dataset, key)
+            if(value != None):
+                self.hits += 1
+                return value
+            token = self.backend.acquireLock(full_key, self.lock_ttl)
+            if(token != None or time.monotonic() >= deadline):
+                break
+            time.sleep(self.poll_interval)
+        try:
+            # Someone may have finished while we were taking the lock.
+            value = self.get(dataset, key)
+            if(value != None):
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = fetch()
+            self.set(dataset, key, value)
+            return value
+        finally:
+            if(token != None):
+                self.backend.releaseLock(full_key, token)
@@ -0,0 +1,190 @@
+'''
+Market clock checks in integer epoch nanoseconds.
+
+Clock's schedule checks run on every pass of the run loop.  MarketTimes converts a
+Clock's next_open and next_close to epoch nanoseconds once, and every offset check
+("45 minutes before the open", "every minute while open") is then integer arithmetic on
+the current time.  Offsets are subtracted as whole durations, so 9:30 minus 45 minutes is
+8:45 rather than a minute of -15.
+
+The current time comes from nowNs(): the wall clock read through time.monotonic_ns(),
+so a step of the system clock (NTP, a VM resume) cannot skip or repeat a scheduled
+second between re-syncs.  setTimeSource() replaces it for tests and replays:
+
+    setTimeSource(lambda: toNs('2019-06-04T08:45:00-04:00'))
+    clock.beforeMarketOpen(minute=45)       # True
+    setTimeSource(None)
+'''
+import datetime
+import numbers
+import time
+
+SECOND_NS = 1000000000
+MINUTE_NS = 60 * SECOND_NS
+HOUR_NS = 60 * MINUTE_NS
+DAY_NS = 24 * HOUR_NS
+# How long monotonic time is trusted before the anchor is re-read from the wall clock.
+RESYNC_NS = 60 * SECOND_NS
+# Missing timestamp in int64 columns.
+NAT = -1
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+_source = None
+_anchor = None
+_synced = None
+_OFFSETS = {}
+
+
+def setTimeSource(source=None):
+    '''Installs a callable returning epoch nanoseconds as the current time; None restores the wall clock.'''
+    global _source
+    _source = source
+
+
+def timeSource():
+    return _source
+
+
+def wallNs():
+    '''Wall-clock epoch nanoseconds advanced by the monotonic clock, re-anchored every RESYNC_NS.'''
+    global _anchor, _synced
+    monotonic = time.monotonic_ns()
+    if(_anchor == None or monotonic - _synced >= RESYNC_NS):
+        _anchor = time.time_ns() - monotonic
+        _synced = monotonic
+    return _anchor + monotonic
+
+
+def nowNs():
+    if(_source != None):
+        return _source()
+    return wallNs()
+
+
+def parseTime(value):
+    '''
+    ISO 8601 string (Z or offset, up to nanoseconds) to epoch nanoseconds, or NAT when
+    it is empty or malformed.  Parsed by hand so all nine fractional digits are kept
+    without numpy.  Use toNs; this is its string case.
+    '''
+    if(not value):
+        return NAT
+    # 'T' or a space (str(pd.Timestamp)) separates the time; a bare date is midnight UTC.
+    date, _, rest = value.strip().replace(' ', 'T', 1).partition('T')
+    rest = rest.replace(' ', '')
+    if(rest.endswith('Z')):
+        rest = rest[:-1]
+    sign = max(rest.rfind('+'), rest.rfind('-'))
+    clock, offset = (rest[:sign], rest[sign:]) if sign > 0 else (rest, '')
+    whole, _, fraction = clock.partition('.')
+    try:
+        nanos = int((fraction + '000000000')[:9]) if fraction else 0
+        parsed = datetime.datetime.fromisoformat('{}T{}{}'.format(date, whole or '00:00:00', offset))
+    except ValueError:
+        return NAT
+    if(parsed.tzinfo == None):
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp()) * SECOND_NS + nanos
+
+
+def toNs(value, missing=None):
+    '''
+    The one timestamp converter: epoch nanoseconds from integer nanoseconds, an ISO 8601
+    string, a date (midnight UTC), a datetime (naive is UTC), a pandas Timestamp or a
+    numpy datetime64.  None and '' give `missing` (NAT for int64 columns).
+    '''
+    if(value is None or (isinstance(value, str) and value == '')):
+        return missing
+    if(isinstance(value, numbers.Integral)):
+        # int, numpy.int64 and the like.
+        return int(value)
+    if(isinstance(value, str)):
+        return parseTime(value)
+    if(isinstance(value, numbers.Real)):
+        return int(value)
+    if(hasattr(value, 'value') and hasattr(value, 'tz_localize')):
+        # pandas Timestamp, already nanoseconds since the epoch in UTC.
+        return int(value.value)
+    if(hasattr(value, 'astype')):
+        # numpy datetime64.
+        return int(value.astype('datetime64[ns]').astype('int64'))
+    if(not isinstance(value, datetime.datetime)):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if(value.tzinfo == None):
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - _EPOCH) // datetime.timedelta(microseconds=1) * 1000
+
+
+def offsetNs(hour=0, minute=0, second=0):
+    return ((hour * 60 + minute) * 60 + second) * SECOND_NS
+
+
+def utcOffsetNs(zone, epoch_ns):
+    '''UTC offset of `zone` at `epoch_ns`, looked up once per zone and hour.'''
+    key = (zone, epoch_ns // HOUR_NS)
+    offset = _OFFSETS.get(key)
+    if(offset == None):
+        if(len(_OFFSETS) > 1024):
+            _OFFSETS.clear()
+        local = datetime.datetime.fromtimestamp(epoch_ns // SECOND_NS, tz=zone)
+        offset = _OFFSETS[key] = local.utcoffset() // datetime.timedelta(microseconds=1) * 1000
+    return offset
+
+
+def timeOfDayNs(zone, epoch_ns):
+    '''Nanoseconds since local midnight in `zone`.'''
+    return (epoch_ns + utcOffsetNs(zone, epoch_ns)) % DAY_NS
+
+
+class MarketTimes(object):
+    '''
+    next_open
+        int     Next market open in epoch nanoseconds
+    next_close
+        int     Next market close in epoch nanoseconds
+
+    Checks match when the current time falls in the same whole second as the target,
+    the resolution the Clock checks always had.
+    '''
+    def __init__(self, next_open, next_close):
+        """Return a new MarketTimes object."""
+        self.next_open = toNs(next_open)
+        self.next_close = toNs(next_close)
+
+    def at(self, target_ns, now_ns):
+        return now_ns // SECOND_NS == target_ns // SECOND_NS
+
+    def atTimeOfDay(self, zone, target_ns, offset_ns, now_ns):
+        '''Same local time of day as target + offset, on any date; offsets past midnight wrap.'''
+        target = (timeOfDayNs(zone, target_ns) + offset_ns) % DAY_NS // SECOND_NS
+        return timeOfDayNs(zone, now_ns) // SECOND_NS == target
+
+    def afterOpen(self, zone, offset_ns, now_ns):
+        return self.atTimeOfDay(zone, self.next_open, offset_ns, now_ns)
+
+    def afterClose(self, zone, offset_ns, now_ns):
+        return self.atTimeOfDay(zone, self.next_close, offset_ns, now_ns)
+
+    def beforeOpen(self, offset_ns, now_ns):
+        return self.at(self.next_open - offset_ns, now_ns)
+
+    def beforeClose(self, offset_ns, now_ns):
+        return self.at(self.next_close - offset_ns, now_ns)
+
+    def duringHours(self, zone, now_ns, period_ns, phase_ns):
+        '''
+        Local time of day between the open and the close (inclusive, to the second) and
+        `phase_ns` into a `period_ns` period (a minute, an hour).
+        '''
+        now = timeOfDayNs(zone, now_ns) // SECOND_NS
+        if(now % (period_ns // SECOND_NS) != phase_ns // SECOND_NS):
+            return False
+        opens = timeOfDayNs(zone, self.next_open) // SECOND_NS
+        closes = timeOfDayNs(zone, self.next_close) // SECOND_NS
+        return opens <= now <= closes
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
@@ -0,0 +1,216 @@
+'''
+Request coalescing in front of the Alpaca and Polygon clients.
+
+CoalescingAPI wraps the REST client used by Data, Filter and the algos.  Read calls
+(get, get_*, list_* and everything on api.polygon) are:
+
+- deduplicated while in flight, so concurrent identical calls share one request;
+- memoized for a per-method window, so repeated calls within a run are free;
+- for daily/minute aggregates, answered from any cached wider range of the same symbol.
+
+Any other call (submit_order, cancel_order, ...) passes straight through and drops the
+memoized account, order and position reads.
+'''
+import datetime
+import threading
+import time
+
+from .cache import SingleFlight
+
+WINDOWS = {
+    'get_clock': 1.0,
+    'get_account': 5.0,
+    'list_orders': 1.0,
+    'list_positions': 2.0,
+    'list_assets': 300.0,
+    'get_calendar': 3600.0,
+    'polygon.get': 60.0,
+    'polygon.historic_agg': 300.0,
+}
+INVALIDATED_BY_WRITES = ('get_account', 'list_orders', 'list_positions', 'get_order')
+# Attributes that are nested clients, even when the wrapped object makes them look callable.
+NAMESPACES = ('polygon',)
+# Expired memo entries and aggregate ranges are dropped at most this often, on insert.
+SWEEP_INTERVAL = 30.0
+
+
+def _toDate(value):
+    if(value == None):
+        return None
+    if(isinstance(value, datetime.datetime)):
+        return value.date()
+    if(isinstance(value, datetime.date)):
+        return value
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def _barDate(bar):
+    timestamp = bar.timestamp
+    return timestamp.date() if hasattr(timestamp, 'date') else _toDate(timestamp)
+
+
+class _AggRange(object):
+    '''A fetched aggregate range for one (size, symbol).'''
+    def __init__(self, _from, to, limit, bars, expires):
+        self._from = _from
+        self.to = to
+        self.limit = limit
+        self.bars = bars
+        self.expires = expires
+
+    def covers(self, _from, to):
+        # A result cut off by its own limit does not cover the tail of its range.
+        if(self._from == None):
+            return False
+        complete = self.limit == None or len(self.bars) < self.limit
+        return complete and self._from <= _from and to <= self.to
+
+
+class CoalescingAPI(object):
+
+    def __init__(self, api, windows=None, default_window=1.0, widen_days=None, path='', shared=None):
+        """Return a new CoalescingAPI object."""
+        self._api = api
+        self._path = path
+        if(shared == None):
+            merged = dict(WINDOWS)
+            merged.update(windows or {})
+            shared = {
+                'windows': merged,
+                'default_window': default_window,
+                # Fetch at least this many days of daily aggregates so later, narrower
+                # requests for the same symbol (e.g. filterPriceRange then filterSMA) hit.
+                'widen_days': widen_days,
+                'flights': SingleFlight(),
+                'memo': {},
+                'ranges': {},
+                'swept_at': time.monotonic(),
+                'lock': threading.Lock(),
+                'hits': 0,
+                'misses': 0,
+            }
+        self._shared = shared
+
+    def __getattr__(self, name):
+        value = getattr(self._api, name)
+        path = name if self._path == '' else '{}.{}'.format(self._path, name)
+        if(callable(value) and path not in NAMESPACES):
+            if(path == 'polygon.historic_agg'):
+                return lambda *args, **kwargs: self._historicAgg(value, *args, **kwargs)
+            if(self._isRead(path)):
+                return lambda *args, **kwargs: self._read(path, value, args, kwargs)
+            return lambda *args, **kwargs: self._write(value, args, kwargs)
+        if(isinstance(value, (str, bytes, int, float, bool, type(None)))):
+            return value
+        return CoalescingAPI(value, path=path, shared=self._shared)
+
+    @staticmethod
+    def _isRead(path):
+        name = path.rsplit('.', 1)[-1]
+        return path.startswith('polygon.') or name == 'get' or name.startswith('get_') or name.startswith('list_')
+
+    def stats(self):
+        return {'hits': self._shared['hits'], 'misses': self._shared['misses']}
+
+    def invalidate(self, paths=None):
+        shared = self._shared
+        with shared['lock']:
+            if(paths == None):
+                shared['memo'].clear()
+                shared['ranges'].clear()
+                return
+            for key in list(shared['memo']):
+                if(key[0] in paths):
+                    del shared['memo'][key]
+
+    def _sweep(self, now):
+        '''
+        Drops expired memo entries and aggregate ranges, and symbols left without ranges.
+        Most keys are never read again (moving `after=` cutoffs, per-day aggregates), so
+        without this a long-running worker would keep every payload.  Call under the lock.
+        '''
+        shared = self._shared
+        if(now - shared['swept_at'] < SWEEP_INTERVAL):
+            return
+        shared['swept_at'] = now
+        memo = shared['memo']
+        for key in [key for key, entry in memo.items() if entry[0] <= now]:
+            del memo[key]
+        ranges = shared['ranges']
+        for key in list(ranges):
+            live = [cached for cached in ranges[key] if cached.expires > now]
+            if(live):
+                ranges[key] = live
+            else:
+                del ranges[key]
+
+    def _window(self, path):
+        return self._shared['windows'].get(path, self._shared['default_window'])
+
+    def _read(self, path, function, args, kwargs):
+        shared = self._shared
+        key = (path, repr(args), repr(sorted(kwargs.items())))
+        now = time.monotonic()
+        with shared['lock']:
+            entry = shared['memo'].get(key)
+            if(entry != None and entry[0] > now):
+                shared['hits'] += 1
+                return entry[1]
+
+        def fetch():
+            result = function(*args, **kwargs)
+            with shared['lock']:
+                shared['misses'] += 1
+                now = time.monotonic()
+                self._sweep(now)
+                shared['memo'][key] = (now + self._window(path), result)
+            return result
+        return shared['flights'].do(key, fetch)
+
+    def _write(self, function, args, kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.invalidate(INVALIDATED_BY_WRITES)
+
+    def _historicAgg(self, function, size='day', symbol=None, _from=None, to=None, limit=None):
+        '''historic_agg, served from a cached covering range for the symbol when there is one.'''
+        shared = self._shared
+        start = _toDate(_from)
+        end = _toDate(to) or datetime.date.today()
+        now = time.monotonic()
+        with shared['lock']:
+            for cached in shared['ranges'].get((size, symbol), []):
+                if(cached.expires > now and start != None and cached.covers(start, end)):
+                    shared['hits'] += 1
+                    bars = [bar for bar in cached.bars if start <= _barDate(bar) <= end]
+                    return bars[:limit] if limit != None else bars
+
+        fetch_from = start
+        fetch_limit = limit
+        widen = shared['widen_days']
+        if(widen and size == 'day' and start != None and (end - start).days < widen):
+            fetch_from = end - datetime.timedelta(days=widen)
+            fetch_limit = max(limit or 0, widen)
+
+        def fetch():
+            bars = list(function(
+                size=size, symbol=symbol, _from=fetch_from, to=end, limit=fetch_limit))
+            with shared['lock']:
+                shared['misses'] += 1
+                now = time.monotonic()
+                self._sweep(now)
+                ranges = [
+                    cached for cached in shared['ranges'].get((size, symbol), [])
+                    if cached.expires > now]
+                ranges.append(_AggRange(
+                    fetch_from, end, fetch_limit, bars, now + self._window('polygon.historic_agg')))
+                shared['ranges'][(size, symbol)] = ranges
+            return bars
+
+        key = ('polygon.historic_agg', size, symbol, str(fetch_from), str(end), fetch_limit)
+        bars = shared['flights'].do(key, fetch)
+        if(fetch_from != start and start != None):
+            bars = [bar for bar in bars if start <= _barDate(bar) <= end]
+            return bars[:limit] if limit != None else bars
+        return bars
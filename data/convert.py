@@ -0,0 +1,227 @@
+'''
+Builders that turn API entities into this package's data objects.
+Shared by the synchronous Data client and AsyncData so both return identical objects.
+encodeEntities/decodeEntities make raw API entities picklable for SessionLog and the
+dataset caches.
+'''
+import datetime
+import importlib
+import pickle
+
+from .alpaca_data import Account, Asset, Calendar, Clock, Order, Position
+from .earnings_data import EarningsDate
+from .clock import toNs
+from .polygon_data import PolygonSymbol
+
+# Most orders Alpaca returns per list_orders call.
+ORDER_PAGE = 500
+SIMPLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def toAccount(a):
+    return Account(
+        a.account_blocked,
+        a.buying_power,
+        a.cash,
+        a.created_at,
+        a.currency,
+        a.daytrade_count,
+        a.daytrading_buying_power,
+        a.equity,
+        a.id,
+        a.initial_margin,
+        a.last_equity,
+        a.last_maintenance_margin,
+        a.long_market_value,
+        a.maintenance_margin,
+        a.multiplier,
+        a.pattern_day_trader,
+        a.portfolio_value,
+        a.regt_buying_power,
+        a.short_market_value,
+        a.shorting_enabled,
+        a.sma,
+        a.status,
+        a.trade_suspended_by_user,
+        a.trading_blocked,
+        a.transfers_blocked)
+
+
+def toAsset(asset):
+    return Asset(
+        asset.id,
+        getattr(asset, 'class'),
+        asset.exchange,
+        asset.symbol,
+        asset.status,
+        asset.tradable,
+        asset.marginable,
+        asset.shortable,
+        asset.easy_to_borrow)
+
+
+def toCalendar(date):
+    return Calendar(date.date, date.open, date.close)
+
+
+def toClock(clock):
+    return Clock(
+        clock.timestamp,
+        clock.is_open,
+        clock.next_open,
+        clock.next_close)
+
+
+def toEarningsDate(ed):
+    return EarningsDate(
+        ed['ticker'],
+        ed['companyshortname'],
+        ed['startdatetime'],
+        ed['startdatetimetype'],
+        ed['epsestimate'],
+        ed['epsactual'],
+        ed['epssurprisepct'],
+        ed['gmtOffsetMilliSeconds'])
+
+
+def toOrder(order, api=None):
+    return Order(
+        order.id,
+        order.client_order_id,
+        order.created_at,
+        order.updated_at,
+        order.submitted_at,
+        order.filled_at,
+        order.expired_at,
+        order.canceled_at,
+        order.failed_at,
+        order.asset_id,
+        order.symbol,
+        order.asset_class,
+        order.qty,
+        order.filled_qty,
+        order.type,
+        order.side,
+        order.time_in_force,
+        order.limit_price,
+        order.stop_price,
+        order.filled_avg_price,
+        order.status,
+        order.extended_hours,
+        api)
+
+
+def toPolygonSymbol(partial):
+    return PolygonSymbol(
+        partial['symbol'],
+        partial['name'],
+        partial['type'],
+        partial['isOTC'],
+        partial['updated'],
+        partial['url'])
+
+
+def toPosition(position, age=0):
+    return Position(
+        position.asset_id,
+        position.symbol,
+        position.exchange,
+        position.asset_class,
+        position.avg_entry_price,
+        position.qty,
+        position.side,
+        position.market_value,
+        position.cost_basis,
+        position.unrealized_pl,
+        position.unrealized_plpc,
+        position.unrealized_intraday_pl,
+        position.unrealized_intraday_plpc,
+        position.current_price,
+        position.lastday_price,
+        position.change_today,
+        age)
+
+
+def earningsWindow(now):
+    '''
+    Returns the (date_from, date_to) range Data.requestEarnings scrapes: today through
+    the next trading day, skipping the weekend on Fridays.
+    '''
+    if now.weekday() == 4:
+        todate = now + datetime.timedelta(days=3)
+    else:
+        todate = now + datetime.timedelta(days=1)
+    date_from = datetime.datetime(
+        now.year, now.month, now.day, 0, 0)
+    date_to = datetime.datetime(
+        todate.year, todate.month, todate.day, 23, 59)
+    return (date_from, date_to)
+
+
+def nextOrdersAfter(page, after, limit):
+    '''
+    Returns the `after` for the page of orders following `page` (requested oldest
+    first from `after`), or None when `page` was the last one.
+    '''
+    if(len(page) < limit):
+        return None
+    last = toNs(page[-1].submitted_at)
+    moment = (datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) +
+              datetime.timedelta(microseconds=last // 1000))
+    next_after = moment.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if(next_after == after):
+        # A whole page submitted in the same instant; paging cannot move past it.
+        return None
+    return next_after
+
+
+def newestFirst(orders):
+    '''Raw order entities sorted by submission time, newest first.'''
+    return sorted(orders, key=lambda order: toNs(order.submitted_at) or 0, reverse=True)
+
+
+class _RawEntity(object):
+    '''Stand-in for an alpaca_trade_api entity: the class path and its raw JSON.'''
+    def __init__(self, module, name, raw):
+        self.module = module
+        self.name = name
+        self.raw = raw
+
+
+def encodeEntities(value):
+    '''
+    Replaces alpaca_trade_api entities (objects holding a `_raw` dict) with picklable
+    stand-ins; their __getattr__ recurses when unpickled directly.
+    '''
+    if(isinstance(value, SIMPLE_TYPES)):
+        return value
+    if(isinstance(value, list)):
+        return [encodeEntities(v) for v in value]
+    if(isinstance(value, tuple)):
+        return tuple(encodeEntities(v) for v in value)
+    if(isinstance(value, dict)):
+        return {k: encodeEntities(v) for k, v in value.items()}
+    if(isinstance(value, BaseException)):
+        try:
+            pickle.dumps(value)
+        except Exception:
+            return RuntimeError('{}: {}'.format(type(value).__name__, value))
+        return value
+    raw = getattr(value, '__dict__', {}).get('_raw')
+    if(raw != None):
+        return _RawEntity(type(value).__module__, type(value).__name__, raw)
+    return value
+
+
+def decodeEntities(value):
+    '''Rebuilds the entities replaced by encodeEntities.'''
+    if(isinstance(value, _RawEntity)):
+        cls = getattr(importlib.import_module(value.module), value.name)
+        return cls(value.raw)
+    if(isinstance(value, list)):
+        return [decodeEntities(v) for v in value]
+    if(isinstance(value, tuple)):
+        return tuple(decodeEntities(v) for v in value)
+    if(isinstance(value, dict)):
+        return {k: decodeEntities(v) for k, v in value.items()}
+    return value
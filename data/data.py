@@ -1,180 +1,145 @@
 from . import Account, Asset, Calendar, Clock, EarningsDate, Order, Position, PolygonSymbol, Filter
+from .convert import (
+    ORDER_PAGE, earningsWindow, newestFirst, nextOrdersAfter, toAccount, toAsset, toCalendar,
+    toClock, toEarningsDate, toOrder, toPolygonSymbol, toPosition)
+from .governor import PollingGovernor
+from .clock import nowNs
+from .holding import HoldingTracker
+from .positions import PositionBook
+from .risk import OPEN_STATUSES, RiskEngine
+from .snapshot import SnapshotTable
+from .tracing import OrderTracer
 from .yahoo_earnings_calendar import YahooEarningsCalendar
 import datetime
-import pandas as pd
+import logging
+
+from .logs import ThrottledLogger
+
+hot_log = ThrottledLogger(__name__)
+# Streams Data.poll and AsyncData.refresh keep current, in the order they are applied.
+STREAMS = ('clock', 'orders', 'positions')
 
 
 class Data(object):
     
-    def __init__(self, api):
+    def __init__(self, api, earnings_calendar=None, cache=None, holdings=None, history=None):
         """Return a new Data object."""
         self.api = api
+        # Optional SharedCache for the slow-changing datasets (assets, calendar, symbols, earnings).
+        self.cache = cache
+        self.earnings_calendar = earnings_calendar or YahooEarningsCalendar()
+        # Optional HistoryStore: orders are then only fetched back to the oldest one still open.
+        self.history = history
         self.account = self.requestAccount()
         self.assets = self.requestAssets()
         self.calendar_dates = self.requestCalendar()
         self.candidate_stocks = []
         self.clock = self.requestClock()
         self.earnings = self.requestEarnings()
-        self.filter = Filter(self.api)
+        self.earnings_table = self.buildEarningsTable()
+        self.snapshots = SnapshotTable(self.api)
+        self.filter = Filter(self.api, snapshots=self.snapshots, cache=self.cache)
         self.orders = self.requestOrders()
+        # Position ages come from fills, so the tracker is fed before positions are requested.
+        self.holdings = holdings or HoldingTracker()
+        self.holdings.setSessions(self.calendar_dates)
+        self.holdings.onOrders(self.orders)
+        self.tracer = OrderTracer()
+        self.recordHistory()
         self.polygon_symbols = self.requestPolygonSymbols()
-        self.positions = self.requestPositions()
+        self.position_book = PositionBook()
+        self.positions = self.reconcilePositions(refresh_orders=False)
+        self.risk = RiskEngine.fromAccount(self.account, self.orders)
+        self.session = self.clock.timestamp.date()
+        self.governor = PollingGovernor(self.calendar_dates)
+        self.governor.watch(self.api)
         self.created_at = datetime.datetime.now()
 
 
     def requestAccount(self):
-        a = self.api.get_account()
-        account = Account(
-            a.account_blocked,
-            a.buying_power,
-            a.cash,
-            a.created_at,
-            a.currency,
-            a.daytrade_count,
-            a.daytrading_buying_power,
-            a.equity,
-            a.id,
-            a.initial_margin,
-            a.last_equity,
-            a.last_maintenance_margin,
-            a.long_market_value,
-            a.maintenance_margin,
-            a.multiplier,
-            a.pattern_day_trader,
-            a.portfolio_value,
-            a.regt_buying_power,
-            a.short_market_value,
-            a.shorting_enabled,
-            a.sma,
-            a.status,
-            a.trade_suspended_by_user,
-            a.trading_blocked,
-            a.transfers_blocked)
-        return account
+        return toAccount(self.api.get_account())
 
 
     def requestAssets(self, status='active', asset_class='us_equity'):
         '''
         Requests Assets data from Alpaca and returns it as a list of Asset objects.
         '''
-        assets = []
-        assets_json = self.api.list_assets(status=status)
-
-        for asset in assets_json:
-            assets.append(
-                Asset(
-                    asset.id,
-                    getattr(asset, 'class'),
-                    asset.exchange,
-                    asset.symbol,
-                    asset.status,
-                    asset.tradable,
-                    asset.marginable,
-                    asset.shortable,
-                    asset.easy_to_borrow
-                )
-            )
-        return assets
+        return self._cached('assets', status, lambda: [
+            toAsset(asset) for asset in self.api.list_assets(status=status)])
 
 
     def requestCalendar(self, start='2018-01-01', end=None):
         '''
         Requests Dates data from Alpaca and returns it as a list of Calendar objects.
         '''
-        dates = []
-        calendar_json = self.api.get_calendar(start, end)
-        
-        for date in calendar_json:
-            dates.append(
-                Calendar(date.date, date.open, date.close)
-            )
-        return dates
+        return self._cached('calendar', '{}:{}'.format(start, end), lambda: [
+            toCalendar(date) for date in self.api.get_calendar(start, end)])
 
 
     def requestClock(self):
-        clock = self.api.get_clock()
-        clk = Clock(
-            clock.timestamp,
-            clock.is_open,
-            clock.next_open,
-            clock.next_close)
-        return clk
+        return toClock(self.api.get_clock())
     
     def requestEarnings(self, next_market_close=None):
         NY = 'America/New_York'
-        yec = YahooEarningsCalendar()
-        now = pd.Timestamp.now(tz=NY)
-        earningsDateList = []
-        
-        if now.dayofweek == 4:
-            todate = now + datetime.timedelta(days=3)
-        else:
-            todate = now + datetime.timedelta(days=1)
-        date_from = datetime.datetime(
-            now.year, now.month, now.day, 0, 0)
-        date_to = datetime.datetime(
-            todate.year, todate.month, todate.day, 23, 59)
-        earnings_json = yec.earnings_between(date_from, date_to)
-        
-        for ed in earnings_json:
-            earningsDateList.append(
-                EarningsDate(
-                    ed['ticker'],
-                    ed['companyshortname'],
-                    ed['startdatetime'],
-                    ed['startdatetimetype'],
-                    ed['epsestimate'],
-                    ed['epsactual'],
-                    ed['epssurprisepct'],
-                    ed['gmtOffsetMilliSeconds']
-                )
-            )
-        
-        return earningsDateList
+        now = Clock.now(NY)
+        date_from, date_to = earningsWindow(now)
+        return self._cached('earnings', '{:%Y-%m-%d}:{:%Y-%m-%d}'.format(date_from, date_to), lambda: [
+            toEarningsDate(ed) for ed in self.earnings_calendar.earnings_between(date_from, date_to)])
+
+
+    def buildEarningsTable(self, earnings=None):
+        '''Indexes the earnings dates by ticker and start time (see EarningsTable).'''
+        from .earnings_table import EarningsTable
+        return EarningsTable.fromEarningsDates(self.earnings if earnings == None else earnings)
 
 
-    def requestOrders(self):
+    def requestOrders(self, after=None, limit=ORDER_PAGE):
         '''
-        Requests Orders data from Alpaca and returns it as a list of Order objects.
+        Requests Orders data from Alpaca and returns it as a list of Order objects,
+        newest first.  Only orders submitted after `after` are requested; with a history
+        store that defaults to just before the oldest order still open.  From a cutoff,
+        every page is fetched (oldest first), so the oldest open order is never cut off
+        by the page limit.
         '''
-        orders = []
-        orders_json = self.api.list_orders( status='all' )
-
-        for order in orders_json:
-            orders.append(
-                Order(
-                    order.id,
-                    order.client_order_id,
-                    order.created_at,
-                    order.updated_at,
-                    order.submitted_at,
-                    order.filled_at,
-                    order.expired_at,
-                    order.canceled_at,
-                    order.failed_at,
-                    order.asset_id,
-                    order.symbol,
-                    order.asset_class,
-                    order.qty,
-                    order.filled_qty,
-                    order.type,
-                    order.side,
-                    order.time_in_force,
-                    order.limit_price,
-                    order.stop_price,
-                    order.filled_avg_price,
-                    order.status,
-                    order.extended_hours,
-                    self.api
-                )
-            )
-        return orders
+        if(after == None and getattr(self, 'history', None) != None):
+            after = self.history.ordersAfter()
+        if(after == None):
+            return [toOrder(order, self.api) for order in self.api.list_orders(status='all', limit=limit)]
+        orders = {}
+        while True:
+            page = self.api.list_orders(status='all', limit=limit, after=after, direction='asc')
+            for order in page:
+                orders[order.id] = order
+            after = nextOrdersAfter(page, after, limit)
+            if(after == None):
+                break
+        return [toOrder(order, self.api) for order in newestFirst(orders.values())]
+
+
+    def recordHistory(self):
+        '''Appends new order versions and fills to the history store, if there is one.'''
+        if(self.history == None):
+            return
+        try:
+            self.history.recordOrders(self.orders or [])
+            fills = list(self.holdings.fills)
+            self.history.recordFills(fills)
+            # Stored now, so the tracker need not keep (and re-pickle) them.
+            self.holdings.releaseFills(len(fills))
+        except Exception as exc:
+            logging.warning('Could not record order history: {}'.format(exc))
 
 
     #DONE: Equities not trading over-the-counter.
     #DONE: Equities listed as common stock (as opposed to, say, preferred stock). 
     #     'ST00000001' indicates common stock.
     def requestPolygonSymbols(self, SORT='symbol', TYPE='cs', PER_PAGE=50, page=1, ISOTC='false'):
+        key = '{}:{}:{}:{}:{}'.format(SORT, TYPE, PER_PAGE, page, ISOTC)
+        return self._cached('polygon_symbols', key, lambda: self._requestPolygonSymbols(
+            SORT, TYPE, PER_PAGE, page, ISOTC))
+
+
+    def _requestPolygonSymbols(self, SORT='symbol', TYPE='cs', PER_PAGE=50, page=1, ISOTC='false'):
         '''Pulls data from Polygon on current stocks.
         Loops several time through the api get request to pull 50 records at a time 
         of common over-the-counter stocks.
@@ -198,15 +163,7 @@ class Data(object):
                         'isOTC':ISOTC})
 
             for partial in partialData['symbols']:
-                polygonSymbolList.append(
-                    PolygonSymbol(
-                        partial['symbol'], 
-                        partial['name'], 
-                        partial['type'], 
-                        partial['isOTC'], 
-                        partial['updated'], 
-                        partial['url'])
-                )
+                polygonSymbolList.append(toPolygonSymbol(partial))
                 
             if(len(partialData['symbols']) == 50):
                 page += 1
@@ -218,40 +175,66 @@ class Data(object):
         '''
         Requests Positions data from Alpaca and returns it as a list of Order objects.
         '''
-        positions = []
-        positions_json = self.api.list_positions()
-
-        for position in positions_json:
-            positions.append(
-                Position(
-                    position.asset_id,
-                    position.symbol,
-                    position.exchange,
-                    position.asset_class,
-                    position.avg_entry_price,
-                    position.qty,
-                    position.side,
-                    position.market_value,
-                    position.cost_basis,
-                    position.unrealized_pl,
-                    position.unrealized_plpc,
-                    position.unrealized_intraday_pl,
-                    position.unrealized_intraday_plpc,
-                    position.current_price,
-                    position.lastday_price,
-                    position.change_today,
-                    self.setPositionAge(position.symbol)
-                )
-            )
-        return positions
+        return [
+            toPosition(position, self.setPositionAge(position.symbol))
+            for position in self.api.list_positions()]
+
+
+    def requestAssetTable(self, status='active'):
+        '''
+        Assets as a ColumnTable decoded straight from the JSON payload (see decode.py),
+        for screens over the whole universe.  Rows read like Asset objects.
+        '''
+        from .decode import decodeAssets
+        return self._cached('asset_table', status, lambda: decodeAssets(
+            self.api.get('/assets', {'status': status})))
+
+
+    def requestOrderTable(self, status='all', limit=None, after=None):
+        from .decode import decodeOrders
+        params = {'status': status}
+        if(limit != None):
+            params['limit'] = limit
+        if(after != None):
+            params['after'] = after
+        return decodeOrders(self.api.get('/orders', params))
+
+
+    def requestPositionTable(self):
+        from .decode import decodePositions
+        return decodePositions(self.api.get('/positions'))
+
+
+    def requestPolygonSymbolTable(self, SORT='symbol', TYPE='cs', PER_PAGE=50, page=1, ISOTC='false'):
+        '''Same pages as requestPolygonSymbols, decoded into one ColumnTable.'''
+        from .decode import decodePolygonSymbols
+
+        def fetch():
+            pages = []
+            current = page
+            while True:
+                partialData = self.api.polygon.get(
+                    path='/meta/symbols',
+                    params={'sort': SORT, 'type': TYPE, 'perpage': PER_PAGE, 'page': current, 'isOTC': ISOTC})
+                pages.append(partialData)
+                if(len(partialData['symbols']) < PER_PAGE):
+                    return decodePolygonSymbols(pages)
+                current += 1
+        key = '{}:{}:{}:{}:{}'.format(SORT, TYPE, PER_PAGE, page, ISOTC)
+        return self._cached('polygon_symbol_table', key, fetch)
+
+
+    def _cached(self, dataset, key, fetch):
+        if(self.cache == None):
+            return fetch()
+        return self.cache.getOrFetch(dataset, key, fetch)
 
 
     def canTradeStock(self, symbol=None):
         '''Checks to see if an asset is tradable.'''
         for asset in self.assets:
             if(asset.symbol == symbol):
-                print(asset.symbol)
-                print(asset.tradable)
+                hot_log.debug('%s tradable=%s', asset.symbol, asset.tradable)
                 if(asset.tradable == True):
                     return True
                 return False
@@ -259,25 +242,134 @@ class Data(object):
 
 
     def setPositionAge(self, symbol=None):
-        if(hasattr(self, 'positions')):
-            for position in self.positions:
-                if(position.symbol == symbol):
-                    return position.age
+        '''Trading sessions the symbol has been held, from the fill history.'''
+        if(hasattr(self, 'holdings')):
+            return self.holdings.age(symbol)
         return 0
 
 
-    def updatePositions(self):
-        new_postions = self.requestPositions()
-        positions = []
-        for new_position in new_postions:
-            for position in self.positions:
-                if(new_position.symbol == position.symbol):
-                    new_position.age = position.age + 1
-                    positions.append(new_position)
-                    break
+    def applyOrders(self, orders):
+        '''
+        Takes a fresh order list.  Fills the holdings tracker has not seen before are
+        also applied to the position book, and status changes go to the tracer and the
+        risk engine.  Returns the orders.
+        '''
+        self.orders = orders
+        count = self.holdings.fill_count
+        self.holdings.onOrders(orders)
+        new_fills = self.holdings.fill_count - count
+        for symbol, side, qty, price, timestamp, order_id in (self.holdings.fills[-new_fills:] if new_fills else []):
+            # Fills from before the last reconcile are already in its positions.
+            if(timestamp > self.positions_at):
+                self.position_book.applyFill(symbol, side, qty, price)
+        self.tracer.onOrders(orders)
+        self.risk.onOrders(orders)
+        self.recordHistory()
+        return orders
+
+
+    def reconcilePositions(self, refresh_orders=True):
+        '''
+        Requests positions from Alpaca and lines the holdings tracker and the position
+        book up with them.  Returns the positions, aged by the tracker.  Orders are
+        refreshed first unless the caller just did, so the fills already in the
+        positions have been seen and are not applied on top of them afterwards.
+        '''
+        if(refresh_orders):
+            self.applyOrders(self.requestOrders())
+        requested_at = nowNs()
+        return self.applyPositions(self.requestPositions(), requested_at)
+
+
+    def applyPositions(self, positions, requested_at):
+        '''
+        Takes positions requested at `requested_at` (nanoseconds) and lines the holdings
+        tracker and the position book up with them.  Orders from before the request
+        must already have gone through applyOrders.  Returns the positions, aged by the
+        tracker.
+        '''
+        self.positions_at = requested_at
+        self.holdings.reconcile(positions)
+        for position in positions:
+            position.age = self.holdings.age(position.symbol)
+        self.position_book.reconcile(positions)
+        self.positions = positions
         return positions
 
 
+    def updatePositions(self, force=False, refresh_orders=True):
+        '''
+        Between reconciles the position book follows the fills from applyOrders and the
+        snapshot table's prices, with no API call.  Positions are only requested again
+        once the book's reconcile interval has passed (or with `force`).  Returns the
+        latest Position list.
+        '''
+        if(force or self.position_book.needsReconcile()):
+            self.positions = self.reconcilePositions(refresh_orders)
+        elif(not self.snapshots.isStale()):
+            self.position_book.markPrices(self.snapshots.prices(list(self.position_book.positions)))
+        return self.positions
+
+
+    def applyClock(self, clock):
+        '''
+        Takes a fresh Clock.  When its date has moved on to a new session the risk
+        engine starts a new day, so only today's buys count towards day trades.
+        Returns the clock.
+        '''
+        self.clock = clock
+        session = clock.timestamp.date()
+        if(session != self.session):
+            self.session = session
+            self.risk.newSession()
+        return clock
+
+
+    def workingOrders(self):
+        return sum(1 for order in self.orders or [] if order.status in OPEN_STATUSES)
+
+
+    def dueStreams(self, now=None):
+        '''
+        Returns the names of the streams the polling governor says are due, in STREAMS
+        order, and marks them as polled.
+        '''
+        working = self.workingOrders()
+        due = [stream for stream in STREAMS if self.governor.due(stream, now, working, self.clock)]
+        for stream in due:
+            self.governor.mark(stream, now)
+        return due
+
+
+    def poll(self, now=None):
+        '''
+        Refreshes the clock, orders and positions, each only when the polling governor
+        says it is due.  Returns the names of the streams that were refreshed.
+        '''
+        polled = self.dueStreams(now)
+        if('clock' in polled):
+            self.applyClock(self.requestClock())
+        if('orders' in polled):
+            self.applyOrders(self.requestOrders())
+        if('positions' in polled):
+            self.updatePositions(refresh_orders='orders' not in polled)
+        return polled
+
+
+    def reconcileAccount(self, force=False):
+        '''
+        Refreshes the Account snapshot and the risk engine's cached state once its
+        reconcile interval has passed.  Call it every loop; it is a no-op in between.
+        '''
+        if(not force and not self.risk.needsReconcile()):
+            return False
+        self.account = self.requestAccount()
+        if(self.history != None):
+            self.history.recordAccount(self.account)
+        self.risk.reconcile(self.account, self.api.list_orders(status='open'))
+        return True
+
+
     def __str__(self):
         # Override to print a readable string presentation of your object
         # below is a dynamic way of doing this without explicity constructing the string manually
@@ -0,0 +1,219 @@
+'''
+Columnar decoders for raw API payloads.
+
+The request* methods build one Python object per entity, attribute by attribute, and
+anything that wants pandas converts again.  These decoders go straight from the JSON
+payload (api.get / api.polygon.get) to one typed numpy array per field:
+
+    assets = decodeAssets(api.get('/assets', {'status': 'active'}))
+    tradable = assets.where(assets['tradable'])
+    frame = tradable.toDataFrame()          # wraps the arrays, no copy
+    assets.row('AAPL').exchange             # object-style access through a RowView
+
+Numeric strings ("string<number>" fields) become float64 with NaN for missing values,
+timestamps become int64 epoch nanoseconds (-1 when missing), and text stays in object
+arrays that reference the decoded JSON strings rather than copying them.
+'''
+import numpy
+
+from .clock import NAT, toNs
+from .minute_bars import BAR_DTYPE
+
+# (column, payload key, kind)
+ASSET_COLUMNS = (
+    ('id', 'id', 'str'),
+    ('asset_class', 'class', 'str'),
+    ('exchange', 'exchange', 'str'),
+    ('symbol', 'symbol', 'str'),
+    ('status', 'status', 'str'),
+    ('tradable', 'tradable', 'bool'),
+    ('marginable', 'marginable', 'bool'),
+    ('shortable', 'shortable', 'bool'),
+    ('easy_to_borrow', 'easy_to_borrow', 'bool'),
+)
+ORDER_COLUMNS = (
+    ('id', 'id', 'str'),
+    ('client_order_id', 'client_order_id', 'str'),
+    ('created_at', 'created_at', 'time'),
+    ('updated_at', 'updated_at', 'time'),
+    ('submitted_at', 'submitted_at', 'time'),
+    ('filled_at', 'filled_at', 'time'),
+    ('expired_at', 'expired_at', 'time'),
+    ('canceled_at', 'canceled_at', 'time'),
+    ('failed_at', 'failed_at', 'time'),
+    ('asset_id', 'asset_id', 'str'),
+    ('symbol', 'symbol', 'str'),
+    ('asset_class', 'asset_class', 'str'),
+    ('qty', 'qty', 'float'),
+    ('filled_qty', 'filled_qty', 'float'),
+    ('type', 'type', 'str'),
+    ('side', 'side', 'str'),
+    ('time_in_force', 'time_in_force', 'str'),
+    ('limit_price', 'limit_price', 'float'),
+    ('stop_price', 'stop_price', 'float'),
+    ('filled_avg_price', 'filled_avg_price', 'float'),
+    ('status', 'status', 'str'),
+    ('extended_hours', 'extended_hours', 'bool'),
+)
+POSITION_COLUMNS = (
+    ('asset_id', 'asset_id', 'str'),
+    ('symbol', 'symbol', 'str'),
+    ('exchange', 'exchange', 'str'),
+    ('asset_class', 'asset_class', 'str'),
+    ('avg_entry_price', 'avg_entry_price', 'float'),
+    ('qty', 'qty', 'float'),
+    ('side', 'side', 'str'),
+    ('market_value', 'market_value', 'float'),
+    ('cost_basis', 'cost_basis', 'float'),
+    ('unrealized_pl', 'unrealized_pl', 'float'),
+    ('unrealized_plpc', 'unrealized_plpc', 'float'),
+    ('unrealized_intraday_pl', 'unrealized_intraday_pl', 'float'),
+    ('unrealized_intraday_plpc', 'unrealized_intraday_plpc', 'float'),
+    ('current_price', 'current_price', 'float'),
+    ('lastday_price', 'lastday_price', 'float'),
+    ('change_today', 'change_today', 'float'),
+)
+POLYGON_SYMBOL_COLUMNS = (
+    ('symbol', 'symbol', 'str'),
+    ('name', 'name', 'str'),
+    ('type', 'type', 'str'),
+    ('isOTC', 'isOTC', 'bool'),
+    ('updated', 'updated', 'time'),
+    ('url', 'url', 'str'),
+)
+
+
+def _float(value):
+    if(value == None or value == ''):
+        return numpy.nan
+    return float(value)
+
+
+def _column(records, key, kind):
+    count = len(records)
+    if(kind == 'float'):
+        return numpy.fromiter((_float(record.get(key)) for record in records), dtype=numpy.float64, count=count)
+    if(kind == 'int'):
+        return numpy.fromiter((int(record.get(key) or 0) for record in records), dtype=numpy.int64, count=count)
+    if(kind == 'bool'):
+        return numpy.fromiter((bool(record.get(key)) for record in records), dtype=bool, count=count)
+    if(kind == 'time'):
+        return numpy.fromiter((toNs(record.get(key), NAT) for record in records), dtype=numpy.int64, count=count)
+    column = numpy.empty(count, dtype=object)
+    column[:] = [record.get(key) for record in records]
+    return column
+
+
+def decodeRecords(records, columns):
+    '''A list of JSON objects to a ColumnTable, one pass per column.'''
+    records = records if isinstance(records, list) else list(records)
+    return ColumnTable({name: _column(records, key, kind) for name, key, kind in columns})
+
+
+def decodeAssets(payload):
+    return decodeRecords(payload, ASSET_COLUMNS)
+
+
+def decodeOrders(payload):
+    return decodeRecords(payload, ORDER_COLUMNS)
+
+
+def decodePositions(payload):
+    return decodeRecords(payload, POSITION_COLUMNS)
+
+
+def decodePolygonSymbols(pages):
+    '''One or more /meta/symbols responses to a single table.'''
+    if(isinstance(pages, dict)):
+        pages = [pages]
+    return decodeRecords([symbol for page in pages for symbol in page.get('symbols') or []], POLYGON_SYMBOL_COLUMNS)
+
+
+def decodeAggs(payload):
+    '''
+    A Polygon historic_agg response to a BAR_DTYPE array in time order, ready for
+    MinuteBarArchive.append or the indicator code, without building Agg entities.
+    '''
+    ticks = payload.get('ticks') or []
+    bars = numpy.empty(len(ticks), dtype=BAR_DTYPE)
+    if(len(ticks) == 0):
+        return bars
+    for name, key in (('open', 'o'), ('high', 'h'), ('low', 'l'), ('close', 'c'), ('volume', 'v')):
+        bars[name] = numpy.fromiter((tick[key] for tick in ticks), dtype=numpy.float64, count=len(ticks))
+    # Minute ticks carry 't' in ms; daily ticks may only have 'd'.
+    key = 't' if 't' in ticks[0] else 'd'
+    bars['timestamp'] = numpy.fromiter((tick[key] for tick in ticks), dtype=numpy.int64, count=len(ticks)) * 1000000
+    if(len(bars) > 1 and numpy.any(numpy.diff(bars['timestamp']) < 0)):
+        bars = bars[numpy.argsort(bars['timestamp'], kind='stable')]
+    return bars
+
+
+class RowView(object):
+    '''
+    Attribute access to one row of a ColumnTable, so code written against Asset, Order
+    or Position objects can read a decoded table without materializing objects.
+    '''
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        """Return a new RowView object."""
+        self._table = table
+        self._row = row
+
+    def __getattr__(self, name):
+        columns = self._table.columns
+        if(name not in columns):
+            raise AttributeError(name)
+        value = columns[name][self._row]
+        return value.item() if isinstance(value, numpy.generic) else value
+
+    def __str__(self):
+        return ', '.join(['{key}={value}'.format(key=key, value=getattr(self, key)) for key in self._table.columns])
+
+
+class ColumnTable(object):
+    '''
+    Named, equal-length numpy columns.  Slicing a table slices every column (a view for
+    plain slices, a copy for masks and index arrays); rows are RowViews.
+    '''
+    def __init__(self, columns):
+        """Return a new ColumnTable object."""
+        self.columns = columns
+        self._index = {}
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, key):
+        if(isinstance(key, str)):
+            return self.columns[key]
+        if(isinstance(key, (int, numpy.integer))):
+            return RowView(self, key)
+        return ColumnTable({name: column[key] for name, column in self.columns.items()})
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield RowView(self, row)
+
+    def __contains__(self, value):
+        return value in self.index('symbol')
+
+    def where(self, mask):
+        return self[numpy.asarray(mask, dtype=bool)]
+
+    def index(self, name='symbol'):
+        '''{value: row} for a key column, built once per column.'''
+        if(name not in self._index):
+            self._index[name] = {value: row for row, value in enumerate(self.columns[name])}
+        return self._index[name]
+
+    def row(self, value, name='symbol'):
+        '''RowView of the row whose `name` column equals `value`, or None.'''
+        row = self.index(name).get(value)
+        return RowView(self, row) if row != None else None
+
+    def toDataFrame(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns, copy=False)
@@ -0,0 +1,120 @@
+import numpy
+
+from .clock import NAT, toNs
+
+
+def _float(value):
+    if(value == None or value == ''):
+        return numpy.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+class EarningsTable(object):
+    '''
+    Columnar earnings calendar.
+    Rows are sorted by start time (epoch nanoseconds, UTC) with EPS columns as floats
+    (NaN when missing).  `by_ticker` maps each ticker to its row numbers, so symbol
+    lookups are O(1) and date windows are a binary search; screening a candidate list
+    against a window is one numpy.isin pass.
+    '''
+    def __init__(
+        self,
+        tickers,
+        company_names,
+        start_times,
+        start_types,
+        eps_estimates,
+        eps_actuals,
+        eps_surprise_pcts):
+        """Return a new EarningsTable object."""
+        order = numpy.argsort(start_times, kind='stable')
+        self.tickers = numpy.asarray(tickers, dtype=object)[order]
+        self.company_names = numpy.asarray(company_names, dtype=object)[order]
+        self.start_times = numpy.asarray(start_times, dtype=numpy.int64)[order]
+        self.start_types = numpy.asarray(start_types, dtype=object)[order]
+        self.eps_estimates = numpy.asarray(eps_estimates, dtype=float)[order]
+        self.eps_actuals = numpy.asarray(eps_actuals, dtype=float)[order]
+        self.eps_surprise_pcts = numpy.asarray(eps_surprise_pcts, dtype=float)[order]
+        self.by_ticker = {}
+        for row, ticker in enumerate(self.tickers):
+            self.by_ticker.setdefault(ticker, []).append(row)
+
+    @classmethod
+    def fromEarningsDates(cls, earnings=[]):
+        return cls(
+            [ed.ticker for ed in earnings],
+            [ed.companyshortname for ed in earnings],
+            [toNs(ed.startdatetime, NAT) for ed in earnings],
+            [ed.startdatetimetype for ed in earnings],
+            [_float(ed.epsestimate) for ed in earnings],
+            [_float(ed.epsactual) for ed in earnings],
+            [_float(ed.epssurprisepct) for ed in earnings])
+
+    @classmethod
+    def fromRows(cls, rows=[]):
+        '''Builds the table straight from YahooEarningsCalendar row dicts.'''
+        return cls(
+            [row['ticker'] for row in rows],
+            [row.get('companyshortname') for row in rows],
+            [toNs(row.get('startdatetime'), NAT) for row in rows],
+            [row.get('startdatetimetype') for row in rows],
+            [_float(row.get('epsestimate')) for row in rows],
+            [_float(row.get('epsactual')) for row in rows],
+            [_float(row.get('epssurprisepct')) for row in rows])
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.by_ticker
+
+    def rowsBetween(self, start=None, end=None):
+        '''Row slice for start <= start time < end; bounds may be datetimes or epoch ns.'''
+        lo = 0 if start == None else numpy.searchsorted(self.start_times, toNs(start), side='left')
+        hi = len(self) if end == None else numpy.searchsorted(self.start_times, toNs(end), side='left')
+        return slice(lo, hi)
+
+    def tickersBetween(self, start=None, end=None):
+        return self.tickers[self.rowsBetween(start, end)]
+
+    def nextReport(self, ticker, after=None):
+        '''Epoch ns of the ticker's first report at or after `after`, or None.'''
+        after = -1 if after == None else toNs(after)
+        for row in self.by_ticker.get(ticker, []):
+            # Rows without a time hold NAT and are never a report.
+            if(self.start_times[row] != NAT and self.start_times[row] >= after):
+                return int(self.start_times[row])
+        return None
+
+    def reportsBetween(self, ticker, start=None, end=None):
+        rows = self.rowsBetween(start, end)
+        for row in self.by_ticker.get(ticker, []):
+            if(rows.start <= row < rows.stop):
+                return True
+        return False
+
+    def reportingMask(self, symbols, start=None, end=None):
+        '''Boolean array aligned with `symbols`: True where the symbol reports in the window.'''
+        return numpy.isin(numpy.asarray(symbols, dtype=object), self.tickersBetween(start, end))
+
+    def excludeReporting(self, assets=[], start=None, end=None):
+        '''Drops assets whose symbol reports in the window, in one vectorized pass.'''
+        if(len(assets) == 0 or len(self) == 0):
+            return list(assets)
+        mask = self.reportingMask([asset.symbol for asset in assets], start, end)
+        return [asset for asset, reporting in zip(assets, mask) if not reporting]
+
+    def toDataFrame(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'ticker': self.tickers,
+            'companyshortname': self.company_names,
+            'startdatetime': pd.to_datetime(self.start_times, utc=True),
+            'startdatetimetype': self.start_types,
+            'epsestimate': self.eps_estimates,
+            'epsactual': self.eps_actuals,
+            'epssurprisepct': self.eps_surprise_pcts,
+        })
@@ -1,23 +1,31 @@
 # import concurrent.futures
 import logging
 import math
-import numpy
-import pandas as pd
 import time
 import datetime
 
+from .logs import ThrottledLogger
+
+hot_log = ThrottledLogger(__name__)
+
 class Filter(object):
     
-    def __init__(self, api):
+    def __init__(self, api, indicators=None, snapshots=None, cache=None):
         """Return a new Filter object."""
         self.api = api
+        # Optional IndicatorBook; when set, filterSMA only fetches bars newer than its state.
+        self.indicators = indicators
+        # Optional SnapshotTable; when set, filterPriceRange reads prices from it in bulk.
+        self.snapshots = snapshots
+        # Optional SharedCache for aggregate requests.
+        self.cache = cache
     
     def getAlpacaAssetsWith(self, alpaca_assets=[], attribute_name=None, attribute_value=None):
         assets = []
         for asset in alpaca_assets:
             attr = getattr(asset, attribute_name)
             if(attr == attribute_value):
-                print(asset)
+                hot_log.debug('matched %s %s=%s', asset.symbol, attribute_name, attribute_value)
                 assets.append(asset)
         return assets
 
@@ -40,48 +48,63 @@ class Filter(object):
     def filterPriceRange(self, assets=None, min_price=None, max_price=None):
         '''
         Queries the prices for each stock and only keeps stocks within a specific range.
+        Prices come from the snapshot table when one is attached; symbols it does not
+        cover fall back to a per-symbol aggregate request.
         '''
         new_assets = []
         if(assets != None and min_price != None and max_price != None):
+            if(self.snapshots != None):
+                self.snapshots.ensureFresh()
             for asset in assets:
-                try:
-                    # trade = self.api.polygon.last_trade(asset.symbol)
-                    PH = self.api.polygon.historic_agg(
-                        size='day',
-                        symbol=asset.symbol,
-                        _from=(datetime.date.today() - datetime.timedelta(days=5)),
-                        to=datetime.date.today(),
-                        limit=5)
-                    if(len(PH) > 0):
-                        # Yesterday's Closing Price
-                        lastTradePrice = float(PH[-1:][0].close)
-                        # lastTradePrice = getattr(trade, 'price')
-
-                        if(lastTradePrice >= min_price and lastTradePrice <= max_price):
-                            new_assets.append(asset)
-                        
-                except Exception as exc:
-                    logging.warning('{} generated an exception: {}'.format( asset.symbol, exc))
+                lastTradePrice = None
+                if(self.snapshots != None):
+                    lastTradePrice = self.snapshots.prevClose(asset.symbol)
+                if(lastTradePrice == None):
+                    lastTradePrice = self.getLastClose(asset.symbol)
+                if(lastTradePrice != None and lastTradePrice >= min_price and lastTradePrice <= max_price):
+                    new_assets.append(asset)
                 
         return new_assets
 
 
-    def filterSMA(self, assets=None):
-        new_assets = []
-        percent_difference = 0
-        for asset in assets:
-            agg = self.api.polygon.historic_agg(
+    def getLastClose(self, symbol=None):
+        '''Returns yesterday's closing price from a 5 day aggregate window, or None.'''
+        try:
+            # trade = self.api.polygon.last_trade(symbol)
+            PH = self.historicAgg(
                 size='day',
-                symbol=asset.symbol,
-                _from=(datetime.date.today() - datetime.timedelta(days=100)),
+                symbol=symbol,
+                _from=(datetime.date.today() - datetime.timedelta(days=5)),
                 to=datetime.date.today(),
-                limit=100)
+                limit=5)
+            if(len(PH) > 0):
+                # Yesterday's Closing Price
+                return float(PH[-1:][0].close)
+                # lastTradePrice = getattr(trade, 'price')
+        except Exception as exc:
+            logging.warning('{} generated an exception: {}'.format( symbol, exc))
+        return None
 
-            # Short close price average.
-            ShortAvg = self.getSimpleMovingAverage(agg, days=3)
 
-            # Long close price average.
-            LongAvg = self.getSimpleMovingAverage(agg, days=45)
+    def filterSMA(self, assets=None):
+        new_assets = []
+        percent_difference = 0
+        for asset in assets:
+            if(self.indicators != None):
+                ShortAvg, LongAvg = self.getIncrementalAverages(asset.symbol)
+            else:
+                agg = self.historicAgg(
+                    size='day',
+                    symbol=asset.symbol,
+                    _from=(datetime.date.today() - datetime.timedelta(days=100)),
+                    to=datetime.date.today(),
+                    limit=100)
+
+                # Short close price average.
+                ShortAvg = self.getSimpleMovingAverage(agg, days=3)
+
+                # Long close price average.
+                LongAvg = self.getSimpleMovingAverage(agg, days=45)
 
             if(ShortAvg != 0 and LongAvg != 0):
                 percent_difference = ((ShortAvg - LongAvg) / LongAvg) * 100
@@ -91,6 +114,17 @@ class Filter(object):
         return new_assets
 
 
+    def historicAgg(self, size='day', symbol=None, _from=None, to=None, limit=None):
+        '''Polygon aggregates, read through the shared cache when one is attached.'''
+        def fetch():
+            return self.api.polygon.historic_agg(
+                size=size, symbol=symbol, _from=_from, to=to, limit=limit)
+        if(self.cache == None):
+            return fetch()
+        key = '{}:{}:{}:{}:{}'.format(size, symbol, _from, to, limit)
+        return self.cache.getOrFetch('aggregates', key, fetch)
+
+
     def getSimpleMovingAverage(self, values=None, days=3):
         """
         Compute simple moving average.
@@ -107,6 +141,30 @@ class Filter(object):
         return average
 
 
+    def getIncrementalAverages(self, symbol=None):
+        '''
+        Brings the symbol's indicator state up to date and returns the 3 and 45 day averages.
+        Only bars since the last one already applied are requested.
+        '''
+        today = datetime.date.today()
+        last = self.indicators.lastTimestamp(symbol)
+        if(last == None):
+            _from = today - datetime.timedelta(days=100)
+        else:
+            _from = datetime.datetime.utcfromtimestamp(last // 1000000000).date()
+        try:
+            agg = self.historicAgg(
+                size='day',
+                symbol=symbol,
+                _from=_from,
+                to=today,
+                limit=100)
+            self.indicators.updateMany(symbol, agg)
+        except Exception as exc:
+            logging.warning('{} generated an exception: {}'.format(symbol, exc))
+        return (self.indicators.value(symbol, 'sma_3'), self.indicators.value(symbol, 'sma_45'))
+
+
     #TODO: Equities with a null value in the limited_partnership Morningstar
     # fundamental field.
     #TODO: Check Data Against MorningStar Data
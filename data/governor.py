@@ -0,0 +1,255 @@
+'''
+Market-hours-aware polling.
+
+PollingGovernor decides when the clock, orders and positions are worth polling again.
+Intervals are short while the market is open and orders are working, longer when it is
+open and nothing is working, longer still around the open and close, and long overnight,
+on weekends and on holidays (from Data.calendar_dates, so no get_clock call is needed to
+know the market is shut).  Sleeping never runs past the warm-up before the next open.
+
+It also reads the X-RateLimit-* headers off every Alpaca response and pauses all polling
+until the window resets when the remaining headroom drops under `min_remaining`, or when
+a 429 comes back.
+
+    governor = PollingGovernor(data.calendar_dates)
+    governor.watch(api)
+    if(governor.due('orders', working_orders=3)):
+        governor.mark('orders')
+        data.orders = data.requestOrders()
+'''
+import bisect
+import datetime
+import logging
+import threading
+import time
+
+from .alpaca_data import Clock, _tz
+
+logger = logging.getLogger(__name__)
+
+OPEN = 'open'
+ACTIVE = 'active'
+EDGE = 'edge'
+CLOSED = 'closed'
+HOLIDAY = 'holiday'
+
+# Seconds between polls of each stream in each market state.  ACTIVE is the market
+# open with orders working; EDGE is the warm-up before the open and the wind-down after
+# the close.
+INTERVALS = {
+    'clock': {ACTIVE: 60, OPEN: 60, EDGE: 30, CLOSED: 1800, HOLIDAY: 3600},
+    'orders': {ACTIVE: 2, OPEN: 15, EDGE: 30, CLOSED: 1800, HOLIDAY: 3600},
+    'positions': {ACTIVE: 5, OPEN: 30, EDGE: 60, CLOSED: 3600, HOLIDAY: 3600 * 6},
+}
+# Attributes that hold the wrapped client: CoalescingAPI._api, RecordingProxy._target.
+WRAPPED = ('_api', '_target')
+
+
+def _calendarDay(date):
+    value = getattr(date, 'date', date)
+    if(callable(value)):
+        value = value()
+    if(isinstance(value, datetime.datetime)):
+        return value.date()
+    if(isinstance(value, str)):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def _calendarTime(value):
+    if(isinstance(value, str)):
+        return datetime.time.fromisoformat(value)
+    if(isinstance(value, datetime.datetime)):
+        return value.time()
+    return value
+
+
+class PollingGovernor(object):
+
+    def __init__(
+        self,
+        calendar_dates=None,
+        intervals=None,
+        min_remaining=20,
+        warmup=1800,
+        wind_down=900,
+        timezone='America/New_York'):
+        """Return a new PollingGovernor object."""
+        self.intervals = {stream: dict(values) for stream, values in INTERVALS.items()}
+        for stream, values in (intervals or {}).items():
+            self.intervals.setdefault(stream, {}).update(values)
+        self.min_remaining = min_remaining
+        self.warmup = warmup
+        self.wind_down = wind_down
+        self.timezone = timezone
+        self.last_polled = {}
+        self.paused_until = 0.0
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.polls = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+        self.sessions = []
+        self.session_starts = []
+        if(calendar_dates != None):
+            self.setSessions(calendar_dates)
+
+    def setSessions(self, calendar_dates=[]):
+        '''Sessions as (open, close) epoch seconds from Calendar objects.'''
+        zone = _tz(self.timezone)
+        sessions = []
+        for date in calendar_dates:
+            day = _calendarDay(date)
+            opens = _calendarTime(getattr(date, '_open', None) or getattr(date, 'open', None))
+            closes = _calendarTime(date.close)
+            sessions.append((
+                datetime.datetime.combine(day, opens).replace(tzinfo=zone).timestamp(),
+                datetime.datetime.combine(day, closes).replace(tzinfo=zone).timestamp()))
+        self.sessions = sorted(sessions)
+        self.session_starts = [start for start, end in self.sessions]
+
+    def _now(self, now=None):
+        if(now == None):
+            return Clock.now(self.timezone).timestamp()
+        if(isinstance(now, datetime.datetime)):
+            return now.timestamp()
+        return now
+
+    def _session(self, now):
+        '''(open, close) of the session containing or preceding `now`, and the next one.'''
+        position = bisect.bisect_right(self.session_starts, now) - 1
+        current = self.sessions[position] if position >= 0 else None
+        upcoming = self.sessions[position + 1] if position + 1 < len(self.sessions) else None
+        return current, upcoming
+
+    def marketState(self, now=None, clock=None):
+        '''
+        OPEN, EDGE, CLOSED or HOLIDAY.  Without a calendar it falls back to the last
+        polled Clock object's is_open.
+        '''
+        now = self._now(now)
+        if(not self.sessions):
+            if(clock != None and clock.is_open):
+                return OPEN
+            return CLOSED
+        current, upcoming = self._session(now)
+        if(current != None and current[0] <= now < current[1]):
+            return OPEN
+        if(upcoming != None and upcoming[0] - now <= self.warmup):
+            return EDGE
+        if(current != None and now - current[1] < self.wind_down):
+            return EDGE
+        if(current != None and upcoming != None and upcoming[0] - current[1] > 86400):
+            # A weekend or holiday lies between the last close and the next open.
+            today = datetime.datetime.fromtimestamp(now, _tz(self.timezone)).date()
+            last_close = datetime.datetime.fromtimestamp(current[1], _tz(self.timezone)).date()
+            if(today != last_close):
+                return HOLIDAY
+        return CLOSED
+
+    def nextOpen(self, now=None):
+        now = self._now(now)
+        current, upcoming = self._session(now)
+        return upcoming[0] if upcoming != None else None
+
+    def interval(self, stream, now=None, working_orders=0, clock=None):
+        now = self._now(now)
+        state = self.marketState(now, clock)
+        if(state == OPEN and working_orders > 0):
+            state = ACTIVE
+        interval = self.intervals[stream][state]
+        if(state in (CLOSED, HOLIDAY)):
+            opens = self.nextOpen(now)
+            if(opens != None):
+                # Wake up in time for the warm-up before the next open.
+                interval = max(1.0, min(interval, opens - self.warmup - now))
+        return interval
+
+    def paused(self, now=None):
+        return self._now(now) < self.paused_until
+
+    def due(self, stream, now=None, working_orders=0, clock=None):
+        now = self._now(now)
+        if(self.paused(now)):
+            return False
+        last = self.last_polled.get(stream)
+        return last == None or now - last >= self.interval(stream, now, working_orders, clock)
+
+    def mark(self, stream, now=None):
+        self.last_polled[stream] = self._now(now)
+        self.polls += 1
+
+    def poll(self, stream, function, now=None, working_orders=0, clock=None):
+        '''Calls `function` and returns (True, result) if the stream is due, else (False, None).'''
+        if(not self.due(stream, now, working_orders, clock)):
+            self.skipped += 1
+            return False, None
+        self.mark(stream, now)
+        return True, function()
+
+    def secondsUntilDue(self, now=None, working_orders=0, clock=None):
+        '''Seconds until the next stream is due (or the pause lifts).'''
+        now = self._now(now)
+        if(self.paused(now)):
+            return self.paused_until - now
+        waits = []
+        for stream in self.intervals:
+            last = self.last_polled.get(stream)
+            if(last == None):
+                return 0.0
+            waits.append(last + self.interval(stream, now, working_orders, clock) - now)
+        return max(0.0, min(waits)) if waits else 0.0
+
+    def pause(self, until, reason=''):
+        with self.lock:
+            if(until > self.paused_until):
+                self.paused_until = until
+                logger.warning('Polling paused for %.0fs: %s', until - time.time(), reason)
+
+    def observe(self, status, headers, now=None):
+        '''Reads rate-limit headroom from a response's status and headers.'''
+        now = now if now != None else time.time()
+        try:
+            limit = int(headers.get('X-RateLimit-Limit'))
+            remaining = int(headers.get('X-RateLimit-Remaining'))
+        except (TypeError, ValueError):
+            # No (numeric) limit on this endpoint.
+            limit = remaining = None
+        try:
+            reset = float(headers.get('X-RateLimit-Reset'))
+        except (TypeError, ValueError):
+            reset = None
+        self.rate_limit, self.rate_remaining, self.rate_reset = limit, remaining, reset
+        if(status == 429):
+            retry = headers.get('Retry-After')
+            until = now + float(retry) if retry and retry.isdigit() else (reset or now + 60.0)
+            self.pause(until, 'rate limited (429)')
+        elif(remaining != None and remaining < self.min_remaining):
+            self.pause(reset or now + 60.0, '{} of {} requests left'.format(remaining, limit))
+
+    def watch(self, api):
+        '''
+        Hooks observe() into the requests session of an alpaca_trade_api REST client,
+        looking through wrappers such as CoalescingAPI and RecordingProxy.  Returns False
+        if there is no session to hook (a replayed session, for example).
+        '''
+        seen = set()
+        while id(api) not in seen:
+            seen.add(id(api))
+            session = vars(api).get('_session') if hasattr(api, '__dict__') else None
+            if(session != None and hasattr(session, 'hooks')):
+                session.hooks.setdefault('response', []).append(
+                    lambda response, *args, **kwargs: self.observe(response.status_code, response.headers))
+                return True
+            inner = None
+            if(hasattr(api, '__dict__')):
+                inner = next((vars(api)[name] for name in WRAPPED if name in vars(api)), None)
+            if(inner == None):
+                break
+            api = inner
+        return False
+
+    def __str__(self):
+        return 'paused={}, rate_remaining={}, polls={}, skipped={}'.format(
+            self.paused(), self.rate_remaining, self.polls, self.skipped)
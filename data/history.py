@@ -0,0 +1,347 @@
+'''
+Local long-term history of orders, fills and account equity.
+
+Each dataset is stored under `root/<dataset>/<YYYY-MM>/` as compressed numpy (.npz)
+column files, one per append, partitioned by the month of the row's time column.
+A small index.json keeps each partition's row count, time range and symbols, so a query
+by symbol and date range opens only the partitions that can match.  compact() merges a
+month's parts into one file; append does so on its own once a month has more than
+`compact_parts` parts.
+
+Orders are stored every time they change (keyed by id and updated_at); queries return
+the latest version of each order.  With a store, Data only asks Alpaca for orders
+submitted since the oldest order that was still open (see ordersAfter), instead of
+re-pulling every order ever placed.  The index keeps the open orders' submission times,
+so that cutoff is known without reading any part files.
+
+    history = HistoryStore()
+    history.recordOrders(data.orders)
+    history.recordAccount(data.account)
+    fills = history.query('fills', symbols=['AAPL'], start=datetime.date(2019, 1, 1))
+'''
+import datetime
+import glob
+import json
+import logging
+import os
+
+import numpy
+
+from .clock import NAT, toNs
+from .decode import ColumnTable
+from .risk import OPEN_STATUSES
+
+# (column, kind); the first time column partitions the dataset.
+SCHEMAS = {
+    'orders': (
+        ('created_at', 'time'),
+        ('updated_at', 'time'),
+        ('submitted_at', 'time'),
+        ('filled_at', 'time'),
+        ('canceled_at', 'time'),
+        ('id', 'str'),
+        ('client_order_id', 'str'),
+        ('symbol', 'str'),
+        ('side', 'str'),
+        ('type', 'str'),
+        ('time_in_force', 'str'),
+        ('status', 'str'),
+        ('qty', 'float'),
+        ('filled_qty', 'float'),
+        ('limit_price', 'float'),
+        ('stop_price', 'float'),
+        ('filled_avg_price', 'float'),
+    ),
+    'fills': (
+        ('timestamp', 'time'),
+        ('symbol', 'str'),
+        ('side', 'str'),
+        ('qty', 'float'),
+        ('price', 'float'),
+        ('order_id', 'str'),
+    ),
+    'equity': (
+        ('timestamp', 'time'),
+        ('equity', 'float'),
+        ('last_equity', 'float'),
+        ('cash', 'float'),
+        ('buying_power', 'float'),
+        ('long_market_value', 'float'),
+        ('short_market_value', 'float'),
+        ('portfolio_value', 'float'),
+    ),
+}
+# The newest stored value of this column is the dataset's watermark; older rows are not appended again.
+WATERMARKS = {'orders': 'updated_at', 'fills': 'timestamp', 'equity': 'timestamp'}
+KEYS = {'orders': 'id', 'fills': 'order_id', 'equity': None}
+
+
+def _float(value):
+    if(value == None or value == ''):
+        return numpy.nan
+    return float(value)
+
+
+def _columns(dataset, rows):
+    '''Rows (sequences in schema order) to typed numpy columns.'''
+    columns = {}
+    for position, (name, kind) in enumerate(SCHEMAS[dataset]):
+        values = [row[position] for row in rows]
+        if(kind == 'time'):
+            columns[name] = numpy.array([toNs(value, NAT) for value in values], dtype=numpy.int64)
+        elif(kind == 'float'):
+            columns[name] = numpy.array([_float(value) for value in values], dtype=numpy.float64)
+        else:
+            columns[name] = numpy.array(['' if value == None else str(value) for value in values], dtype=str)
+    return columns
+
+
+def _month(timestamp):
+    if(timestamp == NAT):
+        return 'unknown'
+    return datetime.datetime.utcfromtimestamp(timestamp // 1000000000).strftime('%Y-%m')
+
+
+class HistoryStore(object):
+
+    def __init__(self, root='state/history', compact_parts=32):
+        """Return a new HistoryStore object."""
+        self.root = root
+        self.compact_parts = compact_parts
+        self.index = self._loadIndex()
+        if('open' not in self.index['orders']):
+            self._rebuildOrderCursor()
+
+    def _indexPath(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _loadIndex(self):
+        try:
+            with open(self._indexPath()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            index = {dataset: {'watermark': None, 'edge': [], 'partitions': {}} for dataset in SCHEMAS}
+            index['orders'].update({'open': {}, 'newest_submitted': None})
+            return index
+
+    def _rebuildOrderCursor(self):
+        '''Fills in the open-order cursor for an index written before it was kept.'''
+        state = self.index['orders']
+        state['open'] = {}
+        state['newest_submitted'] = None
+        if(state['watermark'] != None):
+            self._trackOrders(self._columnsOf(self.query('orders', start=None)))
+            self._saveIndex()
+
+    @staticmethod
+    def _columnsOf(table):
+        return {name: numpy.asarray(table[name]) for name, kind in SCHEMAS['orders']}
+
+    def _trackOrders(self, columns):
+        '''Updates the open orders' submission times and the newest submission from new order rows.'''
+        state = self.index['orders']
+        submitted = columns['submitted_at']
+        for i in numpy.argsort(columns['updated_at'], kind='stable'):
+            order_id = str(columns['id'][i])
+            if(str(columns['status'][i]) in OPEN_STATUSES and submitted[i] != NAT):
+                state['open'][order_id] = int(submitted[i])
+            else:
+                state['open'].pop(order_id, None)
+        known = submitted[submitted != NAT]
+        if(len(known)):
+            newest = int(known.max())
+            if(state['newest_submitted'] == None or newest > state['newest_submitted']):
+                state['newest_submitted'] = newest
+
+    def _saveIndex(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self._indexPath() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self._indexPath())
+
+    def _partitionDir(self, dataset, month):
+        return os.path.join(self.root, dataset, month)
+
+    def append(self, dataset, rows):
+        '''
+        Appends rows (sequences in SCHEMAS order).  Rows at or before the dataset's
+        watermark that are already stored are skipped.  Returns the number written.
+        '''
+        rows = list(rows)
+        if(not rows):
+            return 0
+        columns = _columns(dataset, rows)
+        state = self.index[dataset]
+        watermark_column = columns[WATERMARKS[dataset]]
+        key = KEYS[dataset]
+        keep = numpy.ones(len(rows), dtype=bool)
+        if(state['watermark'] != None):
+            keep = watermark_column > state['watermark']
+            if(key != None):
+                # Same timestamp as the watermark: new only if its key was not stored at it.
+                edge = (watermark_column == state['watermark']) & ~numpy.isin(columns[key], state['edge'])
+                keep |= edge
+        if(not keep.any()):
+            return 0
+        columns = {name: column[keep] for name, column in columns.items()}
+        watermark_column = columns[WATERMARKS[dataset]]
+        partition_column = columns[SCHEMAS[dataset][0][0]]
+        months = numpy.array([_month(int(timestamp)) for timestamp in partition_column])
+        for month in numpy.unique(months):
+            selected = months == month
+            self._writePart(dataset, str(month), {name: column[selected] for name, column in columns.items()})
+        if(dataset == 'orders'):
+            self._trackOrders(columns)
+
+        newest = int(watermark_column.max())
+        if(state['watermark'] == None or newest > state['watermark']):
+            state['watermark'] = newest
+            state['edge'] = []
+        if(key != None):
+            state['edge'] = sorted(set(state['edge']) | set(columns[key][watermark_column == state['watermark']].tolist()))
+        self._saveIndex()
+        for month in numpy.unique(months):
+            if(state['partitions'][str(month)]['parts'] > self.compact_parts):
+                self.compact(dataset, str(month))
+        return int(keep.sum())
+
+    def _writePart(self, dataset, month, columns):
+        directory = self._partitionDir(dataset, month)
+        os.makedirs(directory, exist_ok=True)
+        partitions = self.index[dataset]['partitions']
+        meta = partitions.setdefault(month, {'parts': 0, 'rows': 0, 'start': None, 'end': None, 'symbols': []})
+        path = os.path.join(directory, 'part-{:05d}.npz'.format(meta['parts']))
+        tmp_path = path + '.tmp.npz'
+        numpy.savez_compressed(tmp_path, **columns)
+        os.replace(tmp_path, path)
+        times = columns[SCHEMAS[dataset][0][0]]
+        meta['parts'] += 1
+        meta['rows'] += len(times)
+        meta['start'] = int(times.min()) if meta['start'] == None else min(meta['start'], int(times.min()))
+        meta['end'] = int(times.max()) if meta['end'] == None else max(meta['end'], int(times.max()))
+        if('symbol' in columns):
+            meta['symbols'] = sorted(set(meta['symbols']) | set(columns['symbol'].tolist()))
+
+    def _readPartition(self, dataset, month):
+        parts = sorted(glob.glob(os.path.join(self._partitionDir(dataset, month), 'part-*.npz')))
+        loaded = []
+        for path in parts:
+            with numpy.load(path) as part:
+                loaded.append({name: part[name] for name in part.files})
+        if(not loaded):
+            return None
+        return {name: numpy.concatenate([part[name] for part in loaded]) for name in loaded[0]}
+
+    def query(self, dataset, start=None, end=None, symbols=None, latest=True):
+        '''
+        Rows with start <= time < end (on the partition column) for `symbols`, as a
+        ColumnTable in time order.  Orders come back as their latest version unless
+        latest is False.
+        '''
+        start = toNs(start)
+        end = toNs(end)
+        wanted = set(symbols) if symbols != None else None
+        pieces = []
+        for month, meta in sorted(self.index[dataset]['partitions'].items()):
+            if(start != None and meta['end'] < start):
+                continue
+            if(end != None and meta['start'] >= end):
+                continue
+            if(wanted != None and not wanted.intersection(meta['symbols'])):
+                continue
+            columns = self._readPartition(dataset, month)
+            if(columns == None):
+                continue
+            times = columns[SCHEMAS[dataset][0][0]]
+            mask = numpy.ones(len(times), dtype=bool)
+            if(start != None):
+                mask &= times >= start
+            if(end != None):
+                mask &= times < end
+            if(wanted != None):
+                mask &= numpy.isin(columns['symbol'], list(wanted))
+            pieces.append({name: column[mask] for name, column in columns.items()})
+        if(not pieces):
+            columns = _columns(dataset, [])
+        else:
+            columns = {name: numpy.concatenate([piece[name] for piece in pieces]) for name in pieces[0]}
+        if(dataset == 'orders' and latest and len(columns['id'])):
+            columns = self._latestOrders(columns)
+        order = numpy.argsort(columns[SCHEMAS[dataset][0][0]], kind='stable')
+        table = ColumnTable({name: column[order] for name, column in columns.items()})
+        for name, kind in SCHEMAS[dataset]:
+            if(kind == 'str'):
+                # Back to object arrays, as decode.py returns text columns.
+                table.columns[name] = table.columns[name].astype(object)
+        return table
+
+    @staticmethod
+    def _latestOrders(columns):
+        order = numpy.lexsort((columns['updated_at'], columns['id']))
+        ids = columns['id'][order]
+        last = numpy.append(ids[1:] != ids[:-1], True)
+        keep = order[last]
+        return {name: column[keep] for name, column in columns.items()}
+
+    def compact(self, dataset, month=None):
+        '''Merges each month's part files into one (superseded order versions are dropped).'''
+        months = [month] if month != None else list(self.index[dataset]['partitions'])
+        for month in months:
+            meta = self.index[dataset]['partitions'].get(month)
+            if(meta == None or meta['parts'] <= 1):
+                continue
+            columns = self._readPartition(dataset, month)
+            if(dataset == 'orders'):
+                columns = self._latestOrders(columns)
+            directory = self._partitionDir(dataset, month)
+            old_parts = sorted(glob.glob(os.path.join(directory, 'part-*.npz')))
+            del self.index[dataset]['partitions'][month]
+            # The merged part is written under a new number before the old ones go.
+            self.index[dataset]['partitions'][month] = {
+                'parts': meta['parts'], 'rows': 0, 'start': None, 'end': None, 'symbols': []}
+            self._writePart(dataset, month, columns)
+            self.index[dataset]['partitions'][month]['parts'] = 1
+            merged = os.path.join(directory, 'part-{:05d}.npz'.format(meta['parts']))
+            for path in old_parts:
+                os.remove(path)
+            os.replace(merged, os.path.join(directory, 'part-00000.npz'))
+            self._saveIndex()
+            logging.info('History: compacted {} {} to {} rows'.format(dataset, month, len(columns[SCHEMAS[dataset][0][0]])))
+
+    def recordOrders(self, orders=[]):
+        # Order objects keep the order type as `_type`; API entities as `type`.
+        names = [('_type' if name == 'type' else name) for name, kind in SCHEMAS['orders']]
+        return self.append('orders', [
+            [getattr(order, name, None) if hasattr(order, name) else getattr(order, name.lstrip('_'), None)
+             for name in names] for order in orders])
+
+    def recordFills(self, fills=[]):
+        '''HoldingTracker.fills rows: (symbol, side, qty, price, timestamp, order_id).'''
+        return self.append('fills', [
+            (timestamp, symbol, side, qty, price, order_id) for symbol, side, qty, price, timestamp, order_id in fills])
+
+    def recordAccount(self, account, now=None):
+        from .alpaca_data import Clock
+        now = toNs(now) if now != None else toNs(Clock.now())
+        return self.append('equity', [[now] + [getattr(account, name, None) for name, kind in SCHEMAS['equity'][1:]]])
+
+    def ordersAfter(self):
+        '''
+        Submission time to pass as list_orders(after=...) so every order that can still
+        change is fetched: just before the oldest order stored as open, or the newest
+        stored order.  None when nothing is stored yet.  Read from the index only.
+        '''
+        state = self.index['orders']
+        if(state['open']):
+            cutoff = min(state['open'].values())
+        else:
+            cutoff = state['newest_submitted']
+        if(cutoff == None):
+            return None
+        # `after` is exclusive; step back a second so the boundary order is included.
+        moment = datetime.datetime.fromtimestamp(cutoff // 1000000000 - 1, datetime.timezone.utc)
+        return moment.isoformat().replace('+00:00', 'Z')
+
+    def __len__(self):
+        return sum(meta['rows'] for state in self.index.values() for meta in state['partitions'].values())
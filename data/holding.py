@@ -0,0 +1,264 @@
+import bisect
+import collections
+import datetime
+import logging
+import os
+import pickle
+
+from .alpaca_data import Clock, _tz
+from .clock import toNs
+from .risk import OPEN_STATUSES
+
+
+class Lot(object):
+    '''
+    qty
+        number  Signed quantity still open from one fill (negative for short lots)
+    price
+        number  Fill price
+    opened_at
+        int     Fill time in epoch nanoseconds
+    order_id
+        string  Order that opened the lot
+    '''
+    def __init__(self, qty, price, opened_at, order_id=None):
+        """Return a new Lot object."""
+        self.qty = qty
+        self.price = price
+        self.opened_at = opened_at
+        self.order_id = order_id
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class HoldingTracker(object):
+    '''
+    Position ages and holding periods computed from fills and the trading calendar.
+
+    Fills are applied FIFO per symbol as they appear on orders (onOrder only applies
+    the part of filled_qty it has not seen, so feeding the same orders again is safe).
+    A position's age is the number of trading sessions since it was opened from flat,
+    so it no longer depends on how often positions are refreshed, and it survives
+    restarts because the tracker is saved with its lots.  Only the most recent
+    `keep_fills` fills are kept; Data moves them to its HistoryStore when it has one.
+    '''
+    def __init__(self, calendar_dates=None, timezone='America/New_York', keep_fills=1000):
+        """Return a new HoldingTracker object."""
+        self.timezone = timezone
+        self.lots = {}
+        self.opened = {}
+        self.seen = {}
+        # Orders in `seen` that can no longer fill; forgotten once they leave the order list.
+        self.done = set()
+        self.fills = []
+        self.keep_fills = keep_fills
+        self.fill_count = 0
+        self.session_ordinals = []
+        self.session_index = {}
+        if(calendar_dates != None):
+            self.setSessions(calendar_dates)
+
+    def setSessions(self, calendar_dates=[]):
+        '''Indexes the trading days from Data.calendar_dates (Calendar objects or dates).'''
+        ordinals = set()
+        for date in calendar_dates:
+            value = getattr(date, 'date', date)
+            if(callable(value)):
+                value = value()
+            if(isinstance(value, str)):
+                value = datetime.date.fromisoformat(value[:10])
+            ordinals.add(value.toordinal())
+        self.session_ordinals = sorted(ordinals)
+        self.session_index = {ordinal: i for i, ordinal in enumerate(self.session_ordinals)}
+
+    def _sessionIndex(self, day):
+        ordinal = day.toordinal()
+        index = self.session_index.get(ordinal)
+        if(index == None):
+            # Not a trading day: count it as the last session before it.
+            index = bisect.bisect_right(self.session_ordinals, ordinal) - 1
+        return index
+
+    def _day(self, timestamp):
+        return datetime.datetime.fromtimestamp(timestamp / 1e9, _tz(self.timezone)).date()
+
+    def __contains__(self, symbol):
+        return symbol in self.opened
+
+    def __len__(self):
+        return len(self.opened)
+
+    def qty(self, symbol):
+        return sum(lot.qty for lot in self.lots.get(symbol, ()))
+
+    def openedAt(self, symbol):
+        return self.opened.get(symbol)
+
+    def age(self, symbol, today=None):
+        '''Trading sessions since the position was opened; 0 on the opening day or if flat.'''
+        opened = self.opened.get(symbol)
+        if(opened == None):
+            return 0
+        today = today or Clock.now(self.timezone).date()
+        if(len(self.session_ordinals) == 0):
+            return max(0, (today - self._day(opened)).days)
+        return max(0, self._sessionIndex(today) - self._sessionIndex(self._day(opened)))
+
+    def ages(self, today=None):
+        return {symbol: self.age(symbol, today) for symbol in self.opened}
+
+    def holdingPeriod(self, symbol, now=None):
+        '''Seconds since the position was opened, or None if flat.'''
+        opened = self.opened.get(symbol)
+        if(opened == None):
+            return None
+        now = toNs(now) if now != None else toNs(Clock.now(self.timezone))
+        return (now - opened) / 1e9
+
+    def lotAges(self, symbol, today=None):
+        '''(qty, sessions held) for each open lot, oldest first.'''
+        today = today or Clock.now(self.timezone).date()
+        return [
+            (lot.qty, max(0, self._sessionIndex(today) - self._sessionIndex(self._day(lot.opened_at))))
+            for lot in self.lots.get(symbol, ())]
+
+    def hasFillHistory(self):
+        return self.fill_count > 0
+
+    def releaseFills(self, count):
+        '''Forgets the oldest `count` fills once they are stored elsewhere (a HistoryStore).'''
+        del self.fills[:count]
+
+    def _consume(self, lots, signed):
+        '''Closes `signed` against the oldest opposite lots first; returns what is left of it.'''
+        while signed != 0 and lots and (lots[0].qty > 0) != (signed > 0):
+            lot = lots[0]
+            closed = min(abs(signed), abs(lot.qty))
+            lot.qty += closed if lot.qty < 0 else -closed
+            signed += -closed if signed > 0 else closed
+            if(abs(lot.qty) < 1e-9):
+                lots.popleft()
+        return signed
+
+    def applyFill(self, symbol, side, qty, price, timestamp, order_id=None):
+        '''Applies one execution (unsigned qty) FIFO against the symbol's open lots.'''
+        signed = float(qty) if side == 'buy' else -float(qty)
+        price = float(price)
+        self.fills.append((symbol, side, float(qty), price, timestamp, order_id))
+        if(len(self.fills) > self.keep_fills):
+            del self.fills[:-self.keep_fills]
+        self.fill_count += 1
+        lots = self.lots.setdefault(symbol, collections.deque())
+        signed = self._consume(lots, signed)
+        if(abs(signed) > 1e-9):
+            if(not lots):
+                # Opened from flat (or flipped through it).
+                self.opened[symbol] = timestamp
+            lots.append(Lot(signed, price, timestamp, order_id))
+        if(not lots):
+            del self.lots[symbol]
+            self.opened.pop(symbol, None)
+
+    def onOrder(self, order):
+        '''Applies whatever part of the order's filled_qty has not been applied yet.'''
+        filled = float(order.filled_qty or 0)
+        seen_qty, seen_notional = self.seen.get(order.id, (0.0, 0.0))
+        if(filled <= seen_qty):
+            return False
+        notional = filled * float(order.filled_avg_price or 0)
+        delta = filled - seen_qty
+        # Price of just the new part, from the change in filled notional.
+        price = (notional - seen_notional) / delta
+        timestamp = (
+            toNs(order.filled_at) or toNs(order.updated_at) or toNs(order.submitted_at) or
+            toNs(Clock.now(self.timezone)))
+        self.applyFill(order.symbol, order.side, delta, price, timestamp, order.id)
+        self.seen[order.id] = (filled, notional)
+        if(order.status not in OPEN_STATUSES):
+            self.done.add(order.id)
+        return True
+
+    def onOrders(self, orders=[]):
+        '''
+        Applies fills from a list of orders in fill-time order; returns how many changed.
+        `orders` is the full list from the last poll: finished orders no longer on it
+        are never returned again, so their entries in `seen` are dropped.
+        '''
+        for order in orders:
+            if(order.id in self.seen and order.status not in OPEN_STATUSES):
+                self.done.add(order.id)
+        pending = [
+            order for order in orders
+            if float(order.filled_qty or 0) > self.seen.get(order.id, (0.0, 0.0))[0]]
+        pending.sort(key=lambda order: toNs(order.filled_at) or toNs(order.updated_at) or 0)
+        changed = sum(1 for order in pending if self.onOrder(order))
+        listed = set(order.id for order in orders)
+        for order_id in [order_id for order_id in self.done if order_id not in listed]:
+            self.seen.pop(order_id, None)
+            self.done.discard(order_id)
+        return changed
+
+    def reconcile(self, positions=[], now=None):
+        '''
+        Lines the lots up with the broker's positions.  A position with no fill history
+        (bought before tracking started) gets a lot opened `now`; a shortfall is taken
+        from the oldest lots first, as a fill would be, and a surplus is added to the
+        newest lot; symbols the broker no longer holds are dropped.
+        '''
+        now = toNs(now) if now != None else toNs(Clock.now(self.timezone))
+        held = {}
+        for position in positions:
+            qty = float(position.qty)
+            if(getattr(position, 'side', 'long') == 'short' and qty > 0):
+                qty = -qty
+            held[position.symbol] = (qty, float(position.avg_entry_price))
+        for symbol in list(self.lots):
+            if(symbol not in held):
+                logging.info('Holdings: dropping {}, no longer held'.format(symbol))
+                del self.lots[symbol]
+                self.opened.pop(symbol, None)
+        for symbol, (qty, price) in held.items():
+            difference = qty - self.qty(symbol)
+            if(abs(difference) < 1e-9):
+                continue
+            lots = self.lots.get(symbol)
+            if(lots and (lots[0].qty > 0) == (difference > 0)):
+                lots[-1].qty += difference
+            elif(lots):
+                # Whatever is left after closing every lot is re-opened below at `now`.
+                self._consume(lots, difference)
+            if(not self.lots.get(symbol)):
+                self.lots[symbol] = collections.deque([Lot(qty, price, now)])
+                self.opened[symbol] = now
+
+    def save(self, path):
+        '''Writes the tracker atomically so a crash mid-write keeps the previous state.'''
+        directory = os.path.dirname(path)
+        if(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, calendar_dates=None):
+        '''Loads a saved tracker, or returns an empty one if there is none.'''
+        try:
+            with open(path, 'rb') as f:
+                tracker = pickle.load(f)
+        except FileNotFoundError:
+            tracker = cls()
+        except Exception as exc:
+            logging.warning('Could not load holdings from {}: {}'.format(path, exc))
+            tracker = cls()
+        # Trackers saved before fills were pruned.
+        tracker.__dict__.setdefault('done', set())
+        tracker.__dict__.setdefault('keep_fills', 1000)
+        tracker.__dict__.setdefault('fill_count', len(tracker.fills))
+        if(calendar_dates != None):
+            tracker.setSessions(calendar_dates)
+        return tracker
@@ -0,0 +1,302 @@
+import logging
+import os
+import pickle
+from collections import deque
+
+from .clock import toNs
+
+
+def barTime(bar):
+    '''
+    Returns the bar timestamp as integer epoch nanoseconds (see clock.toNs).
+    Accepts pandas Timestamps (Polygon aggregates), datetimes and plain integers.
+    '''
+    ts = getattr(bar, 'timestamp', bar)
+    if(callable(ts)):
+        # A datetime or Timestamp was passed directly, not a bar.
+        ts = bar
+    return toNs(ts)
+
+
+class RollingSMA(object):
+    '''
+    Simple moving average over the last `window` values.
+    Keeps a running sum so each update is O(1).  Like Filter.getSimpleMovingAverage,
+    the sum is always divided by `window`.
+    '''
+    def __init__(self, window=3, resync=1000):
+        """Return a new RollingSMA object."""
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.resync = resync
+        self.updates = 0
+
+    def update(self, value):
+        if(len(self.values) == self.window):
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self.updates += 1
+        # Re-sum now and then so floating point drift cannot accumulate.
+        if(self.updates % self.resync == 0):
+            self.total = float(sum(self.values))
+        return self.value()
+
+    def replace(self, value):
+        '''Swaps the most recent value for a revised one.'''
+        self.total += value - self.values[-1]
+        self.values[-1] = value
+        return self.value()
+
+    def isReady(self):
+        return len(self.values) == self.window
+
+    def value(self):
+        return self.total / self.window
+
+
+class EMA(object):
+    '''
+    Exponential moving average with alpha = 2 / (span + 1), seeded with the first value.
+    '''
+    def __init__(self, span=12):
+        """Return a new EMA object."""
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.count = 0
+        self.average = 0.0
+
+    def update(self, value):
+        self.previous = self.average
+        if(self.count == 0):
+            self.average = float(value)
+        else:
+            self.average += self.alpha * (value - self.average)
+        self.count += 1
+        return self.average
+
+    def replace(self, value):
+        '''Recomputes the last update with a revised value.'''
+        previous = getattr(self, 'previous', None)
+        if(previous == None):
+            # Saved before replace existed; keep the average as it is.
+            return self.average
+        self.average = float(value) if self.count == 1 else previous + self.alpha * (value - previous)
+        return self.average
+
+    def isReady(self):
+        return self.count >= self.span
+
+    def value(self):
+        return self.average
+
+
+class RollingVariance(object):
+    '''
+    Sample variance over the last `window` values using a windowed Welford update.
+    '''
+    def __init__(self, window=20):
+        """Return a new RollingVariance object."""
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        if(len(self.values) < self.window):
+            self.values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.values[0]
+            self.values.append(value)
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+            if(self.m2 < 0):
+                self.m2 = 0.0
+        return self.value()
+
+    def replace(self, value):
+        '''Swaps the most recent value and re-sums the window.'''
+        self.values[-1] = value
+        self.mean = 0.0
+        self.m2 = 0.0
+        for count, item in enumerate(self.values, 1):
+            delta = item - self.mean
+            self.mean += delta / count
+            self.m2 += delta * (item - self.mean)
+        return self.value()
+
+    def isReady(self):
+        return len(self.values) == self.window
+
+    def value(self):
+        if(len(self.values) < 2):
+            return 0.0
+        return self.m2 / (len(self.values) - 1)
+
+
+class VWAP(object):
+    '''
+    Session volume weighted average price using the typical price (high + low + close) / 3.
+    Resets whenever a bar from a new session day arrives.
+    '''
+    DAY = 86400 * 1000000000
+
+    def __init__(self, session_offset=0):
+        """Return a new VWAP object."""
+        self.session_offset = session_offset
+        self.session = None
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def updateBar(self, bar):
+        session = (barTime(bar) + self.session_offset) // self.DAY
+        if(session != self.session):
+            self.session = session
+            self.price_volume = 0.0
+            self.volume = 0.0
+        price = (bar.high + bar.low + bar.close) / 3.0
+        self.last = (price * bar.volume, bar.volume)
+        self.price_volume += price * bar.volume
+        self.volume += bar.volume
+        return self.value()
+
+    def replaceBar(self, bar):
+        '''Takes the last bar's contribution back out and adds the revised bar.'''
+        price_volume, volume = getattr(self, 'last', (0.0, 0.0))
+        self.price_volume -= price_volume
+        self.volume -= volume
+        price = (bar.high + bar.low + bar.close) / 3.0
+        self.last = (price * bar.volume, bar.volume)
+        self.price_volume += price * bar.volume
+        self.volume += bar.volume
+        return self.value()
+
+    def isReady(self):
+        return self.volume > 0
+
+    def value(self):
+        if(self.volume == 0):
+            return 0.0
+        return self.price_volume / self.volume
+
+
+DEFAULT_SPEC = {
+    'sma_3': (RollingSMA, {'window': 3}),
+    'sma_45': (RollingSMA, {'window': 45}),
+    'ema_12': (EMA, {'span': 12}),
+    'var_20': (RollingVariance, {'window': 20}),
+    'vwap': (VWAP, {}),
+}
+
+
+class SymbolIndicators(object):
+    '''
+    Indicator state for a single symbol.
+    Bars before `last_timestamp` are ignored so the same cached bars can be fed again safely.
+    A bar with the same timestamp replaces the last one, so a partial daily bar fetched
+    intraday gives way to the final close.
+    '''
+    def __init__(self, symbol, spec=None):
+        """Return a new SymbolIndicators object."""
+        self.symbol = symbol
+        self.last_timestamp = None
+        self.indicators = {}
+        for name, (cls, kwargs) in (spec or DEFAULT_SPEC).items():
+            self.indicators[name] = cls(**kwargs)
+
+    def update(self, bar):
+        timestamp = barTime(bar)
+        if(self.last_timestamp != None and timestamp < self.last_timestamp):
+            return False
+        if(timestamp == self.last_timestamp):
+            for indicator in self.indicators.values():
+                if(hasattr(indicator, 'replaceBar')):
+                    indicator.replaceBar(bar)
+                else:
+                    indicator.replace(bar.close)
+            return False
+        for indicator in self.indicators.values():
+            if(hasattr(indicator, 'updateBar')):
+                indicator.updateBar(bar)
+            else:
+                indicator.update(bar.close)
+        self.last_timestamp = timestamp
+        return True
+
+    def value(self, name):
+        return self.indicators[name].value()
+
+    def isReady(self, name):
+        return self.indicators[name].isReady()
+
+
+class IndicatorBook(object):
+    '''
+    Incremental indicators keyed by symbol.
+    Feed it new bars as they arrive from a cache or a stream; save it to disk and load it
+    on the next run so only bars newer than the saved state need to be fetched.
+    '''
+    def __init__(self, spec=None):
+        """Return a new IndicatorBook object."""
+        self.spec = spec or DEFAULT_SPEC
+        self.symbols = {}
+
+    def get(self, symbol):
+        return self.symbols.get(symbol)
+
+    def update(self, symbol, bar):
+        state = self.symbols.get(symbol)
+        if(state == None):
+            state = SymbolIndicators(symbol, self.spec)
+            self.symbols[symbol] = state
+        return state.update(bar)
+
+    def updateMany(self, symbol, bars=[]):
+        '''Feeds bars in time order and returns how many were new.'''
+        count = 0
+        for bar in bars:
+            if(self.update(symbol, bar)):
+                count += 1
+        return count
+
+    def value(self, symbol, name):
+        state = self.symbols.get(symbol)
+        if(state == None):
+            return 0
+        return state.value(name)
+
+    def lastTimestamp(self, symbol):
+        state = self.symbols.get(symbol)
+        if(state == None):
+            return None
+        return state.last_timestamp
+
+    def save(self, path):
+        '''Writes the book atomically so a crash mid-write keeps the previous state.'''
+        directory = os.path.dirname(path)
+        if(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, spec=None):
+        '''Loads a saved book, or returns an empty one if there is none.'''
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return cls(spec)
+        except Exception as exc:
+            logging.warning('Could not load indicators from {}: {}'.format(path, exc))
+            return cls(spec)
+
+    def __len__(self):
+        return len(self.symbols)
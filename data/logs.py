@@ -0,0 +1,128 @@
+'''
+Logging setup for the worker.
+
+setupLogging routes every record through a queue so callers never block on stdout;
+a single background listener formats and writes them.  Levels can be set per logger
+with LOG_LEVELS, e.g. LOG_LEVELS="data.filter=DEBUG,algos=WARNING".
+
+ThrottledLogger wraps a logger for hot paths: when the level is disabled a call costs
+one isEnabledFor check, and when enabled output is sampled and rate limited.
+'''
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+FORMAT = 'ts=%(asctime)s level=%(levelname)s logger=%(name)s msg="%(message)s"'
+
+_listener = None
+
+
+class KeyValueFormatter(logging.Formatter):
+    '''Appends the `fields` dict passed through `extra` as key=value pairs.'''
+
+    def format(self, record):
+        line = super(KeyValueFormatter, self).format(record)
+        fields = getattr(record, 'fields', None)
+        if(fields):
+            line += ' ' + ' '.join('{}={}'.format(key, value) for key, value in fields.items())
+        return line
+
+
+def parseLevels(spec):
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.strip().partition('=')
+        if(name and level):
+            levels[name] = level.upper()
+    return levels
+
+
+def setupLogging(level=None, levels=None, stream=None):
+    '''
+    Installs a QueueHandler on the root logger and starts the listener thread.
+    Safe to call more than once; later calls only update levels.
+    '''
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or os.environ.get('LOG_LEVEL', 'INFO')).upper())
+    for name, logger_level in (levels if levels != None else parseLevels(os.environ.get('LOG_LEVELS'))).items():
+        logging.getLogger(name).setLevel(logger_level)
+    if(_listener != None):
+        return _listener
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(KeyValueFormatter(FORMAT))
+    records = queue.Queue(-1)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stopLogging)
+    return _listener
+
+
+def stopLogging():
+    '''Flushes queued records and stops the listener.'''
+    global _listener
+    if(_listener != None):
+        _listener.stop()
+        _listener = None
+
+
+class ThrottledLogger(object):
+    '''
+    Logs at most `rate` records per second (token bucket with `burst` capacity) and only
+    every `sample`-th call.  Suppressed records are counted and reported with the next
+    record that gets through.
+    '''
+    def __init__(self, logger, rate=10.0, burst=20, sample=1):
+        """Return a new ThrottledLogger object."""
+        self.logger = logger if isinstance(logger, logging.Logger) else logging.getLogger(logger)
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def _allow(self):
+        with self.lock:
+            self.calls += 1
+            if(self.calls % self.sample != 0):
+                self.suppressed += 1
+                return 0
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if(self.tokens < 1):
+                self.suppressed += 1
+                return 0
+            self.tokens -= 1
+            suppressed = self.suppressed
+            self.suppressed = 0
+            return suppressed + 1
+
+    def log(self, level, msg, *args):
+        if(not self.logger.isEnabledFor(level)):
+            return
+        allowed = self._allow()
+        if(allowed == 0):
+            return
+        if(allowed > 1):
+            self.logger.log(level, msg, *args, extra={'fields': {'suppressed': allowed - 1}})
+        else:
+            self.logger.log(level, msg, *args)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
@@ -0,0 +1,178 @@
+import datetime
+import json
+import logging
+import os
+import numpy
+
+from .clock import toNs
+
+BAR_DTYPE = numpy.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+DAY_NS = 86400 * 1000000000
+
+
+class MinuteBarArchive(object):
+    '''
+    Append-only local archive of minute bars.
+    Each symbol has a file of fixed-width BAR_DTYPE records in time order and a small
+    JSON index mapping each UTC day (epoch days) to its [offset, count] in that file.
+    Range queries return read-only numpy.memmap slices, so no bar data is copied.
+    '''
+    def __init__(self, root='state/minute_bars'):
+        """Return a new MinuteBarArchive object."""
+        self.root = root
+        self.indexes = {}
+        self.maps = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _dataPath(self, symbol):
+        return os.path.join(self.root, '{}.bars'.format(symbol))
+
+    def _indexPath(self, symbol):
+        return os.path.join(self.root, '{}.idx.json'.format(symbol))
+
+    def _index(self, symbol):
+        index = self.indexes.get(symbol)
+        if(index == None):
+            try:
+                with open(self._indexPath(symbol)) as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                index = {'count': 0, 'last': None, 'days': {}}
+            # Drop any records written after the last index update (e.g. a crash mid-append).
+            data_path = self._dataPath(symbol)
+            expected = index['count'] * BAR_DTYPE.itemsize
+            if(os.path.exists(data_path) and os.path.getsize(data_path) > expected):
+                with open(data_path, 'r+b') as f:
+                    f.truncate(expected)
+            self.indexes[symbol] = index
+        return index
+
+    def _writeIndex(self, symbol, index):
+        tmp_path = self._indexPath(symbol) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._indexPath(symbol))
+
+    def symbols(self):
+        return sorted(name[:-len('.idx.json')] for name in os.listdir(self.root) if name.endswith('.idx.json'))
+
+    def lastTimestamp(self, symbol):
+        return self._index(symbol)['last']
+
+    def append(self, symbol, records):
+        '''
+        Appends a BAR_DTYPE array sorted by timestamp.
+        Records at or before the last stored bar are skipped; returns the number appended.
+        '''
+        records = numpy.asarray(records, dtype=BAR_DTYPE)
+        index = self._index(symbol)
+        if(index['last'] != None):
+            records = records[records['timestamp'] > index['last']]
+        if(len(records) == 0):
+            return 0
+        with open(self._dataPath(symbol), 'ab') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        offset = index['count']
+        days = records['timestamp'] // DAY_NS
+        boundaries = numpy.flatnonzero(numpy.diff(days)) + 1
+        starts = numpy.concatenate(([0], boundaries))
+        ends = numpy.concatenate((boundaries, [len(records)]))
+        for start, end in zip(starts, ends):
+            key = str(int(days[start]))
+            if(key in index['days']):
+                index['days'][key][1] += int(end - start)
+            else:
+                index['days'][key] = [int(offset + start), int(end - start)]
+        index['count'] += len(records)
+        index['last'] = int(records['timestamp'][-1])
+        self._writeIndex(symbol, index)
+        self.maps.pop(symbol, None)
+        return len(records)
+
+    def _map(self, symbol):
+        index = self._index(symbol)
+        cached = self.maps.get(symbol)
+        if(cached is not None and len(cached) == index['count']):
+            return cached
+        if(index['count'] == 0):
+            return numpy.zeros(0, dtype=BAR_DTYPE)
+        bars = numpy.memmap(self._dataPath(symbol), dtype=BAR_DTYPE, mode='r', shape=(index['count'],))
+        self.maps[symbol] = bars
+        return bars
+
+    def bars(self, symbol, start=None, end=None):
+        '''
+        Returns a zero-copy view of the bars with start <= timestamp < end.
+        start and end may be dates, datetimes, pandas Timestamps or epoch nanoseconds.
+        '''
+        index = self._index(symbol)
+        bars = self._map(symbol)
+        if(len(bars) == 0):
+            return bars
+        lo = 0
+        hi = len(bars)
+        day_keys = sorted(int(day) for day in index['days'])
+        if(start != None):
+            start = toNs(start)
+            # Narrow to the first indexed day on or after the start day.
+            first = numpy.searchsorted(day_keys, start // DAY_NS)
+            if(first < len(day_keys)):
+                lo = index['days'][str(day_keys[first])][0]
+            else:
+                lo = hi
+        if(end != None):
+            end = toNs(end)
+            last = numpy.searchsorted(day_keys, end // DAY_NS, side='right')
+            if(last > 0):
+                offset, count = index['days'][str(day_keys[last - 1])]
+                hi = min(hi, offset + count)
+            else:
+                hi = lo
+        window = bars[lo:hi]
+        timestamps = window['timestamp']
+        a = 0 if start == None else numpy.searchsorted(timestamps, start, side='left')
+        b = len(window) if end == None else numpy.searchsorted(timestamps, end, side='left')
+        return window[a:b]
+
+    def lookback(self, symbol, end=None, minutes=60):
+        '''Returns the last `minutes` bars before end (or the latest bars).'''
+        bars = self.bars(symbol, end=end) if end != None else self._map(symbol)
+        return bars[-minutes:]
+
+    def fill(self, api, symbol, start=None, end=None, limit=50000):
+        '''
+        Downloads minute aggregates from Polygon's historic_agg endpoint and appends anything
+        newer than what is already stored.
+        '''
+        end = end or datetime.date.today()
+        last = self.lastTimestamp(symbol)
+        if(last != None):
+            start = datetime.datetime.utcfromtimestamp(last // 1000000000).date()
+        elif(start == None):
+            start = end - datetime.timedelta(days=5)
+        from .decode import decodeAggs
+        try:
+            # Raw payload straight into BAR_DTYPE columns; no Agg entities in between.
+            payload = api.polygon.get(
+                '/historic/agg/minute/{}'.format(symbol),
+                {'from': str(start), 'to': str(end), 'limit': limit})
+        except Exception as exc:
+            logging.warning('{} generated an exception: {}'.format(symbol, exc))
+            return 0
+        return self.append(symbol, decodeAggs(payload))
+
+    def fillMany(self, api, symbols=[], start=None, end=None):
+        total = 0
+        for symbol in symbols:
+            total += self.fill(api, symbol, start=start, end=end)
+        return total
@@ -0,0 +1,226 @@
+import time
+
+
+class TrackedPosition(object):
+    '''
+    Numeric, in-memory view of a position.
+    qty is signed: positive for long, negative for short.
+    '''
+    def __init__(
+        self,
+        symbol,
+        qty=0.0,
+        avg_entry_price=0.0,
+        current_price=0.0,
+        lastday_price=0.0,
+        age=0,
+        asset_id=None):
+        """Return a new TrackedPosition object."""
+        self.symbol = symbol
+        self.qty = qty
+        self.avg_entry_price = avg_entry_price
+        self.current_price = current_price
+        self.lastday_price = lastday_price
+        self.age = age
+        self.asset_id = asset_id
+
+    @classmethod
+    def fromPosition(cls, position):
+        '''Parses the API string fields of a Position once.'''
+        qty = float(position.qty)
+        if(position.side == 'short' and qty > 0):
+            qty = -qty
+        return cls(
+            position.symbol,
+            qty,
+            float(position.avg_entry_price),
+            float(position.current_price),
+            float(position.lastday_price or 0),
+            position.age,
+            position.asset_id)
+
+    @property
+    def side(self):
+        return 'short' if self.qty < 0 else 'long'
+
+    @property
+    def market_value(self):
+        return self.qty * self.current_price
+
+    @property
+    def cost_basis(self):
+        return self.qty * self.avg_entry_price
+
+    @property
+    def unrealized_pl(self):
+        return (self.current_price - self.avg_entry_price) * self.qty
+
+    @property
+    def unrealized_plpc(self):
+        if(self.cost_basis == 0):
+            return 0.0
+        return self.unrealized_pl / abs(self.cost_basis)
+
+    @property
+    def unrealized_intraday_pl(self):
+        if(self.lastday_price == 0):
+            return 0.0
+        return (self.current_price - self.lastday_price) * self.qty
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class PositionBook(object):
+    '''
+    Symbol-keyed positions kept in numeric form.
+    Fills and price ticks are applied incrementally and the portfolio totals
+    (net/gross exposure, unrealized P&L) are maintained as running sums, so
+    risk checks are O(1) and need no API round trip.  Call reconcile with the
+    result of Data.requestPositions every `reconcile_interval` seconds to correct drift.
+    '''
+    def __init__(self, reconcile_interval=300):
+        """Return a new PositionBook object."""
+        self.positions = {}
+        self.reconcile_interval = reconcile_interval
+        self.reconciled_at = None
+        self.realized_pl = 0.0
+        self.net_exposure = 0.0
+        self.gross_exposure = 0.0
+        self.unrealized_pl = 0.0
+
+    @classmethod
+    def fromPositions(cls, positions=[], reconcile_interval=300):
+        book = cls(reconcile_interval)
+        book.reconcile(positions)
+        return book
+
+    def _remove(self, position):
+        self.net_exposure -= position.market_value
+        self.gross_exposure -= abs(position.market_value)
+        self.unrealized_pl -= position.unrealized_pl
+
+    def _add(self, position):
+        self.net_exposure += position.market_value
+        self.gross_exposure += abs(position.market_value)
+        self.unrealized_pl += position.unrealized_pl
+
+    def get(self, symbol):
+        return self.positions.get(symbol)
+
+    def age(self, symbol):
+        position = self.positions.get(symbol)
+        if(position == None):
+            return 0
+        return position.age
+
+    def __contains__(self, symbol):
+        return symbol in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def applyFill(self, symbol, side, qty, price):
+        '''
+        Applies an execution.  Returns the realized P&L of the fill.
+        side is 'buy' or 'sell'; qty is the unsigned filled quantity.
+        '''
+        qty = float(qty)
+        price = float(price)
+        signed = qty if side == 'buy' else -qty
+        if(signed == 0):
+            return 0.0
+        position = self.positions.get(symbol)
+        if(position == None):
+            position = TrackedPosition(symbol, 0.0, price, price)
+        else:
+            self._remove(position)
+
+        realized = 0.0
+        if(position.qty == 0 or (position.qty > 0) == (signed > 0)):
+            # Opening or adding: weighted average entry price.
+            total = position.qty + signed
+            position.avg_entry_price = (
+                position.avg_entry_price * position.qty + price * signed) / total
+            position.qty = total
+        else:
+            closed = min(abs(signed), abs(position.qty))
+            direction = 1 if position.qty > 0 else -1
+            realized = (price - position.avg_entry_price) * closed * direction
+            position.qty += signed
+            if(abs(position.qty) < 1e-9):
+                position.qty = 0.0
+            elif((position.qty > 0) != (direction > 0)):
+                # Flipped through zero: the remainder opens at the fill price.
+                position.avg_entry_price = price
+                position.age = 0
+        position.current_price = price
+        self.realized_pl += realized
+
+        if(position.qty == 0):
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = position
+            self._add(position)
+        return realized
+
+    def markPrice(self, symbol, price):
+        '''Applies a price tick for a held symbol.'''
+        position = self.positions.get(symbol)
+        if(position == None):
+            return
+        self._remove(position)
+        position.current_price = float(price)
+        self._add(position)
+
+    def markPrices(self, prices={}):
+        for symbol, price in prices.items():
+            self.markPrice(symbol, price)
+
+    def reconcile(self, positions=[], now=None):
+        '''
+        Replaces the book with Position objects from the API.
+        Ages come from the Position objects, which Data sets before calling this.
+        '''
+        self.positions = {}
+        self.net_exposure = 0.0
+        self.gross_exposure = 0.0
+        self.unrealized_pl = 0.0
+        for position in positions:
+            tracked = TrackedPosition.fromPosition(position)
+            self.positions[tracked.symbol] = tracked
+            self._add(tracked)
+        self.reconciled_at = now if now != None else time.monotonic()
+
+    def needsReconcile(self, now=None):
+        if(self.reconciled_at == None):
+            return True
+        now = now if now != None else time.monotonic()
+        return now - self.reconciled_at >= self.reconcile_interval
+
+    def longExposure(self):
+        return (self.gross_exposure + self.net_exposure) / 2.0
+
+    def shortExposure(self):
+        return (self.gross_exposure - self.net_exposure) / 2.0
+
+    def canAdd(self, symbol, qty, price, max_gross_exposure=None, max_position_value=None):
+        '''
+        Checks whether buying (qty > 0) or selling (qty < 0) would stay within limits.
+        '''
+        position = self.positions.get(symbol)
+        current_qty = position.qty if position != None else 0.0
+        current_value = abs(current_qty * price)
+        new_value = abs((current_qty + qty) * price)
+        if(max_position_value != None and new_value > max_position_value):
+            return False
+        if(max_gross_exposure != None and
+            self.gross_exposure - current_value + new_value > max_gross_exposure):
+            return False
+        return True
+
+    def __str__(self):
+        return 'positions={}, net_exposure={}, gross_exposure={}, unrealized_pl={}, realized_pl={}'.format(
+            len(self.positions), self.net_exposure, self.gross_exposure, self.unrealized_pl, self.realized_pl)
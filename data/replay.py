@@ -0,0 +1,213 @@
+'''
+Record live sessions and replay them offline.
+
+Wrap the Alpaca client and the Yahoo scraper in RecordingProxy objects to append every
+call and its result to a SessionLog.  Later, ReplayProxy objects serve the same results
+back in the same order while a VirtualClock drives Clock, so a full trading day can be
+re-run, profiled and debugged in seconds:
+
+    log = SessionLog('state/session.log')
+    data = Data(RecordingProxy(api, log), RecordingProxy(YahooEarningsCalendar(), log, 'yahoo'))
+
+    clock = VirtualClock(log.firstTimestamp())
+    clock.install()
+    session = ReplaySession(log, clock)
+    data = Data(session.proxy('api'), session.proxy('yahoo'))
+'''
+import collections
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+# _RawEntity is imported so logs pickled when it lived here still load.
+from .convert import SIMPLE_TYPES, _RawEntity, decodeEntities, encodeEntities
+
+HEADER = struct.Struct('<I')
+
+
+class ReplayFinished(Exception):
+    '''Raised when a replay asks for a call the log has no more records for.'''
+    pass
+
+
+class SessionLog(object):
+    '''
+    Append-only log of length-prefixed, zlib-compressed pickle records.
+    Each record is (wall time ns, elapsed ns, call path, args, kwargs, ok, result).
+    '''
+    def __init__(self, path):
+        """Return a new SessionLog object."""
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def append(self, path, args, kwargs, ok, result, wall_ns, elapsed_ns):
+        record = (wall_ns, elapsed_ns, path, encodeEntities(args), encodeEntities(kwargs), ok, encodeEntities(result))
+        payload = zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            if(self.file == None):
+                directory = os.path.dirname(self.path)
+                if(directory):
+                    os.makedirs(directory, exist_ok=True)
+                self.file = open(self.path, 'ab')
+            self.file.write(HEADER.pack(len(payload)))
+            self.file.write(payload)
+            self.file.flush()
+
+    def records(self):
+        '''Yields decoded records in the order they were written.'''
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(HEADER.size)
+                if(len(header) < HEADER.size):
+                    return
+                payload = f.read(HEADER.unpack(header)[0])
+                if(len(payload) == 0):
+                    return
+                try:
+                    wall_ns, elapsed_ns, path, args, kwargs, ok, result = pickle.loads(zlib.decompress(payload))
+                except zlib.error:
+                    # A torn write at the end of the log from a crash.
+                    logging.warning('Truncated record at the end of {}'.format(self.path))
+                    return
+                yield (wall_ns, elapsed_ns, path, decodeEntities(args), decodeEntities(kwargs), ok, decodeEntities(result))
+
+    def firstTimestamp(self):
+        for record in self.records():
+            return record[0]
+        return None
+
+    def close(self):
+        with self.lock:
+            if(self.file != None):
+                self.file.close()
+                self.file = None
+
+
+class RecordingProxy(object):
+    '''
+    Wraps a client object and logs every method call made through it, including calls
+    on nested clients such as api.polygon.  Exceptions are recorded and re-raised.
+    '''
+    def __init__(self, target, log, path='api'):
+        """Return a new RecordingProxy object."""
+        self._target = target
+        self._log = log
+        self._path = path
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        path = '{}.{}'.format(self._path, name)
+        if(callable(value)):
+            return _RecordingCall(value, self._log, path)
+        if(isinstance(value, SIMPLE_TYPES)):
+            return value
+        return RecordingProxy(value, self._log, path)
+
+
+class _RecordingCall(object):
+
+    def __init__(self, function, log, path):
+        self.function = function
+        self.log = log
+        self.path = path
+
+    def __call__(self, *args, **kwargs):
+        wall_ns = int(time.time() * 1e9)
+        started = time.monotonic()
+        try:
+            result = self.function(*args, **kwargs)
+        except Exception as exc:
+            self.log.append(self.path, args, kwargs, False, exc, wall_ns, int((time.monotonic() - started) * 1e9))
+            raise
+        self.log.append(self.path, args, kwargs, True, result, wall_ns, int((time.monotonic() - started) * 1e9))
+        return result
+
+
+class VirtualClock(object):
+    '''
+    Virtual wall clock for replays.  install() makes Clock.now read it.
+    sleep advances virtual time instantly, or at 1/speed of real time when speed is set.
+    '''
+    def __init__(self, start_ns=None, speed=None):
+        """Return a new VirtualClock object."""
+        self.now_ns = start_ns if start_ns != None else int(time.time() * 1e9)
+        self.speed = speed
+
+    def time_ns(self):
+        return self.now_ns
+
+    def time(self):
+        return self.now_ns / 1e9
+
+    def advanceTo(self, wall_ns):
+        if(wall_ns > self.now_ns):
+            self.now_ns = wall_ns
+
+    def sleep(self, seconds):
+        if(self.speed):
+            time.sleep(seconds / self.speed)
+        self.now_ns += int(seconds * 1e9)
+
+    def install(self):
+        from .clock import setTimeSource
+        setTimeSource(self.time_ns)
+
+    def uninstall(self):
+        from .clock import setTimeSource
+        setTimeSource(None)
+
+
+class ReplaySession(object):
+    '''
+    Loads a SessionLog into per call-path FIFO queues and hands out proxies over them.
+    '''
+    def __init__(self, log, clock=None):
+        """Return a new ReplaySession object."""
+        self.log = log
+        self.clock = clock
+        self.queues = collections.defaultdict(collections.deque)
+        for record in log.records():
+            self.queues[record[2]].append(record)
+
+    def proxy(self, path='api'):
+        return ReplayProxy(self, path)
+
+    def next(self, path, args, kwargs):
+        queue = self.queues.get(path)
+        if(not queue):
+            raise ReplayFinished(path)
+        wall_ns, elapsed_ns, path, rec_args, rec_kwargs, ok, result = queue.popleft()
+        if(rec_args != args or rec_kwargs != kwargs):
+            logging.debug('Replay argument mismatch for {}'.format(path))
+        if(self.clock != None):
+            self.clock.advanceTo(wall_ns + elapsed_ns)
+        if(not ok):
+            raise result
+        return result
+
+    def remaining(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+
+class ReplayProxy(object):
+    '''
+    Serves recorded results in place of a live client.  Calls are matched by call path
+    in recorded order; arguments that differ from the recording are logged, not fatal.
+    '''
+    def __init__(self, session, path='api'):
+        """Return a new ReplayProxy object."""
+        self._session = session
+        self._path = path
+
+    def __getattr__(self, name):
+        if(name.startswith('__')):
+            raise AttributeError(name)
+        return ReplayProxy(self._session, '{}.{}'.format(self._path, name))
+
+    def __call__(self, *args, **kwargs):
+        return self._session.next(self._path, args, kwargs)
@@ -0,0 +1,224 @@
+import time
+
+OPEN_STATUSES = ('new', 'accepted', 'pending_new', 'accepted_for_bidding', 'partially_filled', 'open')
+CLOSED_STATUSES = ('canceled', 'expired', 'rejected', 'done_for_day', 'replaced', 'stopped', 'suspended')
+
+
+def _float(value, default=0.0):
+    if(value == None or value == ''):
+        return default
+    return float(value)
+
+
+class Reservation(object):
+    '''
+    Buying power held for a working order.
+    `counted` is True when the order was already open at the last reconcile, so the
+    account snapshot's buying_power already accounts for it.
+    '''
+    def __init__(self, order_id, symbol, side, qty, price, counted=False):
+        """Return a new Reservation object."""
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.price = price
+        self.counted = counted
+
+    def notional(self):
+        if(self.side != 'buy'):
+            return 0.0
+        return self.qty * self.price
+
+
+class RiskDecision(object):
+
+    def __init__(self, order, approved, reason=None):
+        """Return a new RiskDecision object."""
+        self.order = order
+        self.approved = approved
+        self.reason = reason
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class RiskEngine(object):
+    '''
+    Local pre-trade checks against a cached account state.
+    The Account snapshot is parsed once per reconcile; order events and fills keep
+    buying power, reservations and the day trade count current in between, so batches
+    of intended orders can be validated without calling get_account per order.
+    '''
+    PDT_EQUITY = 25000.00
+    PDT_DAYTRADES = 3
+
+    def __init__(self, reconcile_interval=300, max_order_value=None):
+        """Return a new RiskEngine object."""
+        self.reconcile_interval = reconcile_interval
+        self.max_order_value = max_order_value
+        self.reconciled_at = None
+        self.buying_power = 0.0
+        self.equity = 0.0
+        self.last_equity = 0.0
+        self.multiplier = 1.0
+        self.daytrade_count = 0
+        self.pattern_day_trader = False
+        self.blocked = False
+        self.shorting_enabled = False
+        self.reservations = {}
+        self.reserved = 0.0
+        self.bought_today = set()
+        # Sell orders already counted as a day trade, so partial fills count once.
+        self.daytraded_orders = set()
+
+    @classmethod
+    def fromAccount(cls, account, open_orders=[], reconcile_interval=300, max_order_value=None):
+        engine = cls(reconcile_interval, max_order_value)
+        engine.reconcile(account, open_orders)
+        return engine
+
+    def reconcile(self, account, open_orders=[], now=None):
+        '''
+        Resets the cached state from a fresh Account and the currently open orders.
+        Reservations for orders that are still open are kept but marked as counted.
+        '''
+        self.buying_power = _float(account.buying_power)
+        self.equity = _float(account.equity)
+        self.last_equity = _float(account.last_equity)
+        self.multiplier = _float(account.multiplier, 1.0)
+        self.daytrade_count = int(_float(account.daytrade_count))
+        self.pattern_day_trader = bool(account.pattern_day_trader)
+        self.shorting_enabled = bool(account.shorting_enabled)
+        self.blocked = bool(
+            account.account_blocked or account.trading_blocked or account.trade_suspended_by_user)
+
+        reservations = {}
+        for order in open_orders:
+            if(order.status not in OPEN_STATUSES):
+                continue
+            remaining = _float(order.qty) - _float(order.filled_qty)
+            price = _float(order.limit_price) or _float(order.stop_price)
+            reservations[order.id] = Reservation(
+                order.id, order.symbol, order.side, remaining, price, counted=True)
+        self.reservations = reservations
+        self.reserved = 0.0
+        self.reconciled_at = now if now != None else time.monotonic()
+
+    def needsReconcile(self, now=None):
+        if(self.reconciled_at == None):
+            return True
+        now = now if now != None else time.monotonic()
+        return now - self.reconciled_at >= self.reconcile_interval
+
+    def availableBuyingPower(self):
+        return self.buying_power - self.reserved
+
+    def canDayTrade(self):
+        '''Same rule as Account.canDayTrade, or a PDT account under the day trade limit.'''
+        if(self.equity > self.PDT_EQUITY):
+            return True
+        return self.daytrade_count < self.PDT_DAYTRADES
+
+    def onOrderSubmitted(self, order_id, symbol, side, qty, price):
+        reservation = Reservation(order_id, symbol, side, _float(qty), _float(price))
+        self.reservations[order_id] = reservation
+        self.reserved += reservation.notional()
+
+    def onFill(self, order_id, symbol, side, qty, price):
+        '''Applies a (partial) fill: converts the reservation into spent buying power.'''
+        qty = _float(qty)
+        price = _float(price)
+        reservation = self.reservations.get(order_id)
+        counted = reservation != None and reservation.counted
+        if(reservation != None):
+            filled = min(qty, reservation.qty)
+            if(not counted):
+                self.reserved -= filled * reservation.price if side == 'buy' else 0.0
+            reservation.qty -= filled
+            if(reservation.qty <= 0):
+                del self.reservations[order_id]
+        if(side == 'buy'):
+            if(not counted):
+                self.buying_power -= qty * price
+            self.bought_today.add(symbol)
+        else:
+            if(symbol in self.bought_today and order_id not in self.daytraded_orders):
+                self.daytraded_orders.add(order_id)
+                self.daytrade_count += 1
+            if(self.multiplier > 1):
+                self.buying_power += qty * price
+
+    def onOrderClosed(self, order_id):
+        '''Releases whatever is left of a canceled, expired or rejected order.'''
+        reservation = self.reservations.pop(order_id, None)
+        if(reservation != None and not reservation.counted):
+            self.reserved -= reservation.notional()
+        elif(reservation != None):
+            self.buying_power += reservation.notional()
+
+    def onOrderUpdate(self, order):
+        '''
+        Applies an Order (or trade update order entity): any quantity filled since the
+        reservation was last updated, then closing statuses.  Only orders with a
+        reservation are applied, so the same order can be passed on every poll.
+        '''
+        reservation = self.reservations.get(order.id)
+        if(reservation == None):
+            return
+        # The reservation holds what is left, so qty - reservation.qty is already applied.
+        new_fill = _float(order.filled_qty) - (_float(order.qty) - reservation.qty)
+        if(new_fill > 0):
+            self.onFill(order.id, order.symbol, order.side, new_fill, _float(order.filled_avg_price, reservation.price))
+        if(order.status in CLOSED_STATUSES):
+            self.onOrderClosed(order.id)
+
+    def onOrders(self, orders=[]):
+        for order in orders:
+            self.onOrderUpdate(order)
+
+    def newSession(self):
+        '''Call at the start of each trading day.'''
+        self.bought_today = set()
+        self.daytraded_orders = set()
+
+    def validate(self, orders=[]):
+        '''
+        Validates a batch of intended orders in sequence, each approved order consuming
+        buying power for the ones after it.  Orders need symbol, side, qty and
+        limit_price (or price) attributes.  Returns a list of RiskDecision objects.
+        '''
+        decisions = []
+        available = self.availableBuyingPower()
+        daytrades = self.daytrade_count
+        for order in orders:
+            qty = _float(order.qty)
+            price = _float(getattr(order, 'limit_price', None) or getattr(order, 'price', None))
+            notional = qty * price
+            if(self.blocked):
+                decisions.append(RiskDecision(order, False, 'account blocked'))
+                continue
+            if(qty <= 0 or price <= 0):
+                decisions.append(RiskDecision(order, False, 'invalid quantity or price'))
+                continue
+            if(self.max_order_value != None and notional > self.max_order_value):
+                decisions.append(RiskDecision(order, False, 'order value over limit'))
+                continue
+            if(order.side == 'buy'):
+                if(notional > available):
+                    decisions.append(RiskDecision(order, False, 'insufficient buying power'))
+                    continue
+                available -= notional
+            elif(order.symbol in self.bought_today):
+                if(self.equity <= self.PDT_EQUITY and daytrades >= self.PDT_DAYTRADES):
+                    decisions.append(RiskDecision(order, False, 'pattern day trader limit'))
+                    continue
+                daytrades += 1
+            decisions.append(RiskDecision(order, True))
+        return decisions
+
+    def __str__(self):
+        return 'buying_power={}, reserved={}, daytrade_count={}, multiplier={}, blocked={}'.format(
+            self.buying_power, self.reserved, self.daytrade_count, self.multiplier, self.blocked)
@@ -0,0 +1,143 @@
+import logging
+import time
+
+SNAPSHOT_PATH = '/snapshot/locale/us/markets/stocks/tickers'
+
+
+class PriceSnapshot(object):
+    '''
+    symbol
+        string
+    last_price
+        number  Price of the last trade
+    last_trade_time
+        int     Last trade time in epoch nanoseconds
+    bid_price
+        number  Last quote bid
+    ask_price
+        number  Last quote ask
+    prev_close
+        number  Previous trading day's close
+    day_close
+        number  Latest close of today's aggregate
+    '''
+    def __init__(
+        self,
+        symbol,
+        last_price,
+        last_trade_time,
+        bid_price,
+        ask_price,
+        prev_close,
+        day_close):
+        """Return a new PriceSnapshot object."""
+        self.symbol = symbol
+        self.last_price = last_price
+        self.last_trade_time = last_trade_time
+        self.bid_price = bid_price
+        self.ask_price = ask_price
+        self.prev_close = prev_close
+        self.day_close = day_close
+
+    @classmethod
+    def fromTicker(cls, ticker):
+        last_trade = ticker.get('lastTrade') or {}
+        last_quote = ticker.get('lastQuote') or {}
+        return cls(
+            ticker['ticker'],
+            last_trade.get('p'),
+            last_trade.get('t'),
+            last_quote.get('p'),
+            last_quote.get('P'),
+            (ticker.get('prevDay') or {}).get('c'),
+            (ticker.get('day') or {}).get('c'))
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class SnapshotTable(object):
+    '''
+    Last trade, last quote and previous close for the whole market, keyed by symbol.
+    One Polygon snapshot request covers every ticker (or `chunk_size` tickers when a
+    symbol list is given), replacing one aggregate or last_trade call per symbol.
+    '''
+    def __init__(self, api, max_age=60, chunk_size=500):
+        """Return a new SnapshotTable object."""
+        self.api = api
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.snapshots = {}
+        self.fetched_at = None
+        self.fetched_wall = None
+
+    def _fetch(self, params=None):
+        response = self.api.polygon.get(path=SNAPSHOT_PATH, params=params, version='v2')
+        return [PriceSnapshot.fromTicker(ticker) for ticker in response.get('tickers') or []]
+
+    def refresh(self, symbols=None):
+        '''
+        Refreshes every ticker, or only `symbols` in chunks of `chunk_size`.
+        Returns the number of snapshots received.
+        '''
+        received = []
+        if(symbols == None):
+            try:
+                received = self._fetch()
+            except Exception as exc:
+                # Still marked fetched, so callers fall back to per-symbol requests instead of retrying.
+                logging.warning('Snapshot refresh generated an exception: {}'.format(exc))
+        else:
+            symbols = list(symbols)
+            for i in range(0, len(symbols), self.chunk_size):
+                chunk = symbols[i:i + self.chunk_size]
+                try:
+                    received += self._fetch({'tickers': ','.join(chunk)})
+                except Exception as exc:
+                    logging.warning('Snapshot chunk starting {} generated an exception: {}'.format(chunk[0], exc))
+        for snapshot in received:
+            self.snapshots[snapshot.symbol] = snapshot
+        self.fetched_at = time.monotonic()
+        self.fetched_wall = time.time()
+        return len(received)
+
+    def age(self):
+        if(self.fetched_at == None):
+            return None
+        return time.monotonic() - self.fetched_at
+
+    def isStale(self, max_age=None):
+        max_age = self.max_age if max_age == None else max_age
+        return self.fetched_at == None or self.age() > max_age
+
+    def ensureFresh(self, symbols=None, max_age=None):
+        if(self.isStale(max_age)):
+            self.refresh(symbols)
+
+    def get(self, symbol):
+        return self.snapshots.get(symbol)
+
+    def lastPrice(self, symbol):
+        snapshot = self.snapshots.get(symbol)
+        return snapshot.last_price if snapshot != None else None
+
+    def prevClose(self, symbol):
+        snapshot = self.snapshots.get(symbol)
+        return snapshot.prev_close if snapshot != None else None
+
+    def prices(self, symbols=[], field='last_price'):
+        '''Returns {symbol: value} for the symbols present in the table.'''
+        prices = {}
+        for symbol in symbols:
+            snapshot = self.snapshots.get(symbol)
+            if(snapshot != None and getattr(snapshot, field) != None):
+                prices[symbol] = getattr(snapshot, field)
+        return prices
+
+    def __contains__(self, symbol):
+        return symbol in self.snapshots
+
+    def __len__(self):
+        return len(self.snapshots)
@@ -0,0 +1,284 @@
+'''
+Order lifecycle tracing.
+
+Every order is stamped with a local monotonic clock when the strategy decides to trade,
+when the submit call starts, when it returns (the broker acknowledged it) and whenever a
+later poll or stream update shows a new status.  The broker's own submitted_at and
+filled_at are kept next to the local stamps; the fill is timed by the broker's filled_at
+(moved onto the local clock), and the moment a poll noticed it is kept as `observed`, so
+the fill legs do not measure the polling interval.  Completed traces feed per-strategy
+latency histograms for each leg (decision to submit, submit to acknowledge, acknowledge
+to fill, decision to fill, fill to observed) and slippage of the fill price against the
+price at decision time, so the cost of the BuyFactor/SellFactor offsets shows up as fill
+rate and bps.
+
+    tracer = OrderTracer()
+    trace = tracer.decide('AAPL', 'buy', 10, price, strategy='penny', limit_price=limit)
+    tracer.submitting(trace)
+    order = api.submit_order(..., client_order_id=trace.client_order_id)
+    tracer.submitted(trace, order)
+    ...
+    tracer.onOrders(data.orders)
+    print(tracer.report())
+'''
+import bisect
+import logging
+import math
+import threading
+import time
+import uuid
+
+from .clock import nowNs, toNs
+
+logger = logging.getLogger(__name__)
+
+FILLED = 'filled'
+OBSERVED = 'observed'
+CLOSED_STATUSES = ('filled', 'canceled', 'expired', 'rejected', 'done_for_day', 'replaced', 'stopped', 'suspended')
+# (name, from event, to event)
+LEGS = (
+    ('decision_to_submit', 'decision', 'submit'),
+    ('submit_to_ack', 'submit', 'ack'),
+    ('ack_to_fill', 'ack', FILLED),
+    ('decision_to_fill', 'decision', FILLED),
+    ('fill_to_observed', FILLED, OBSERVED),
+)
+
+
+class LatencyHistogram(object):
+    '''
+    Counts of latencies in log-spaced buckets (each `growth` times wider than the last,
+    from `smallest` seconds up), so percentiles cost nothing to keep for every order.
+    '''
+    def __init__(self, smallest=0.0001, growth=1.25, buckets=80):
+        """Return a new LatencyHistogram object."""
+        self.bounds = [smallest * growth ** i for i in range(buckets)]
+        self.counts = [0] * (buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction):
+        '''Upper bound of the bucket holding the `fraction` quantile, or None if empty.'''
+        if(self.count == 0):
+            return None
+        target = max(1, int(math.ceil(fraction * self.count)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if(seen >= target):
+                return min(self.bounds[i], self.maximum) if i < len(self.bounds) else self.maximum
+        return self.maximum
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.maximum if self.count else None,
+        }
+
+
+class OrderTrace(object):
+    '''
+    client_order_id
+        string  Tag sent with the order so updates map back to the trace
+    events
+        dict    Event name to local monotonic nanoseconds (decision, submit, ack, then
+                statuses; `filled` from the broker's filled_at, `observed` when it was seen)
+    broker_times
+        dict    submitted_at / filled_at from the broker, in epoch nanoseconds
+    '''
+    def __init__(self, symbol, side, qty, decision_price, strategy='default', limit_price=None, client_order_id=None):
+        """Return a new OrderTrace object."""
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.decision_price = decision_price
+        self.limit_price = limit_price
+        self.strategy = strategy
+        self.client_order_id = client_order_id or uuid.uuid4().hex
+        self.order_id = None
+        self.status = None
+        self.events = {}
+        self.broker_times = {}
+        self.filled_qty = 0.0
+        self.fill_price = None
+
+    def latency(self, start, end):
+        '''Seconds between two recorded events, or None.'''
+        if(start not in self.events or end not in self.events):
+            return None
+        return (self.events[end] - self.events[start]) / 1e9
+
+    def slippage(self):
+        '''Fill price against the decision price in bps; positive means it cost money.'''
+        if(self.fill_price == None or not self.decision_price):
+            return None
+        direction = 1 if self.side == 'buy' else -1
+        return direction * (self.fill_price - self.decision_price) / self.decision_price * 10000
+
+    def isClosed(self):
+        return self.status in CLOSED_STATUSES
+
+    def __str__(self):
+        # Override to print a readable string presentation of your object
+        # below is a dynamic way of doing this without explicity constructing the string manually
+        return ', '.join(['{key}={value}'.format(key=key, value=self.__dict__.get(key)) for key in self.__dict__])
+
+
+class StrategyStats(object):
+
+    def __init__(self):
+        """Return a new StrategyStats object."""
+        self.latencies = {name: LatencyHistogram() for name, start, end in LEGS}
+        self.decided = 0
+        self.filled = 0
+        self.unfilled = 0
+        self.slippage_total = 0.0
+        self.slippage_qty = 0
+
+    def summary(self):
+        closed = self.filled + self.unfilled
+        return {
+            'decided': self.decided,
+            'filled': self.filled,
+            'unfilled': self.unfilled,
+            'fill_rate': self.filled / closed if closed else None,
+            'slippage_bps': self.slippage_total / self.slippage_qty if self.slippage_qty else None,
+            'latency': {name: histogram.summary() for name, histogram in self.latencies.items()},
+        }
+
+
+class OrderTracer(object):
+
+    def __init__(self, clock=time.monotonic_ns, keep_closed=1000, wall=nowNs):
+        """Return a new OrderTracer object."""
+        self.clock = clock
+        # Epoch nanoseconds, to move broker timestamps onto `clock`.
+        self.wall = wall
+        self.keep_closed = keep_closed
+        self.open = {}
+        self.by_order_id = {}
+        self.closed = []
+        self.strategies = {}
+        self.lock = threading.Lock()
+
+    def _stats(self, strategy):
+        stats = self.strategies.get(strategy)
+        if(stats == None):
+            stats = self.strategies[strategy] = StrategyStats()
+        return stats
+
+    def decide(self, symbol, side, qty, price, strategy='default', limit_price=None, client_order_id=None):
+        '''
+        Stamps the decision to trade; pass trace.client_order_id with the order.  A
+        client_order_id that is already being traced returns that trace unchanged.
+        '''
+        with self.lock:
+            existing = self.open.get(client_order_id) if client_order_id != None else None
+        if(existing != None):
+            return existing
+        trace = OrderTrace(symbol, side, qty, float(price), strategy, limit_price, client_order_id)
+        trace.events['decision'] = self.clock()
+        with self.lock:
+            self.open[trace.client_order_id] = trace
+            self._stats(strategy).decided += 1
+        return trace
+
+    def submitting(self, trace):
+        trace.events['submit'] = self.clock()
+
+    def submitted(self, trace, order):
+        '''The submit call returned: the broker has acknowledged the order.'''
+        trace.events['ack'] = self.clock()
+        with self.lock:
+            trace.order_id = order.id
+            self.by_order_id[order.id] = trace
+        self.onOrder(order)
+
+    def rejected(self, trace, reason=None):
+        '''The submit call failed; the trace is closed as unfilled.'''
+        trace.events['rejected'] = self.clock()
+        trace.status = 'rejected'
+        self._close(trace)
+        logger.info('Order %s %s %s rejected on submit: %s', trace.side, trace.qty, trace.symbol, reason)
+
+    def _trace(self, order):
+        with self.lock:
+            trace = self.by_order_id.get(order.id)
+            if(trace == None):
+                trace = self.open.get(getattr(order, 'client_order_id', None))
+                if(trace != None):
+                    trace.order_id = order.id
+                    self.by_order_id[order.id] = trace
+        return trace
+
+    def onOrder(self, order):
+        '''Records a status change seen on an Order (from polling or a stream update).'''
+        trace = self._trace(order)
+        if(trace == None or trace.isClosed()):
+            return False
+        now = self.clock()
+        for name in ('submitted_at', 'filled_at'):
+            timestamp = toNs(getattr(order, name, None))
+            if(timestamp != None and timestamp >= 0):
+                trace.broker_times[name] = timestamp
+        filled = float(getattr(order, 'filled_qty', None) or 0)
+        if(filled > trace.filled_qty):
+            trace.filled_qty = filled
+            trace.fill_price = float(order.filled_avg_price)
+            trace.events.setdefault('first_fill', now)
+        if(order.status == trace.status):
+            return False
+        trace.status = order.status
+        if(order.status == FILLED):
+            trace.events.setdefault(OBSERVED, now)
+            filled_at = trace.broker_times.get('filled_at')
+            if(filled_at != None):
+                # Broker time onto the local clock, never later than when it was seen.
+                now = min(now, filled_at - (self.wall() - self.clock()))
+        trace.events.setdefault(order.status, now)
+        if(trace.isClosed()):
+            self._close(trace)
+        return True
+
+    def onOrders(self, orders=[]):
+        return sum(1 for order in orders if self.onOrder(order))
+
+    def _close(self, trace):
+        with self.lock:
+            self.open.pop(trace.client_order_id, None)
+            self.by_order_id.pop(trace.order_id, None)
+            self.closed.append(trace)
+            del self.closed[:-self.keep_closed]
+            stats = self._stats(trace.strategy)
+            if(trace.status == FILLED):
+                stats.filled += 1
+                for name, start, end in LEGS:
+                    latency = trace.latency(start, end)
+                    if(latency != None):
+                        # Clock skew against the broker can put its fill a little early.
+                        stats.latencies[name].add(max(latency, 0.0))
+            else:
+                stats.unfilled += 1
+            slippage = trace.slippage()
+            if(slippage != None):
+                stats.slippage_total += slippage * trace.filled_qty
+                stats.slippage_qty += trace.filled_qty
+
+    def report(self):
+        '''{strategy: summary} with latency percentiles per leg, fill rate and slippage.'''
+        with self.lock:
+            return {strategy: stats.summary() for strategy, stats in self.strategies.items()}
@@ -0,0 +1,236 @@
+'''
+Point-in-time universe store.
+
+Each recorded day of Alpaca assets and Polygon symbols is stored as a compressed delta
+against the previous recorded day (symbols added, changed or removed), with a full
+keyframe every `keyframe_every` days or whenever a delta would be nearly as large as a
+keyframe.  asOf(date) rebuilds the universe from the nearest keyframe at or before the
+date; walking dates forward (iterate, or asOf in increasing order) reuses the previous
+state and only applies one delta per day, so sweeps over years stay cheap and only one
+full universe is held in memory.
+
+    store = UniverseStore()
+    store.record(datetime.date.today(), data.assets, data.polygon_symbols)
+    universe = store.asOf(datetime.date(2019, 3, 1))
+    candidates = data.filter.crossReferenceAlpacaPolygonData(universe)
+'''
+import bisect
+import datetime
+import json
+import logging
+import os
+import zlib
+
+from .alpaca_data import Asset
+from .polygon_data import PolygonSymbol
+
+ASSET_FIELDS = (
+    'id', 'asset_class', 'exchange', 'symbol', 'status', 'tradable', 'marginable', 'shortable', 'easy_to_borrow')
+POLYGON_SYMBOL_FIELDS = ('symbol', 'name', '_type', 'isOTC', 'updated', 'url')
+DATASETS = {
+    'assets': (ASSET_FIELDS, Asset),
+    'polygon_symbols': (POLYGON_SYMBOL_FIELDS, PolygonSymbol),
+}
+
+
+def _toDate(value):
+    if(isinstance(value, datetime.datetime)):
+        return value.date()
+    if(isinstance(value, datetime.date)):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _rows(objects, fields):
+    '''{symbol: [field values]} from Asset or PolygonSymbol objects.'''
+    rows = {}
+    for item in objects or []:
+        row = [getattr(item, field, None) for field in fields]
+        # Keep the rows JSON-serializable (timestamps, numpy scalars).
+        rows[item.symbol] = [value if isinstance(value, (str, int, float, bool, type(None))) else str(value) for value in row]
+    return rows
+
+
+class Universe(object):
+    '''
+    The tradable universe on one date.  Has the same `assets` and `polygon_symbols`
+    attributes as Data, so Filter methods that take a Data object accept it directly.
+    '''
+    def __init__(self, date, rows):
+        """Return a new Universe object."""
+        self.date = date
+        self.rows = rows
+        self._objects = {}
+
+    def _build(self, dataset):
+        if(dataset not in self._objects):
+            fields, cls = DATASETS[dataset]
+            self._objects[dataset] = [cls(*row) for symbol, row in sorted(self.rows[dataset].items())]
+        return self._objects[dataset]
+
+    @property
+    def assets(self):
+        return self._build('assets')
+
+    @property
+    def polygon_symbols(self):
+        return self._build('polygon_symbols')
+
+    def __contains__(self, symbol):
+        return symbol in self.rows['assets']
+
+    def __len__(self):
+        return len(self.rows['assets'])
+
+    def symbols(self):
+        return sorted(self.rows['assets'])
+
+    def tradableSymbols(self):
+        tradable = ASSET_FIELDS.index('tradable')
+        status = ASSET_FIELDS.index('status')
+        return sorted(
+            symbol for symbol, row in self.rows['assets'].items()
+            if row[tradable] and row[status] == 'active')
+
+
+class UniverseStore(object):
+
+    def __init__(self, root='state/universe', keyframe_every=20):
+        """Return a new UniverseStore object."""
+        self.root = root
+        self.keyframe_every = keyframe_every
+        self.index = self._loadIndex()
+        self._state = None
+
+    def _indexPath(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _loadIndex(self):
+        try:
+            with open(self._indexPath()) as f:
+                return [tuple(entry) for entry in json.load(f)]
+        except FileNotFoundError:
+            return []
+
+    def _saveIndex(self):
+        self._write(self._indexPath(), json.dumps(self.index).encode())
+
+    def _write(self, path, payload):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _path(self, day, kind):
+        return os.path.join(self.root, '{}.{}'.format(day, kind))
+
+    def _read(self, day, kind):
+        with open(self._path(day, kind), 'rb') as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    def dates(self):
+        return [datetime.date.fromisoformat(day) for day, kind in self.index]
+
+    def __len__(self):
+        return len(self.index)
+
+    def record(self, date, assets=None, polygon_symbols=None):
+        '''
+        Stores the day's universe.  Recording the same date again replaces it only if it
+        is the latest recorded day; history is never rewritten.
+        '''
+        day = _toDate(date).isoformat()
+        state = {
+            'assets': _rows(assets, ASSET_FIELDS),
+            'polygon_symbols': _rows(polygon_symbols, POLYGON_SYMBOL_FIELDS),
+        }
+        if(self.index and day < self.index[-1][0]):
+            raise ValueError('{} is before the last recorded day {}'.format(day, self.index[-1][0]))
+        replaced = None
+        if(self.index and day == self.index[-1][0]):
+            replaced = self.index.pop()[1]
+            self._state = None
+        previous = self.asOf(self.index[-1][0]).rows if self.index else None
+        since_keyframe = 0
+        for _, kind in reversed(self.index):
+            if(kind == 'key'):
+                break
+            since_keyframe += 1
+
+        kind = 'key'
+        payload = state
+        if(previous != None and since_keyframe + 1 < self.keyframe_every):
+            delta = self._delta(previous, state)
+            changes = sum(len(part['set']) + len(part['removed']) for part in delta.values())
+            if(changes * 2 < sum(len(rows) for rows in state.values())):
+                kind = 'delta'
+                payload = delta
+        self._write(self._path(day, kind), zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 9))
+        self.index.append((day, kind))
+        self._saveIndex()
+        if(replaced != None and replaced != kind):
+            # The day was stored as the other kind before; nothing reads that file now.
+            os.remove(self._path(day, replaced))
+        self._state = (day, state)
+        logging.info('Universe {}: stored {} with {} assets'.format(day, kind, len(state['assets'])))
+        return kind
+
+    @staticmethod
+    def _delta(previous, state):
+        delta = {}
+        for dataset, rows in state.items():
+            before = previous.get(dataset, {})
+            delta[dataset] = {
+                'set': {symbol: row for symbol, row in rows.items() if before.get(symbol) != row},
+                'removed': [symbol for symbol in before if symbol not in rows],
+            }
+        return delta
+
+    @staticmethod
+    def _apply(state, delta):
+        for dataset, change in delta.items():
+            rows = state.setdefault(dataset, {})
+            for symbol in change['removed']:
+                rows.pop(symbol, None)
+            rows.update(change['set'])
+        return state
+
+    def asOf(self, date):
+        '''
+        The universe as last recorded on or before `date`, or None if nothing was
+        recorded by then.
+        '''
+        day = _toDate(date).isoformat()
+        days = [entry[0] for entry in self.index]
+        position = bisect.bisect_right(days, day) - 1
+        if(position < 0):
+            return None
+        target = days[position]
+        keyframe = position
+        while self.index[keyframe][1] != 'key':
+            keyframe -= 1
+
+        if(self._state != None and days[keyframe] <= self._state[0] <= target):
+            # Walk forward from the cursor instead of the keyframe.
+            start = bisect.bisect_right(days, self._state[0])
+            state = self._state[1]
+        else:
+            state = self._read(days[keyframe], 'key')
+            start = keyframe + 1
+        for i in range(start, position + 1):
+            day_i, kind = self.index[i]
+            state = self._read(day_i, 'key') if kind == 'key' else self._apply(state, self._read(day_i, 'delta'))
+        # The cursor keeps the state; the Universe gets its own copy so the cursor can move on.
+        self._state = (target, state)
+        return Universe(
+            datetime.date.fromisoformat(target),
+            {dataset: dict(rows) for dataset, rows in state.items()})
+
+    def iterate(self, start=None, end=None):
+        '''Yields (date, Universe) for each recorded day in [start, end], one delta per step.'''
+        start = _toDate(start).isoformat() if start != None else None
+        end = _toDate(end).isoformat() if end != None else None
+        for day, kind in list(self.index):
+            if((start == None or day >= start) and (end == None or day <= end)):
+                yield datetime.date.fromisoformat(day), self.asOf(day)
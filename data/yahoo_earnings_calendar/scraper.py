@@ -4,19 +4,12 @@ Yahoo! Earnings Calendar scraper
 import datetime
 import json
 import logging
-import requests
 
 BASE_URL = 'https://finance.yahoo.com/calendar/earnings'
 BASE_STOCK_URL = 'https://finance.yahoo.com/quote'
 
-# Logging config
-logger = logging.getLogger()
-handler = logging.StreamHandler()
-formatter = logging.Formatter(
-    '%(asctime)s %(name)-12s %(levelname)-8s %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.setLevel(logging.ERROR)
+# Handlers and levels are configured by the application (see data.logs.setupLogging).
+logger = logging.getLogger(__name__)
 
 
 class YahooEarningsCalendar(object):
@@ -25,13 +18,22 @@ class YahooEarningsCalendar(object):
     """
 
     def _get_data_dict(self, url):
+        import requests
         page = requests.get(url)
-        page_content = page.content.decode(encoding='utf-8', errors='strict')
+        return self._parse_data_dict(page.content)
+
+    @staticmethod
+    def _parse_data_dict(content):
+        page_content = content.decode(encoding='utf-8', errors='strict')
         page_data_string = [row for row in page_content.split(
             '\n') if row.startswith('root.App.main = ')][0][:-1]
         page_data_string = page_data_string.split('root.App.main = ', 1)[1]
         return json.loads(page_data_string)
 
+    @staticmethod
+    def _earnings_rows(page_data_dict):
+        return page_data_dict['context']['dispatcher']['stores']['ScreenerResultsStore']['results']['rows']
+
     def get_next_earnings_date(self, symbol):
         """Gets the next earnings date of symbol
         Args:
@@ -77,7 +79,7 @@ class YahooEarningsCalendar(object):
         logger.debug('Fetching earnings data for %s', date_str)
         dated_url = '{0}?day={1}'.format(BASE_URL, date_str)
         page_data_dict = self._get_data_dict(dated_url)
-        return page_data_dict['context']['dispatcher']['stores']['ScreenerResultsStore']['results']['rows']
+        return self._earnings_rows(page_data_dict)
 
     def earnings_between(self, from_date, to_date):
         """Gets earnings calendar data from Yahoo! in a date range.
@@ -1,4 +1,6 @@
 from algos import run_algo
+from data.logs import setupLogging
 
 if __name__ == '__main__':
+    setupLogging()
     run_algo.main()
@@ -0,0 +1,32 @@
+'''
+Local paper broker and market-data server for end-to-end and load testing.
+
+Implements the Alpaca and Polygon REST surface this project uses (account, assets,
+calendar, clock, orders, positions, Polygon aggregates, symbols and snapshots) over a
+deterministic synthetic market, with a matching engine for fills and configurable
+latency, error and rate-limit injection.  Only the standard library is needed to run it:
+
+    python -m simulator --port 8000 --latency 0.05 --error-rate 0.01
+
+and point the worker at it with ALGO_SIMULATOR_URL=http://127.0.0.1:8000.  Tests use
+LocalAPI instead, which calls the same routes in-process without a server.
+'''
+from .client import LocalAPI, connect, connectAsync
+from .exchange import Exchange, ExchangeError
+from .market import EarningsCalendar, MarketModel, SimulatedTime
+from .server import FaultInjector, RateLimiter, Router, SimulatorServer
+
+__all__ = [
+    'EarningsCalendar',
+    'Exchange',
+    'ExchangeError',
+    'FaultInjector',
+    'LocalAPI',
+    'MarketModel',
+    'RateLimiter',
+    'Router',
+    'SimulatedTime',
+    'SimulatorServer',
+    'connect',
+    'connectAsync',
+]
@@ -0,0 +1,48 @@
+'''Runs the simulator as a standalone server: python -m simulator --help'''
+import argparse
+import datetime
+import logging
+
+from .exchange import Exchange
+from .market import MarketModel, SimulatedTime
+from .server import FaultInjector, SimulatorServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated Alpaca/Polygon exchange')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--start', help='simulated start time, e.g. 2019-06-03T09:25 (New York)')
+    parser.add_argument('--speed', type=float, default=1.0, help='simulated seconds per real second')
+    parser.add_argument('--cash', type=float, default=100000.0)
+    parser.add_argument('--slippage-bps', type=float, default=0.0)
+    parser.add_argument('--fill-ratio', type=float, default=1.0, help='largest fraction of an order filled per pass')
+    parser.add_argument('--fill-delay', type=float, default=0.0, help='seconds before a new order can fill')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=200, help='requests per minute per key')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    start = datetime.datetime.fromisoformat(args.start) if args.start else None
+    exchange = Exchange(
+        MarketModel(args.symbols, args.seed),
+        SimulatedTime(start, args.speed),
+        cash=args.cash,
+        slippage_bps=args.slippage_bps,
+        fill_ratio=args.fill_ratio,
+        fill_delay=args.fill_delay)
+    faults = FaultInjector(args.latency, args.jitter, args.error_rate, seed=args.seed)
+    server = SimulatorServer(exchange, args.host, args.port, faults, args.rate_limit)
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
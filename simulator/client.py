@@ -0,0 +1,151 @@
+'''Clients pointed at a running simulator instead of Alpaca and Polygon.'''
+
+POLYGON_URL = 'https://api.polygon.io'
+# Fields alpaca_trade_api entities read as pandas Timestamps.
+TIMESTAMP_FIELDS = ('timestamp', 'next_open', 'next_close')
+
+
+def connect(url, key_id='simulator', secret_key='simulator'):
+    '''
+    Returns an alpaca_trade_api REST client for the simulator at `url`.  alpaca_trade_api
+    hardcodes the Polygon host, so the nested polygon client's session is redirected to
+    the simulator's /polygon routes.
+    '''
+    import alpaca_trade_api as tradeapi
+    import requests
+
+    url = url.rstrip('/')
+
+    class _Redirect(requests.Session):
+        def request(self, method, target, *args, **kwargs):
+            if(target.startswith(POLYGON_URL)):
+                target = url + '/polygon' + target[len(POLYGON_URL):]
+            return super(_Redirect, self).request(method, target, *args, **kwargs)
+
+    api = tradeapi.REST(key_id, secret_key, base_url=url)
+    api.polygon._session = _Redirect()
+    return api
+
+
+def connectAsync(url, key_id='simulator', secret_key='simulator', **kwargs):
+    '''AsyncData for the simulator at `url`.'''
+    from data.async_data import AsyncData
+    url = url.rstrip('/')
+    return AsyncData(key_id, secret_key, base_url=url, polygon_url=url + '/polygon', **kwargs)
+
+
+class Entity(object):
+    '''
+    A raw JSON object behind attribute access, like alpaca_trade_api's entities: the
+    JSON is kept in `_raw` and timestamp fields read as pandas Timestamps.
+    '''
+    def __init__(self, raw):
+        """Return a new Entity object."""
+        self._raw = raw
+
+    def __getattr__(self, key):
+        raw = self.__dict__.get('_raw')
+        if(raw == None or key not in raw):
+            raise AttributeError(key)
+        value = raw[key]
+        if(isinstance(value, str) and (key in TIMESTAMP_FIELDS or key.endswith('_at'))):
+            import pandas as pd
+            return pd.Timestamp(value)
+        return value
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._raw)
+
+
+def _query(params):
+    '''Query values as the HTTP front end receives them: strings, with None left out.'''
+    return {key: str(value) for key, value in (params or {}).items() if value != None}
+
+
+class _LocalPolygon(object):
+
+    def __init__(self, local):
+        self.local = local
+
+    def get(self, path, params=None, version='v1'):
+        return self.local._call('GET', '/polygon/{}{}'.format(version, path), params)
+
+    def historic_agg(self, size, symbol, _from=None, to=None, limit=None):
+        from .market import isoTime
+        raw = self.get('/historic/agg/{}/{}'.format(size, symbol), {'from': _from, 'to': to, 'limit': limit})
+        return [
+            Entity({
+                'open': tick['o'], 'high': tick['h'], 'low': tick['l'], 'close': tick['c'],
+                'volume': tick['v'], 'timestamp': isoTime(tick['t'] / 1000.0)})
+            for tick in raw['ticks']]
+
+
+class LocalAPI(object):
+    '''
+    Stands in for alpaca_trade_api.REST by calling an Exchange in-process through the
+    simulator's routes, so tests and notebooks need neither the HTTP server nor
+    alpaca_trade_api.  A matching pass runs before every call, in place of the server's
+    timer.  Errors are raised as ExchangeError.
+
+        api = LocalAPI(Exchange(MarketModel(200), SimulatedTime()))
+        data = Data(api, EarningsCalendar(api.exchange.market))
+    '''
+    def __init__(self, exchange, api_version='v2'):
+        """Return a new LocalAPI object."""
+        from .server import Router
+        self.exchange = exchange
+        self.router = Router(exchange)
+        self.api_version = api_version
+        self.polygon = _LocalPolygon(self)
+
+    def _call(self, method, path, params=None, body=None):
+        self.exchange.match()
+        return self.router.dispatch(method, path, _query(params), body)
+
+    def get(self, path, data=None):
+        return self._call('GET', '/{}{}'.format(self.api_version, path), data)
+
+    def get_account(self):
+        return Entity(self.get('/account'))
+
+    def list_assets(self, status=None, asset_class=None):
+        return [Entity(asset) for asset in self.get('/assets', {'status': status, 'asset_class': asset_class})]
+
+    def get_asset(self, symbol):
+        return Entity(self.get('/assets/{}'.format(symbol)))
+
+    def get_calendar(self, start=None, end=None):
+        return [Entity(date) for date in self.get('/calendar', {'start': start, 'end': end})]
+
+    def get_clock(self):
+        return Entity(self.get('/clock'))
+
+    def list_orders(self, status=None, limit=None, after=None, until=None, direction=None):
+        params = {'status': status, 'limit': limit, 'after': after, 'until': until, 'direction': direction}
+        return [Entity(order) for order in self.get('/orders', params)]
+
+    def get_order(self, order_id):
+        return Entity(self.get('/orders/{}'.format(order_id)))
+
+    def submit_order(
+        self, symbol, qty, side, type, time_in_force, limit_price=None, stop_price=None,
+        client_order_id=None, extended_hours=None):
+        body = {'symbol': symbol, 'qty': qty, 'side': side, 'type': type, 'time_in_force': time_in_force}
+        for key, value in (
+            ('limit_price', limit_price), ('stop_price', stop_price),
+            ('client_order_id', client_order_id), ('extended_hours', extended_hours)):
+            if(value != None):
+                body[key] = value
+        return Entity(self._call('POST', '/{}/orders'.format(self.api_version), body=body))
+
+    def cancel_order(self, order_id):
+        self._call('DELETE', '/{}/orders/{}'.format(self.api_version, order_id))
+
+    def cancel_all_orders(self):
+        self._call('DELETE', '/{}/orders'.format(self.api_version))
+
+    def list_positions(self):
+        return [Entity(position) for position in self.get('/positions')]
+
+    def get_position(self, symbol):
+        return Entity(self.get('/positions/{}'.format(symbol)))
@@ -0,0 +1,408 @@
+'''
+Paper broker over a MarketModel: account, positions and an order book with a matching
+engine.  All responses are the JSON shapes the Alpaca v1 REST API returns, so the
+alpaca_trade_api entities and data/convert.py work on them unchanged.
+'''
+import collections
+import threading
+import uuid
+
+from data.clock import toNs
+
+from .market import isoTime, isoUtc
+
+ORDER_TYPES = ('market', 'limit', 'stop', 'stop_limit')
+TIME_IN_FORCE = ('day', 'gtc', 'opg', 'cls', 'ioc', 'fok')
+OPEN_STATUSES = ('new', 'accepted', 'partially_filled')
+
+
+class ExchangeError(Exception):
+    '''An Alpaca-style API error: HTTP status plus {"code", "message"} body.'''
+    def __init__(self, status, code, message):
+        super(ExchangeError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _money(value):
+    return '{:.4f}'.format(value).rstrip('0').rstrip('.') if value != None else None
+
+
+class Exchange(object):
+    '''
+    Single-account paper broker.
+
+    Orders are matched against the model's last price whenever `match` runs (the server
+    calls it on a timer and after every submit).  Market orders fill at the last price
+    plus `slippage_bps`; limit orders fill once the price crosses the limit; stop orders
+    trigger on the stop price.  Each pass fills at most `fill_ratio` of an order's
+    quantity, so values below 1 produce partial fills.  Orders are only eligible
+    `fill_delay` seconds after submission and only while the market is open; day orders
+    expire at the close of their session.
+    '''
+    def __init__(self, market, clock, cash=100000.0, slippage_bps=0.0, fill_ratio=1.0, fill_delay=0.0):
+        """Return a new Exchange object."""
+        self.market = market
+        self.clock = clock
+        self.cash = float(cash)
+        self.slippage_bps = slippage_bps
+        self.fill_ratio = fill_ratio
+        self.fill_delay = fill_delay
+        self.account_id = str(uuid.uuid4())
+        self.created_at = isoUtc(clock.now())
+        self.orders = collections.OrderedDict()
+        self.by_client_id = {}
+        self.positions = {}
+        self.fills = []
+        self.lock = threading.RLock()
+
+    # Market data
+
+    def assets(self, status=None):
+        assets = [self.market.assetJson(symbol) for symbol in self.market.symbols]
+        if(status != None):
+            assets = [asset for asset in assets if asset['status'] == status]
+        return assets
+
+    def asset(self, symbol):
+        if(symbol not in self.market):
+            raise ExchangeError(404, 40410000, 'asset not found')
+        return self.market.assetJson(symbol)
+
+    def calendar(self, start=None, end=None):
+        return [
+            session.toJson() for session in self.market.sessions()
+            if (start == None or session.date.isoformat() >= start) and
+               (end == None or session.date.isoformat() <= end)]
+
+    def clockJson(self):
+        now = self.clock.now()
+        current = self.market.sessionAt(now)
+        upcoming = self.market.nextSession(now)
+        if(current != None):
+            following = self.market.nextSession(current.close_at)
+            next_open = following.open_at if following != None else current.open_at
+        else:
+            next_open = upcoming.open_at
+        return {
+            'timestamp': isoTime(now),
+            'is_open': current != None,
+            'next_open': isoTime(next_open),
+            'next_close': isoTime(upcoming.close_at),
+        }
+
+    def lastPrice(self, symbol):
+        return self.market.price(symbol, self.clock.now())
+
+    # Orders
+
+    def submitOrder(self, params):
+        symbol = params.get('symbol')
+        side = params.get('side')
+        order_type = params.get('type')
+        time_in_force = params.get('time_in_force')
+        try:
+            qty = int(params.get('qty'))
+        except (TypeError, ValueError):
+            raise ExchangeError(422, 40010001, 'qty must be an integer')
+        if(qty <= 0):
+            raise ExchangeError(422, 40010001, 'qty must be > 0')
+        if(side not in ('buy', 'sell')):
+            raise ExchangeError(422, 40010001, 'invalid side')
+        if(order_type not in ORDER_TYPES):
+            raise ExchangeError(422, 40010001, 'invalid order type')
+        if(time_in_force not in TIME_IN_FORCE):
+            raise ExchangeError(422, 40010001, 'invalid time_in_force')
+        limit_price = params.get('limit_price')
+        stop_price = params.get('stop_price')
+        if(order_type in ('limit', 'stop_limit') and limit_price == None):
+            raise ExchangeError(422, 40010001, 'limit_price is required')
+        if(order_type in ('stop', 'stop_limit') and stop_price == None):
+            raise ExchangeError(422, 40010001, 'stop_price is required')
+        if(symbol not in self.market):
+            raise ExchangeError(422, 40010001, 'asset "{}" not found'.format(symbol))
+        if(not self.market.assetJson(symbol)['tradable']):
+            raise ExchangeError(422, 40010001, 'asset "{}" is not tradable'.format(symbol))
+
+        with self.lock:
+            client_order_id = params.get('client_order_id') or str(uuid.uuid4())
+            if(client_order_id in self.by_client_id):
+                raise ExchangeError(422, 40010001, 'client_order_id must be unique')
+            now = self.clock.now()
+            price = float(limit_price) if limit_price != None else self.lastPrice(symbol)
+            if(side == 'buy' and qty * price > self.buyingPower()):
+                raise ExchangeError(403, 40310000, 'insufficient buying power')
+            if(side == 'sell' and qty > self.availableQty(symbol)):
+                raise ExchangeError(403, 40310000, 'insufficient qty available for order')
+            session = self.market.nextSession(now)
+            order = {
+                'id': str(uuid.uuid4()),
+                'client_order_id': client_order_id,
+                'created_at': isoUtc(now),
+                'updated_at': isoUtc(now),
+                'submitted_at': isoUtc(now),
+                'filled_at': None,
+                'expired_at': None,
+                'canceled_at': None,
+                'failed_at': None,
+                'asset_id': self.market.profiles[symbol]['id'],
+                'symbol': symbol,
+                'asset_class': 'us_equity',
+                'qty': str(qty),
+                'filled_qty': '0',
+                'type': order_type,
+                'side': side,
+                'time_in_force': time_in_force,
+                'limit_price': _money(float(limit_price)) if limit_price != None else None,
+                'stop_price': _money(float(stop_price)) if stop_price != None else None,
+                'filled_avg_price': None,
+                'status': 'new',
+                'extended_hours': bool(params.get('extended_hours', False)),
+            }
+            self.orders[order['id']] = {
+                'json': order,
+                'submitted': now,
+                'expires': session.close_at if (session != None and time_in_force != 'gtc') else None,
+                'triggered': order_type not in ('stop', 'stop_limit'),
+            }
+            self.by_client_id[client_order_id] = order['id']
+        self.match()
+        return dict(self.orders[order['id']]['json'])
+
+    def order(self, order_id):
+        with self.lock:
+            entry = self.orders.get(order_id)
+            if(entry == None):
+                raise ExchangeError(404, 40410000, 'order not found')
+            return dict(entry['json'])
+
+    def orderByClientId(self, client_order_id):
+        with self.lock:
+            order_id = self.by_client_id.get(client_order_id)
+        if(order_id == None):
+            raise ExchangeError(404, 40410000, 'order not found')
+        return self.order(order_id)
+
+    def listOrders(self, status='open', limit=50, after=None, until=None, direction='desc'):
+        '''Same filters and limits as GET /orders: at most 500 orders, newest first by default.'''
+        limit = min(int(limit or 50), 500)
+        with self.lock:
+            orders = [entry['json'] for entry in self.orders.values()]
+        if(status == 'open'):
+            orders = [order for order in orders if order['status'] in OPEN_STATUSES]
+        elif(status == 'closed'):
+            orders = [order for order in orders if order['status'] not in OPEN_STATUSES]
+        # Compared as instants: `after` may carry an offset, a Z or fewer fraction digits.
+        if(after != None):
+            after = toNs(after)
+            orders = [order for order in orders if toNs(order['submitted_at']) > after]
+        if(until != None):
+            until = toNs(until)
+            orders = [order for order in orders if toNs(order['submitted_at']) < until]
+        if(direction != 'asc'):
+            orders = orders[::-1]
+        return [dict(order) for order in orders[:limit]]
+
+    def cancelOrder(self, order_id):
+        with self.lock:
+            entry = self.orders.get(order_id)
+            if(entry == None):
+                raise ExchangeError(404, 40410000, 'order not found')
+            if(entry['json']['status'] not in OPEN_STATUSES):
+                raise ExchangeError(422, 42210000, 'order is not cancelable')
+            self._close(entry, 'canceled', 'canceled_at')
+
+    def cancelAll(self):
+        with self.lock:
+            for entry in self.orders.values():
+                if(entry['json']['status'] in OPEN_STATUSES):
+                    self._close(entry, 'canceled', 'canceled_at')
+
+    def _close(self, entry, status, field):
+        stamp = isoUtc(self.clock.now())
+        entry['json']['status'] = status
+        entry['json'][field] = stamp
+        entry['json']['updated_at'] = stamp
+
+    # Matching
+
+    def match(self):
+        '''One matching pass over the open orders; returns the number of fills.'''
+        now = self.clock.now()
+        session = self.market.sessionAt(now)
+        filled = 0
+        with self.lock:
+            for entry in self.orders.values():
+                order = entry['json']
+                if(order['status'] not in OPEN_STATUSES):
+                    continue
+                if(entry['expires'] != None and now >= entry['expires']):
+                    self._close(entry, 'expired', 'expired_at')
+                    continue
+                if(session == None or now - entry['submitted'] < self.fill_delay):
+                    continue
+                price = self.lastPrice(order['symbol'])
+                fill_price = self._fillPrice(entry, price)
+                if(fill_price == None):
+                    if(order['time_in_force'] in ('ioc', 'fok')):
+                        self._close(entry, 'canceled', 'canceled_at')
+                    continue
+                remaining = int(order['qty']) - int(order['filled_qty'])
+                qty = max(1, int(int(order['qty']) * self.fill_ratio))
+                if(order['time_in_force'] == 'fok' and qty < remaining):
+                    self._close(entry, 'canceled', 'canceled_at')
+                    continue
+                self._fill(entry, min(qty, remaining), fill_price, now)
+                filled += 1
+                if(order['time_in_force'] == 'ioc' and order['status'] != 'filled'):
+                    self._close(entry, 'canceled', 'canceled_at')
+        return filled
+
+    def _fillPrice(self, entry, price):
+        order = entry['json']
+        buy = order['side'] == 'buy'
+        if(not entry['triggered']):
+            stop = float(order['stop_price'])
+            if((buy and price < stop) or (not buy and price > stop)):
+                return None
+            entry['triggered'] = True
+        slipped = price * (1 + (1 if buy else -1) * self.slippage_bps / 10000.0)
+        if(order['limit_price'] == None):
+            return round(slipped, 4)
+        limit = float(order['limit_price'])
+        if((buy and price > limit) or (not buy and price < limit)):
+            return None
+        return round(min(slipped, limit) if buy else max(slipped, limit), 4)
+
+    def _fill(self, entry, qty, price, now):
+        order = entry['json']
+        symbol = order['symbol']
+        done = int(order['filled_qty'])
+        average = float(order['filled_avg_price'] or 0)
+        order['filled_avg_price'] = _money((average * done + price * qty) / (done + qty))
+        order['filled_qty'] = str(done + qty)
+        order['updated_at'] = isoUtc(now)
+        if(done + qty >= int(order['qty'])):
+            order['status'] = 'filled'
+            order['filled_at'] = order['updated_at']
+        else:
+            order['status'] = 'partially_filled'
+        position = self.positions.setdefault(symbol, {'qty': 0, 'cost': 0.0})
+        if(order['side'] == 'buy'):
+            self.cash -= qty * price
+            position['cost'] += qty * price
+            position['qty'] += qty
+        else:
+            self.cash += qty * price
+            position['cost'] -= qty * position['cost'] / position['qty']
+            position['qty'] -= qty
+            if(position['qty'] == 0):
+                del self.positions[symbol]
+        self.fills.append({
+            'order_id': order['id'], 'symbol': symbol, 'side': order['side'],
+            'qty': qty, 'price': price, 'time': now})
+
+    # Account and positions
+
+    def reserved(self):
+        '''Cash held back for the unfilled part of open buy orders.'''
+        total = 0.0
+        for entry in self.orders.values():
+            order = entry['json']
+            if(order['side'] == 'buy' and order['status'] in OPEN_STATUSES):
+                price = float(order['limit_price']) if order['limit_price'] != None else self.lastPrice(order['symbol'])
+                total += (int(order['qty']) - int(order['filled_qty'])) * price
+        return total
+
+    def buyingPower(self):
+        with self.lock:
+            return max(0.0, self.cash - self.reserved())
+
+    def availableQty(self, symbol):
+        with self.lock:
+            held = self.positions.get(symbol, {'qty': 0})['qty']
+            selling = sum(
+                int(entry['json']['qty']) - int(entry['json']['filled_qty'])
+                for entry in self.orders.values()
+                if entry['json']['symbol'] == symbol and entry['json']['side'] == 'sell' and
+                   entry['json']['status'] in OPEN_STATUSES)
+            return held - selling
+
+    def positionJson(self, symbol):
+        with self.lock:
+            position = self.positions.get(symbol)
+            if(position == None):
+                raise ExchangeError(404, 40410000, 'position does not exist')
+            qty = position['qty']
+            cost = position['cost']
+        now = self.clock.now()
+        price = self.lastPrice(symbol)
+        session = self.market.nextSession(now)
+        previous = self.market.previousSession(session.date) if session != None else None
+        lastday = self.market.close(symbol, previous.date) if previous != None else price
+        market_value = qty * price
+        return {
+            'asset_id': self.market.profiles[symbol]['id'],
+            'symbol': symbol,
+            'exchange': self.market.assetJson(symbol)['exchange'],
+            'asset_class': 'us_equity',
+            'avg_entry_price': _money(cost / qty),
+            'qty': str(qty),
+            'side': 'long',
+            'market_value': _money(market_value),
+            'cost_basis': _money(cost),
+            'unrealized_pl': _money(market_value - cost),
+            'unrealized_plpc': _money((market_value - cost) / cost if cost else 0.0),
+            'unrealized_intraday_pl': _money(qty * (price - lastday)),
+            'unrealized_intraday_plpc': _money((price - lastday) / lastday if lastday else 0.0),
+            'current_price': _money(price),
+            'lastday_price': _money(lastday),
+            'change_today': _money((price - lastday) / lastday if lastday else 0.0),
+        }
+
+    def listPositions(self):
+        with self.lock:
+            symbols = list(self.positions)
+        return [self.positionJson(symbol) for symbol in symbols]
+
+    def closePosition(self, symbol):
+        qty = self.availableQty(symbol)
+        if(qty <= 0):
+            raise ExchangeError(404, 40410000, 'position does not exist')
+        return self.submitOrder({
+            'symbol': symbol, 'qty': qty, 'side': 'sell', 'type': 'market', 'time_in_force': 'day'})
+
+    def accountJson(self):
+        positions = self.listPositions()
+        long_value = sum(float(position['market_value']) for position in positions)
+        last_value = sum(float(position['lastday_price']) * int(position['qty']) for position in positions)
+        buying_power = self.buyingPower()
+        equity = self.cash + long_value
+        return {
+            'account_blocked': False,
+            'buying_power': _money(buying_power),
+            'cash': _money(self.cash),
+            'created_at': self.created_at,
+            'currency': 'USD',
+            'daytrade_count': 0,
+            'daytrading_buying_power': _money(buying_power),
+            'equity': _money(equity),
+            'id': self.account_id,
+            'initial_margin': '0',
+            'last_equity': _money(self.cash + last_value),
+            'last_maintenance_margin': '0',
+            'long_market_value': _money(long_value),
+            'maintenance_margin': '0',
+            'multiplier': '1',
+            'pattern_day_trader': False,
+            'portfolio_value': _money(equity),
+            'regt_buying_power': _money(buying_power),
+            'short_market_value': '0',
+            'shorting_enabled': False,
+            'sma': '0',
+            'status': 'ACTIVE',
+            'trade_suspended_by_user': False,
+            'trading_blocked': False,
+            'transfers_blocked': False,
+        }
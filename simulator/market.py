@@ -0,0 +1,310 @@
+'''
+Deterministic synthetic market: universe, trading calendar, daily and minute prices.
+
+Every price is a pure function of (seed, symbol, day, minute), so any process started
+with the same seed sees the same market and nothing has to be precomputed or stored.
+'''
+import datetime
+import math
+import random
+import time
+import zlib
+
+try:
+    from zoneinfo import ZoneInfo as _zone
+except ImportError:
+    from dateutil.tz import gettz as _zone
+
+NY = _zone('America/New_York')
+SESSION_MINUTES = 390
+CALENDAR_START = datetime.date(2018, 1, 1)
+CALENDAR_END = datetime.date(2030, 12, 31)
+EXCHANGES = ('NYSE', 'NASDAQ', 'ARCA', 'AMEX', 'BATS')
+
+
+def _unit(*parts):
+    '''Stable uniform [0, 1) from the parts; str hashes are salted per process, crc32 is not.'''
+    return (zlib.crc32(':'.join(str(part) for part in parts).encode()) & 0xffffffff) / 4294967296.0
+
+
+def _normal(*parts):
+    u1 = max(_unit('n1', *parts), 1e-12)
+    u2 = _unit('n2', *parts)
+    return math.sqrt(-2.0 * math.log(u1)) * math.cos(2.0 * math.pi * u2)
+
+
+def _symbolName(index):
+    '''0 -> AAA, 1 -> AAB, ... then four letters past ZZZ.'''
+    width = 3 if index < 26 ** 3 else 4
+    letters = ''
+    for _ in range(width):
+        index, digit = divmod(index, 26)
+        letters = chr(ord('A') + digit) + letters
+    return letters
+
+
+def isoTime(epoch, tz=NY):
+    return datetime.datetime.fromtimestamp(epoch, tz).isoformat()
+
+
+def isoUtc(epoch):
+    return datetime.datetime.utcfromtimestamp(epoch).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class SimulatedTime(object):
+    '''
+    Exchange time: wall time by default, or starting at `start` (epoch seconds or a
+    datetime) and advancing `speed` times faster than real time.
+    '''
+    def __init__(self, start=None, speed=1.0):
+        """Return a new SimulatedTime object."""
+        if(isinstance(start, datetime.datetime)):
+            if(start.tzinfo == None):
+                start = start.replace(tzinfo=NY)
+            start = start.timestamp()
+        self.start = time.time() if start == None else float(start)
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def now(self):
+        return self.start + (time.monotonic() - self.started) * self.speed
+
+
+class Session(object):
+    '''One trading day: date plus open and close as epoch seconds.'''
+    def __init__(self, date, open_at, close_at):
+        """Return a new Session object."""
+        self.date = date
+        self.open_at = open_at
+        self.close_at = close_at
+
+    def toJson(self):
+        return {
+            'date': self.date.isoformat(),
+            'open': datetime.datetime.fromtimestamp(self.open_at, NY).strftime('%H:%M'),
+            'close': datetime.datetime.fromtimestamp(self.close_at, NY).strftime('%H:%M'),
+        }
+
+
+class MarketModel(object):
+    '''
+    Synthetic universe of `symbols` common stocks plus a few OTC, inactive and
+    non-tradable names, with prices spread from pennies to a few hundred dollars.
+
+    Log prices follow two slow cycles plus daily noise, so daily bars have trends for the
+    SMA filters; each session moves from a gapped open to the day's close along a
+    Brownian-bridge-like minute path.
+    '''
+    def __init__(self, symbols=2000, seed=7, holidays=(), otc_fraction=0.05, inactive_fraction=0.02):
+        """Return a new MarketModel object."""
+        self.seed = seed
+        self.holidays = set(holidays)
+        self.symbols = [_symbolName(i) for i in range(symbols)]
+        self.profiles = {}
+        for i, symbol in enumerate(self.symbols):
+            self.profiles[symbol] = {
+                'id': '{:08x}-0000-4000-8000-{:012x}'.format(zlib.crc32(symbol.encode()), i),
+                'exchange': EXCHANGES[i % len(EXCHANGES)],
+                # log-uniform between $0.20 and $400
+                'base': 0.2 * math.exp(_unit(seed, symbol, 'base') * math.log(2000.0)),
+                'volatility': 0.01 + 0.04 * _unit(seed, symbol, 'vol'),
+                'volume': int(1e4 * math.exp(_unit(seed, symbol, 'volume') * math.log(1000.0))),
+                'otc': _unit(seed, symbol, 'otc') < otc_fraction,
+                'active': _unit(seed, symbol, 'active') >= inactive_fraction,
+                'tradable': _unit(seed, symbol, 'tradable') >= inactive_fraction,
+            }
+        self._sessions = None
+        self._by_date = {}
+
+    def __contains__(self, symbol):
+        return symbol in self.profiles
+
+    def sessions(self):
+        if(self._sessions == None):
+            sessions = []
+            day = CALENDAR_START
+            while day <= CALENDAR_END:
+                if(day.weekday() < 5 and day not in self.holidays):
+                    open_at = datetime.datetime(day.year, day.month, day.day, 9, 30, tzinfo=NY).timestamp()
+                    sessions.append(Session(day, open_at, open_at + SESSION_MINUTES * 60))
+                day += datetime.timedelta(days=1)
+            self._sessions = sessions
+            self._by_date = {session.date: session for session in sessions}
+        return self._sessions
+
+    def session(self, date):
+        self.sessions()
+        return self._by_date.get(date)
+
+    def sessionAt(self, epoch):
+        '''The session open at `epoch`, or None.'''
+        session = self.session(datetime.datetime.fromtimestamp(epoch, NY).date())
+        if(session != None and session.open_at <= epoch < session.close_at):
+            return session
+        return None
+
+    def nextSession(self, epoch):
+        '''The first session whose close is after `epoch` (the current one while open).'''
+        day = datetime.datetime.fromtimestamp(epoch, NY).date()
+        while day <= CALENDAR_END:
+            session = self.session(day)
+            if(session != None and session.close_at > epoch):
+                return session
+            day += datetime.timedelta(days=1)
+        return None
+
+    def previousSession(self, date):
+        day = date - datetime.timedelta(days=1)
+        while day >= CALENDAR_START:
+            session = self.session(day)
+            if(session != None):
+                return session
+            day -= datetime.timedelta(days=1)
+        return None
+
+    def assetJson(self, symbol):
+        profile = self.profiles[symbol]
+        return {
+            'id': profile['id'],
+            'class': 'us_equity',
+            'exchange': 'OTC' if profile['otc'] else profile['exchange'],
+            'symbol': symbol,
+            'status': 'active' if profile['active'] else 'inactive',
+            'tradable': profile['tradable'] and profile['active'],
+            'marginable': True,
+            'shortable': profile['base'] > 5,
+            'easy_to_borrow': profile['base'] > 5,
+        }
+
+    def polygonSymbolJson(self, symbol):
+        return {
+            'symbol': symbol,
+            'name': 'Simulated {} Inc'.format(symbol),
+            'type': 'cs',
+            'isOTC': self.profiles[symbol]['otc'],
+            'updated': '2019-01-01T00:00:00.000Z',
+            'url': 'https://api.polygon.io/v1/meta/symbols/{}'.format(symbol),
+        }
+
+    def close(self, symbol, date):
+        profile = self.profiles[symbol]
+        day = date.toordinal()
+        phase = _unit(self.seed, symbol, 'phase') * 2 * math.pi
+        log_price = (
+            0.35 * math.sin(day / 180.0 + phase) +
+            0.15 * math.sin(day / 23.0 + 2 * phase) +
+            profile['volatility'] * _normal(self.seed, symbol, day))
+        return round(max(0.01, profile['base'] * math.exp(log_price)), 4)
+
+    def open(self, symbol, date):
+        previous = self.previousSession(date)
+        reference = self.close(symbol, previous.date) if previous != None else self.close(symbol, date)
+        gap = 0.3 * self.profiles[symbol]['volatility'] * _normal(self.seed, symbol, date.toordinal(), 'gap')
+        return round(max(0.01, reference * (1 + gap)), 4)
+
+    def priceAtMinute(self, symbol, date, minute):
+        '''Price `minute` minutes after the open (0..SESSION_MINUTES) on `date`.'''
+        start = self.open(symbol, date)
+        end = self.close(symbol, date)
+        fraction = min(max(minute, 0), SESSION_MINUTES) / float(SESSION_MINUTES)
+        # Pinned to the open and the close; wanders in between.
+        wander = math.sin(math.pi * fraction) * self.profiles[symbol]['volatility'] * (
+            math.sin(minute / 7.0 + 6 * _unit(self.seed, symbol, date, 'w1')) +
+            0.5 * math.sin(minute / 2.3 + 6 * _unit(self.seed, symbol, date, 'w2')))
+        return round(max(0.01, (start + (end - start) * fraction) * (1 + wander)), 4)
+
+    def price(self, symbol, epoch):
+        '''Last trade price at `epoch`: intraday path while open, else the last close.'''
+        session = self.nextSession(epoch)
+        if(session == None):
+            return self.close(symbol, self.sessions()[-1].date)
+        if(session.open_at <= epoch):
+            return self.priceAtMinute(symbol, session.date, (epoch - session.open_at) / 60.0)
+        previous = self.previousSession(session.date)
+        return self.close(symbol, (previous or session).date)
+
+    def dailyBars(self, symbol, start, end):
+        '''Daily bars for sessions with start <= date <= end.'''
+        bars = []
+        day = max(start, CALENDAR_START)
+        volume = self.profiles[symbol]['volume']
+        while day <= end:
+            session = self.session(day)
+            if(session != None):
+                o = self.open(symbol, day)
+                c = self.close(symbol, day)
+                wick = 0.5 * self.profiles[symbol]['volatility'] * _unit(self.seed, symbol, day, 'wick')
+                bars.append({
+                    'o': o,
+                    'h': round(max(o, c) * (1 + wick), 4),
+                    'l': round(min(o, c) * (1 - wick), 4),
+                    'c': c,
+                    'v': int(volume * (0.5 + _unit(self.seed, symbol, day, 'v'))),
+                    'd': day.isoformat(),
+                    't': int(datetime.datetime(day.year, day.month, day.day, tzinfo=NY).timestamp() * 1000),
+                })
+            day += datetime.timedelta(days=1)
+        return bars
+
+    def minuteBars(self, symbol, start, end, until=None):
+        '''Minute bars for sessions with start <= date <= end, up to epoch `until`.'''
+        bars = []
+        day = max(start, CALENDAR_START)
+        volume = self.profiles[symbol]['volume'] / float(SESSION_MINUTES)
+        while day <= end:
+            session = self.session(day)
+            if(session != None):
+                for minute in range(SESSION_MINUTES):
+                    at = session.open_at + minute * 60
+                    if(until != None and at + 60 > until):
+                        break
+                    o = self.priceAtMinute(symbol, day, minute)
+                    c = self.priceAtMinute(symbol, day, minute + 1)
+                    # U-shaped intraday volume
+                    shape = 1.0 + 2.0 * (2.0 * minute / SESSION_MINUTES - 1.0) ** 2
+                    bars.append({
+                        'o': o,
+                        'h': max(o, c),
+                        'l': min(o, c),
+                        'c': c,
+                        'v': int(volume * shape * (0.5 + _unit(self.seed, symbol, day, minute))),
+                        't': int(at * 1000),
+                    })
+            day += datetime.timedelta(days=1)
+        return bars
+
+
+class EarningsCalendar(object):
+    '''
+    Stands in for YahooEarningsCalendar: earnings_between returns the same row dicts,
+    with about `fraction` of the universe reporting on each trading day.
+    '''
+    def __init__(self, market, fraction=0.01):
+        """Return a new EarningsCalendar object."""
+        self.market = market
+        self.fraction = fraction
+
+    def earnings_between(self, from_date, to_date):
+        rows = []
+        day = from_date.date() if isinstance(from_date, datetime.datetime) else from_date
+        end = to_date.date() if isinstance(to_date, datetime.datetime) else to_date
+        while day <= end:
+            if(self.market.session(day) != None):
+                for symbol in self.market.symbols:
+                    if(_unit(self.market.seed, symbol, day, 'earnings') < self.fraction):
+                        after_close = _unit(self.market.seed, symbol, day, 'amc') < 0.5
+                        at = datetime.datetime(
+                            day.year, day.month, day.day, 16 if after_close else 8, 0, tzinfo=NY)
+                        estimate = round(_normal(self.market.seed, symbol, day, 'eps'), 2)
+                        rows.append({
+                            'ticker': symbol,
+                            'companyshortname': 'Simulated {} Inc'.format(symbol),
+                            'startdatetime': at.isoformat(timespec='milliseconds'),
+                            'startdatetimetype': 'AMC' if after_close else 'BMO',
+                            'epsestimate': estimate,
+                            'epsactual': None,
+                            'epssurprisepct': None,
+                            'gmtOffsetMilliSeconds': int(at.utcoffset().total_seconds() * 1000),
+                        })
+            day += datetime.timedelta(days=1)
+        return rows
@@ -0,0 +1,359 @@
+'''
+HTTP front end for the simulated exchange.
+
+Serves the Alpaca REST routes under /v1 and /v2 and the Polygon routes under /polygon,
+for example /polygon/v1/meta/symbols.  Every response carries X-RateLimit-* headers like
+Alpaca's.  Latency, errors and rate limits are injected before a request is routed.
+'''
+import datetime
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .exchange import ExchangeError
+from .market import NY
+
+logger = logging.getLogger(__name__)
+
+
+class FaultInjector(object):
+    '''
+    Adds `latency` seconds (plus up to `jitter` more) to every request, and fails
+    `error_rate` of them with a status drawn from `error_statuses`.  `routes`, when
+    given, restricts errors to paths containing one of its strings.
+    '''
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_statuses=(500, 503, 504), routes=None, seed=None):
+        """Return a new FaultInjector object."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.routes = routes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self):
+        with self.lock:
+            return self.latency + self.random.random() * self.jitter
+
+    def error(self, path):
+        if(self.error_rate <= 0):
+            return None
+        if(self.routes != None and not any(route in path for route in self.routes)):
+            return None
+        with self.lock:
+            if(self.random.random() < self.error_rate):
+                return self.random.choice(self.error_statuses)
+        return None
+
+
+class RateLimiter(object):
+    '''Fixed one-minute windows of `limit` requests per API key, as Alpaca counts them.'''
+    def __init__(self, limit=200, window=60.0):
+        """Return a new RateLimiter object."""
+        self.limit = limit
+        self.window = window
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def take(self, key):
+        '''Returns (allowed, remaining, reset epoch seconds).'''
+        now = time.time()
+        with self.lock:
+            start, count = self.counts.get(key, (now, 0))
+            if(now - start >= self.window):
+                start, count = now, 0
+            allowed = self.limit == None or count < self.limit
+            if(allowed):
+                count += 1
+            self.counts[key] = (start, count)
+        remaining = 0 if self.limit == None else max(0, self.limit - count)
+        return allowed, remaining, int(start + self.window)
+
+
+class Router(object):
+    '''
+    The Alpaca and Polygon routes over an Exchange, without the HTTP server, so
+    client.LocalAPI can call them in-process.
+    '''
+    def __init__(self, exchange):
+        """Return a new Router object."""
+        self.exchange = exchange
+        self.routes = self._routes()
+
+    def _routes(self):
+        exchange = self.exchange
+        alpaca = r'^/v\d+'
+        polygon = r'^/polygon/v\d+'
+        return [
+            ('GET', alpaca + r'/account$', lambda m, q, b: exchange.accountJson()),
+            ('GET', alpaca + r'/assets$', lambda m, q, b: exchange.assets(q.get('status'))),
+            ('GET', alpaca + r'/assets/(?P<symbol>[^/]+)$', lambda m, q, b: exchange.asset(m['symbol'])),
+            ('GET', alpaca + r'/calendar$', lambda m, q, b: exchange.calendar(q.get('start'), q.get('end'))),
+            ('GET', alpaca + r'/clock$', lambda m, q, b: exchange.clockJson()),
+            ('GET', alpaca + r'/orders$', lambda m, q, b: exchange.listOrders(
+                q.get('status', 'open'), q.get('limit'), q.get('after'), q.get('until'), q.get('direction', 'desc'))),
+            ('POST', alpaca + r'/orders$', lambda m, q, b: exchange.submitOrder(b or {})),
+            ('DELETE', alpaca + r'/orders$', lambda m, q, b: exchange.cancelAll()),
+            ('GET', alpaca + r'/orders:by_client_order_id$', lambda m, q, b: exchange.orderByClientId(q.get('client_order_id'))),
+            ('GET', alpaca + r'/orders/(?P<id>[^/]+)$', lambda m, q, b: exchange.order(m['id'])),
+            ('DELETE', alpaca + r'/orders/(?P<id>[^/]+)$', lambda m, q, b: exchange.cancelOrder(m['id'])),
+            ('GET', alpaca + r'/positions$', lambda m, q, b: exchange.listPositions()),
+            ('GET', alpaca + r'/positions/(?P<symbol>[^/]+)$', lambda m, q, b: exchange.positionJson(m['symbol'])),
+            ('DELETE', alpaca + r'/positions/(?P<symbol>[^/]+)$', lambda m, q, b: exchange.closePosition(m['symbol'])),
+            ('GET', polygon + r'/meta/symbols$', lambda m, q, b: self._symbols(q)),
+            ('GET', polygon + r'/historic/agg/(?P<size>day|minute)/(?P<symbol>[^/]+)$', lambda m, q, b: self._aggs(m, q)),
+            ('GET', polygon + r'/snapshot/locale/us/markets/stocks/tickers$', lambda m, q, b: self._snapshot(q)),
+            ('GET', polygon + r'/last/stocks/(?P<symbol>[^/]+)$', lambda m, q, b: self._lastTrade(m['symbol'])),
+        ]
+
+    def route(self, method, path):
+        '''Returns (pattern, match, handler) for a request, or (None, None, None).'''
+        for route_method, pattern, handler in self.routes:
+            if(route_method == method):
+                match = re.match(pattern, path)
+                if(match):
+                    return pattern, match, handler
+        return None, None, None
+
+    def dispatch(self, method, path, query=None, body=None):
+        '''Calls the route for a request; raises ExchangeError like the HTTP front end reports it.'''
+        pattern, match, handler = self.route(method, path)
+        if(handler == None):
+            raise ExchangeError(404, 40410000, 'endpoint not found')
+        return handler(match.groupdict(), query or {}, body)
+
+    # Polygon
+
+    def _symbols(self, q):
+        market = self.exchange.market
+        per_page = int(q.get('perpage', 50))
+        page = int(q.get('page', 1))
+        symbols = market.symbols
+        if(q.get('isOTC') in ('false', 'true')):
+            otc = q['isOTC'] == 'true'
+            symbols = [symbol for symbol in symbols if market.profiles[symbol]['otc'] == otc]
+        start = (page - 1) * per_page
+        return {
+            'page': page,
+            'perPage': per_page,
+            'count': len(symbols),
+            'symbols': [market.polygonSymbolJson(symbol) for symbol in symbols[start:start + per_page]],
+        }
+
+    def _aggs(self, m, q):
+        market = self.exchange.market
+        symbol = m['symbol']
+        if(symbol not in market):
+            raise ExchangeError(404, 404, 'unknown symbol')
+        now = self.exchange.clock.now()
+        today = datetime.datetime.fromtimestamp(now, NY).date()
+        end = datetime.date.fromisoformat(q['to'][:10]) if q.get('to') else today
+        start = datetime.date.fromisoformat(q['from'][:10]) if q.get('from') else end - datetime.timedelta(days=30)
+        if(m['size'] == 'day'):
+            # Today's bar only exists once the session has closed.
+            last = market.nextSession(now)
+            if(last != None and end >= last.date):
+                end = last.date - datetime.timedelta(days=1)
+            ticks = market.dailyBars(symbol, start, end)
+            mapping = {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 'd': 'day', 't': 'timestamp'}
+        else:
+            ticks = market.minuteBars(symbol, start, end, until=now)
+            mapping = {'o': 'open', 'h': 'high', 'l': 'low', 'c': 'close', 'v': 'volume', 't': 'timestamp'}
+        if(q.get('limit')):
+            ticks = ticks[:int(q['limit'])]
+        return {
+            'symbol': symbol,
+            'aggType': 'daily' if m['size'] == 'day' else 'min',
+            'map': mapping,
+            'ticks': ticks,
+        }
+
+    def _snapshot(self, q):
+        market = self.exchange.market
+        now = self.exchange.clock.now()
+        symbols = q['tickers'].split(',') if q.get('tickers') else market.symbols
+        session = market.nextSession(now)
+        previous = market.previousSession(session.date) if session != None else None
+        tickers = []
+        for symbol in symbols:
+            if(symbol not in market):
+                continue
+            price = market.price(symbol, now)
+            prev_close = market.close(symbol, previous.date) if previous != None else price
+            spread = max(0.0001, round(price * 0.0005, 4))
+            stamp = int(now * 1e9)
+            tickers.append({
+                'ticker': symbol,
+                'day': {'c': price},
+                'lastTrade': {'p': price, 's': 100, 't': stamp},
+                'lastQuote': {'p': round(price - spread, 4), 'P': round(price + spread, 4), 's': 1, 'S': 1, 't': stamp},
+                'prevDay': {'c': prev_close},
+                'updated': stamp,
+            })
+        return {'status': 'OK', 'tickers': tickers}
+
+    def _lastTrade(self, symbol):
+        market = self.exchange.market
+        if(symbol not in market):
+            raise ExchangeError(404, 404, 'unknown symbol')
+        now = self.exchange.clock.now()
+        return {
+            'status': 'success',
+            'symbol': symbol,
+            'last': {'price': market.price(symbol, now), 'size': 100, 'exchange': 11, 'timestamp': int(now * 1000)},
+        }
+
+
+class SimulatorServer(object):
+    '''
+    Threaded HTTP server around an Exchange.
+
+        server = SimulatorServer(exchange, faults=FaultInjector(latency=0.05)).start()
+        api = simulator.connect(server.url)
+        ...
+        server.stop()
+
+    A background thread runs the matching engine every `match_interval` seconds.
+    '''
+    def __init__(self, exchange, host='127.0.0.1', port=0, faults=None, rate_limit=200, match_interval=0.1):
+        """Return a new SimulatorServer object."""
+        self.exchange = exchange
+        self.faults = faults or FaultInjector()
+        self.limiter = RateLimiter(rate_limit)
+        self.match_interval = match_interval
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.router = Router(exchange)
+        server = self
+
+        class Handler(_Handler):
+            simulator = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        for target in (self.httpd.serve_forever, self._matchLoop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info('Simulator listening on %s', self.url)
+        return self
+
+    def serveForever(self):
+        matcher = threading.Thread(target=self._matchLoop, daemon=True)
+        matcher.start()
+        logger.info('Simulator listening on %s', self.url)
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stopping.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _matchLoop(self):
+        while not self.stopping.wait(self.match_interval):
+            try:
+                self.exchange.match()
+            except Exception:
+                logger.exception('Matching pass failed')
+
+    def count(self, key):
+        with self.counts_lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stats(self):
+        with self.counts_lock:
+            return dict(self.counts)
+
+    def route(self, method, path):
+        return self.router.route(method, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this keep-alive clients stall on delayed ACKs.
+    disable_nagle_algorithm = True
+    simulator = None
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _handle(self, method):
+        simulator = self.simulator
+        split = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(split.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        key = self.headers.get('APCA-API-KEY-ID') or query.get('apiKey') or 'anonymous'
+
+        allowed, remaining, reset = simulator.limiter.take(key)
+        headers = {
+            'X-RateLimit-Limit': str(simulator.limiter.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(reset),
+        }
+        delay = simulator.faults.delay()
+        if(delay > 0):
+            time.sleep(delay)
+        pattern, match, handler = simulator.route(method, split.path)
+        if(not allowed):
+            simulator.count('429')
+            return self._send(429, {'code': 42910000, 'message': 'rate limit exceeded'}, headers)
+        injected = simulator.faults.error(split.path)
+        if(injected != None):
+            simulator.count(str(injected))
+            return self._send(injected, {'code': injected * 100000, 'message': 'injected error'}, headers)
+        if(handler == None):
+            simulator.count('404')
+            return self._send(404, {'code': 40410000, 'message': 'endpoint not found'}, headers)
+        simulator.count('{} {}'.format(method, pattern))
+        try:
+            body = json.loads(raw_body) if raw_body else None
+            result = handler(match.groupdict(), query, body)
+        except ExchangeError as exc:
+            return self._send(exc.status, {'code': exc.code, 'message': exc.message}, headers)
+        except ValueError as exc:
+            return self._send(422, {'code': 40010001, 'message': str(exc)}, headers)
+        except Exception as exc:
+            logger.exception('Simulator route %s failed', split.path)
+            return self._send(500, {'code': 50010000, 'message': str(exc)}, headers)
+        if(result == None):
+            return self._send(204, None, headers)
+        return self._send(200, result, headers)
+
+    def _send(self, status, payload, headers):
+        body = b'' if payload == None else json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if(payload != None):
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
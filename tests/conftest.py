@@ -0,0 +1,5 @@
+import os
+import sys
+
+# main.py runs from the repository root, where algos, data and simulator are top-level packages.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
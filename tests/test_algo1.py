@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from algos.algo1 import PennyAlgo
+from algos.pipeline import PreOpenScreen
+from data.data import Data
+from data.minute_bars import MinuteBarArchive
+from data.replay import VirtualClock
+from simulator.client import LocalAPI
+from simulator.exchange import Exchange
+from simulator.market import NY, EarningsCalendar, MarketModel
+
+START = datetime.datetime(2019, 7, 2, 11, 30, tzinfo=NY)
+
+
+class ExchangeTime(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def now(self):
+        return self.clock.time()
+
+
+@pytest.fixture
+def world(tmp_path):
+    clock = VirtualClock(int(START.timestamp()) * 1000000000)
+    clock.install()
+    market = MarketModel(symbols=30, seed=5, inactive_fraction=0.0)
+    api = LocalAPI(Exchange(market, ExchangeTime(clock)))
+    data = Data(api, EarningsCalendar(market, fraction=0.2))
+    algo = PennyAlgo(api, MinuteBarArchive(str(tmp_path / 'bars')))
+    try:
+        yield api, data, algo
+    finally:
+        clock.uninstall()
+
+
+def test_trade_stocks_ranks_the_candidates_and_submits_the_plan(world):
+    api, data, algo = world
+    data.candidates = data.assets[:10]
+    algo.prefetch_data(data)
+    assert set(algo.bars.symbols()) == set(algo.candidate_symbols(data))
+    results = algo.trade_stocks(data)
+    assert 0 < len(results) <= algo.MaxPositions
+    submitted = [order for planned, order in results if not isinstance(order, Exception)]
+    assert submitted and all(order.side == 'buy' for order in submitted)
+    assert set(order.symbol for order in submitted) <= set(algo.candidate_symbols(data))
+    # Buying power is reserved for the working orders, and a retried window sends nothing new.
+    assert data.risk.reserved > 0
+    assert all(isinstance(order, Exception) for planned, order in algo.trade_stocks(data))
+
+
+def test_trade_stocks_without_candidates_leaves_positions_alone(world):
+    api, data, algo = world
+    assert algo.trade_stocks(data) == []
+
+
+def test_the_screen_leaves_out_reporting_symbols_and_refreshes_data(world, monkeypatch):
+    api, data, algo = world
+    monkeypatch.setattr(PreOpenScreen, 'sma', lambda self, asset: [asset])
+    data.polygon_symbols, data.earnings = [], []
+    candidates = algo.get_and_filter_candidate_stocks(data)
+    reporting = set(ed.ticker for ed in data.earnings)
+    assert candidates and reporting
+    assert not reporting & set(asset.symbol for asset in candidates)
+    assert data.polygon_symbols
+    assert set(data.earnings_table.tickersBetween()) == reporting
@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import datetime
+import json
+
+import pytest
+
+from data.async_data import AsyncData
+from data.data import Data
+from data.replay import VirtualClock
+from simulator.client import LocalAPI, _query
+from simulator.exchange import Exchange
+from simulator.market import NY, EarningsCalendar, MarketModel
+from simulator.server import Router
+
+START = datetime.datetime(2019, 7, 2, 10, 0, tzinfo=NY)
+URL = 'http://simulator'
+
+
+class ExchangeTime(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def now(self):
+        return self.clock.time()
+
+
+class Response(object):
+
+    def __init__(self, body):
+        self.status = 200
+        self.body = json.dumps(body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def read(self):
+        return self.body.encode()
+
+
+class Session(object):
+    '''Stands in for an aiohttp session, routing GETs to the simulator in-process.'''
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.router = Router(exchange)
+        self.closed = False
+        self.paths = collections.Counter()
+
+    def get(self, url, params=None, headers=None):
+        path = url[len(URL):]
+        self.paths[path] += 1
+        self.exchange.match()
+        return Response(self.router.dispatch('GET', path, _query(params)))
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock(int(START.timestamp()) * 1000000000)
+    clock.install()
+    yield clock
+    clock.uninstall()
+
+
+@pytest.fixture
+def api(clock):
+    market = MarketModel(symbols=30, seed=5, inactive_fraction=0.0)
+    return LocalAPI(Exchange(market, ExchangeTime(clock)))
+
+
+def client(api):
+    session = Session(api.exchange)
+    return AsyncData(base_url=URL, polygon_url=URL + '/polygon', api_version='v2', session=session), session
+
+
+def buy(api, symbol='AAB', qty=10):
+    return api.submit_order(symbol, qty, 'buy', 'market', 'day')
+
+
+def test_refresh_applies_through_data(api, clock):
+    data = Data(api, EarningsCalendar(api.exchange.market))
+    async_data, session = client(api)
+    clock.sleep(1)
+    order = buy(api)
+    data.risk.onOrderSubmitted(order.id, 'AAB', 'buy', 10, 100.0)
+    assert asyncio.run(async_data.refresh(data)) == ['clock', 'orders', 'positions']
+    assert data.position_book.get('AAB').qty == 10
+    assert data.holdings.qty('AAB') == 10
+    # The fill reached the risk engine and the position book was not due a reconcile.
+    assert data.risk.reservations == {}
+    assert session.paths['/v2/positions'] == 0
+
+
+def test_refresh_follows_the_polling_governor(api, clock):
+    data = Data(api, EarningsCalendar(api.exchange.market))
+    async_data, session = client(api)
+    asyncio.run(async_data.refresh(data))
+    requests = sum(session.paths.values())
+    assert asyncio.run(async_data.refresh(data)) == []
+    assert sum(session.paths.values()) == requests
+
+
+def test_refresh_reconciles_positions_when_due(api, clock):
+    data = Data(api, EarningsCalendar(api.exchange.market))
+    async_data, session = client(api)
+    clock.sleep(1)
+    buy(api)
+    data.position_book.reconciled_at -= data.position_book.reconcile_interval
+    asyncio.run(async_data.refresh(data))
+    assert session.paths['/v2/positions'] == 1
+    assert [position.symbol for position in data.positions] == ['AAB']
+    assert data.position_book.get('AAB').qty == 10
+    assert data.holdings.qty('AAB') == 10
+
+
+def test_request_orders_pages_from_a_cutoff(api, clock):
+    async_data, session = client(api)
+    for i in range(5):
+        clock.sleep(60)
+        buy(api, qty=1)
+    after = (START + datetime.timedelta(seconds=30)).isoformat()
+    orders = asyncio.run(async_data.requestOrders(limit=2, after=after))
+    assert len(orders) == 5
+    assert [order.id for order in orders] == [order.id for order in api.list_orders(status='all')]
+    assert session.paths['/v2/orders'] == 3
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from data.cache import LocalCache, RedisCache, SharedCache, SingleFlight, dumps, loads
+
+
+class Entity(object):
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, key):
+        if(key in self._raw):
+            return self._raw[key]
+        return super(Entity, self).__getattribute__(key)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def redis(server, prefix='algo:'):
+    return RedisCache(fakeredis.FakeRedis(server=server), prefix=prefix)
+
+
+def test_round_trip_keeps_entities():
+    value = loads(dumps([Entity({'symbol': 'AAPL', 'tradable': True})]))
+    assert value[0].symbol == 'AAPL'
+    assert loads(b'XX' + dumps(1)[2:]) == None
+    assert loads(None) == None
+
+
+def test_local_cache_expiry_and_lru():
+    cache = LocalCache(max_entries=2)
+    cache.set('a', b'1', 60)
+    cache.set('b', b'2', -1)
+    assert cache.get('a') == b'1'
+    assert cache.get('b') == None
+    cache.set('b', b'2', 60)
+    cache.get('a')
+    cache.set('c', b'3', 60)
+    # 'b' was least recently used.
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (b'1', None, b'3')
+
+
+def test_redis_cache_ttl(server):
+    cache = redis(server)
+    cache.set('assets:all', b'payload', 0.05)
+    assert cache.get('assets:all') == b'payload'
+    assert 0 < cache.client.pttl('algo:assets:all') <= 50
+    time.sleep(0.1)
+    assert cache.get('assets:all') == None
+
+
+@pytest.mark.parametrize('backend', ['local', 'redis'])
+def test_locks(server, backend):
+    cache = LocalCache() if backend == 'local' else redis(server)
+    token = cache.acquireLock('assets:all', 60)
+    assert token != None
+    assert cache.acquireLock('assets:all', 60) == None
+    cache.releaseLock('assets:all', 'not the holder')
+    assert cache.acquireLock('assets:all', 60) == None
+    cache.releaseLock('assets:all', token)
+    assert cache.acquireLock('assets:all', 60) != None
+
+
+def test_shared_cache_ttl_by_dataset(server):
+    cache = SharedCache(redis(server), ttls={'quotes': 5})
+    cache.set('assets', 'all', ['AAPL'])
+    cache.set('quotes', 'AAPL', 200.0)
+    cache.set('other', 'x', 1)
+    assert cache.get('assets', 'all') == ['AAPL']
+    client = cache.backend.client
+    assert client.ttl('algo:assets:all') == 6 * 3600
+    assert client.ttl('algo:quotes:AAPL') == 5
+    assert client.ttl('algo:other:x') == 60
+    cache.invalidate('assets', 'all')
+    assert cache.get('assets', 'all') == None
+
+
+def test_get_or_fetch_hits_after_the_first_fetch(server):
+    calls = []
+    cache = SharedCache(redis(server))
+    fetch = lambda: calls.append(1) or ['AAPL']
+    assert cache.getOrFetch('assets', 'all', fetch) == ['AAPL']
+    # Another node sharing the server never fetches.
+    other = SharedCache(redis(server))
+    assert other.getOrFetch('assets', 'all', fetch) == ['AAPL']
+    assert len(calls) == 1
+    assert (cache.misses, other.hits) == (1, 1)
+
+
+def test_waits_for_the_node_holding_the_lock(server):
+    cache = SharedCache(redis(server), poll_interval=0.01)
+    holder = redis(server)
+    token = holder.acquireLock('assets:all', 60)
+
+    def finish():
+        time.sleep(0.05)
+        holder.set('assets:all', dumps(['MSFT']), 60)
+        holder.releaseLock('assets:all', token)
+    thread = threading.Thread(target=finish)
+    thread.start()
+    assert cache.getOrFetch('assets', 'all', lambda: pytest.fail('fetched while another node held the lock')) == ['MSFT']
+    thread.join()
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do('key', fetch))) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    while(flights.inFlight() == 0):
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+    assert flights.inFlight() == 0
+
+
+def test_single_flight_shares_the_error():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fetch():
+        release.wait(5)
+        raise IOError('503')
+
+    def call():
+        try:
+            flights.do('key', fetch)
+        except IOError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and len(set(map(id, errors))) == 1
@@ -0,0 +1,132 @@
+import datetime
+import pickle
+
+import numpy
+import pandas
+import pytest
+
+from data.alpaca_data import Clock
+from data.clock import setTimeSource, toNs, nowNs
+from data.replay import VirtualClock
+
+NY = datetime.timezone(datetime.timedelta(hours=-4))
+
+
+def at(text):
+    setTimeSource(lambda: toNs(text))
+
+
+@pytest.fixture
+def clock():
+    opens = datetime.datetime(2019, 6, 4, 9, 30, tzinfo=NY)
+    closes = datetime.datetime(2019, 6, 4, 16, 0, tzinfo=NY)
+    yield Clock(opens, False, opens, closes)
+    setTimeSource(None)
+
+
+def test_before_open_borrows_across_the_hour(clock):
+    at('2019-06-04T08:45:00-04:00')
+    assert clock.beforeMarketOpen(minute=45)
+    assert not clock.beforeMarketOpen(minute=44)
+    at('2019-06-04T08:45:00.999-04:00')
+    assert clock.beforeMarketOpen(minute=45)
+    at('2019-06-03T08:45:00-04:00')
+    assert not clock.beforeMarketOpen(minute=45)
+
+
+def test_before_close(clock):
+    at('2019-06-04T14:55:00-04:00')
+    assert clock.beforeMarketClose(hour=1, minute=5)
+    assert not clock.beforeMarketClose(minute=5)
+
+
+def test_after_open_carries_into_the_next_hour(clock):
+    at('2019-06-04T10:15:00-04:00')
+    assert clock.afterMarketOpen(minute=45)
+    # Any date: next_open has already moved on while the market is open.
+    at('2019-06-05T10:15:00-04:00')
+    assert clock.afterMarketOpen(minute=45)
+    at('2019-06-04T10:15:01-04:00')
+    assert not clock.afterMarketOpen(minute=45)
+
+
+def test_after_close(clock):
+    at('2019-06-04T16:30:00-04:00')
+    assert clock.afterMarketClose(minute=30)
+
+
+def test_after_close_wraps_past_midnight(clock):
+    at('2019-06-05T00:30:00-04:00')
+    assert clock.afterMarketClose(hour=8, minute=30)
+    at('2019-06-04T00:30:00-04:00')
+    assert clock.afterMarketClose(hour=8, minute=30)
+    at('2019-06-05T00:31:00-04:00')
+    assert not clock.afterMarketClose(hour=8, minute=30)
+
+
+def test_run_per_minute_only_inside_market_hours(clock):
+    at('2019-06-04T09:30:01-04:00')
+    assert clock.duringMarketHoursRunPerMinute()
+    at('2019-06-04T12:00:02-04:00')
+    assert not clock.duringMarketHoursRunPerMinute()
+    at('2019-06-04T09:29:01-04:00')
+    assert not clock.duringMarketHoursRunPerMinute()
+    at('2019-06-04T16:00:01-04:00')
+    assert not clock.duringMarketHoursRunPerMinute()
+
+
+def test_run_per_hour(clock):
+    at('2019-06-04T11:01:01-04:00')
+    assert clock.duringMarketHoursRunPerHour()
+    assert not clock.duringMarketHoursRunPerHour(minute=2)
+    at('2019-06-04T09:01:01-04:00')
+    assert not clock.duringMarketHoursRunPerHour()
+
+
+def test_string_fields():
+    clock = Clock(None, False, '2019-06-04T09:30:00-04:00', '2019-06-04T16:00:00-04:00')
+    at('2019-06-04T09:00:00-04:00')
+    try:
+        assert clock.beforeMarketOpen(minute=30)
+    finally:
+        setTimeSource(None)
+
+
+def test_virtual_clock_drives_now(clock):
+    virtual = VirtualClock(toNs('2019-06-04T08:45:00-04:00'))
+    virtual.install()
+    try:
+        assert clock.beforeMarketOpen(minute=45)
+        virtual.sleep(60)
+        assert clock.beforeMarketOpen(minute=44)
+        assert Clock.now().minute == 46
+    finally:
+        virtual.uninstall()
+
+
+def test_wall_clock_without_a_source():
+    setTimeSource(None)
+    assert abs(nowNs() - int(datetime.datetime.now().timestamp() * 1e9)) < 1e9
+
+
+def test_to_ns():
+    assert toNs(numpy.int64(5)) == 5
+    assert toNs(5.0) == 5
+    assert toNs(datetime.datetime(1970, 1, 1, 0, 0, 1)) == 1000000000
+    assert toNs(datetime.datetime(1970, 1, 1, 0, 0, 1, tzinfo=NY)) == 1000000000 + 4 * 3600 * 1000000000
+    assert toNs(datetime.date(1970, 1, 2)) == 86400 * 1000000000
+    assert toNs('1970-01-01T00:00:01.000000001Z') == 1000000001
+    assert toNs(pandas.Timestamp('1970-01-01T00:00:01Z')) == 1000000000
+    assert toNs(numpy.datetime64('1970-01-01T00:00:01')) == 1000000000
+    assert toNs(None) == None
+    assert toNs('', -1) == -1
+
+
+def test_cached_times_stay_off_the_instance(clock):
+    at('2019-06-04T08:45:00-04:00')
+    clock.beforeMarketOpen(minute=45)
+    assert '_times' not in str(clock)
+    assert pickle.loads(pickle.dumps(clock)).__dict__.keys() == clock.__dict__.keys()
+    # Reassigning next_open is picked up.
+    clock.next_open = datetime.datetime(2019, 6, 4, 9, 45, tzinfo=NY)
+    assert clock.beforeMarketOpen(hour=1)
@@ -0,0 +1,78 @@
+import collections
+import datetime
+
+from data.coalesce import CoalescingAPI
+
+Bar = collections.namedtuple('Bar', 'timestamp close')
+
+
+class FakePolygon(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def historic_agg(self, size='day', symbol=None, _from=None, to=None, limit=None):
+        self.calls += 1
+        day = _from
+        bars = []
+        while day <= to:
+            bars.append(Bar(datetime.datetime.combine(day, datetime.time()), 1.0))
+            day += datetime.timedelta(days=1)
+        return bars
+
+
+class FakeAPI(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.polygon = FakePolygon()
+
+    def list_orders(self, after=None):
+        self.calls += 1
+        return [after]
+
+    def get_account(self):
+        self.calls += 1
+        return 'account'
+
+    def submit_order(self, symbol):
+        return symbol
+
+
+def test_reads_are_memoized_and_writes_invalidate():
+    fake = FakeAPI()
+    api = CoalescingAPI(fake, windows={'get_account': 60.0})
+    api.get_account()
+    api.get_account()
+    assert fake.calls == 1
+    api.submit_order('AAPL')
+    api.get_account()
+    assert fake.calls == 2
+    assert api.stats() == {'hits': 1, 'misses': 2}
+
+
+def test_narrower_aggregates_come_from_a_cached_range():
+    fake = FakeAPI()
+    api = CoalescingAPI(fake)
+    start = datetime.date(2019, 6, 1)
+    api.polygon.historic_agg('day', 'AAPL', _from=start, to=datetime.date(2019, 6, 10))
+    bars = api.polygon.historic_agg('day', 'AAPL', _from=datetime.date(2019, 6, 3), to=datetime.date(2019, 6, 4))
+    assert fake.polygon.calls == 1
+    assert [bar.timestamp.day for bar in bars] == [3, 4]
+
+
+def test_expired_entries_are_swept_on_insert():
+    fake = FakeAPI()
+    api = CoalescingAPI(fake, windows={'list_orders': 0.0, 'polygon.historic_agg': 0.0})
+    shared = api._shared
+    for cutoff in range(5):
+        api.list_orders(after=str(cutoff))
+    api.polygon.historic_agg('day', 'AAPL', _from=datetime.date(2019, 6, 1), to=datetime.date(2019, 6, 2))
+    assert len(shared['memo']) == 5
+    assert list(shared['ranges']) == [('day', 'AAPL')]
+
+    # Nothing is swept more often than SWEEP_INTERVAL.
+    shared['swept_at'] -= 3600
+    api.list_orders(after='latest')
+    assert list(shared['memo']) == [('list_orders', '()', repr([('after', 'latest')]))]
+    assert shared['ranges'] == {}
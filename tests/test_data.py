@@ -0,0 +1,130 @@
+import collections
+import datetime
+
+import pytest
+
+from data.data import Data
+from data.replay import VirtualClock
+from simulator.client import LocalAPI
+from simulator.exchange import Exchange
+from simulator.market import NY, EarningsCalendar, MarketModel
+
+START = datetime.datetime(2019, 7, 2, 10, 0, tzinfo=NY)
+
+
+class ExchangeTime(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def now(self):
+        return self.clock.time()
+
+
+class Counting(object):
+    '''Counts the calls made through it to a LocalAPI.'''
+
+    def __init__(self, api):
+        self.api = api
+        self.polygon = api.polygon
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.api, name)
+        if(not callable(attribute)):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return attribute(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock(int(START.timestamp()) * 1000000000)
+    clock.install()
+    yield clock
+    clock.uninstall()
+
+
+@pytest.fixture
+def api(clock):
+    market = MarketModel(symbols=30, seed=5, inactive_fraction=0.0)
+    return Counting(LocalAPI(Exchange(market, ExchangeTime(clock))))
+
+
+def build(api):
+    return Data(api, EarningsCalendar(api.exchange.market))
+
+
+def buy(api, symbol='AAB', qty=10):
+    return api.submit_order(symbol, qty, 'buy', 'market', 'day')
+
+
+def test_fills_reach_the_position_book_without_a_positions_request(api, clock):
+    data = build(api)
+    assert len(data.position_book) == 0
+    requested = api.calls['list_positions']
+    clock.sleep(1)
+    order = buy(api)
+    data.applyOrders(data.requestOrders())
+    data.updatePositions()
+    assert api.calls['list_positions'] == requested
+    position = data.position_book.get('AAB')
+    assert position.qty == 10
+    assert position.avg_entry_price == pytest.approx(float(order.filled_avg_price))
+    # Seeing the same orders again applies nothing twice.
+    data.applyOrders(data.requestOrders())
+    assert data.position_book.get('AAB').qty == 10
+
+
+def test_snapshot_prices_mark_the_book(api, clock):
+    data = build(api)
+    clock.sleep(1)
+    buy(api)
+    data.applyOrders(data.requestOrders())
+    clock.sleep(1800)
+    data.snapshots.refresh(['AAB'])
+    data.updatePositions()
+    price = api.exchange.lastPrice('AAB')
+    assert data.position_book.get('AAB').current_price == price
+    assert data.position_book.net_exposure == pytest.approx(10 * price)
+
+
+def test_reconciles_only_when_due(api, clock):
+    data = build(api)
+    requested = api.calls['list_positions']
+    data.updatePositions()
+    assert api.calls['list_positions'] == requested
+    data.position_book.reconciled_at -= data.position_book.reconcile_interval
+    clock.sleep(1)
+    buy(api)
+    data.updatePositions()
+    assert api.calls['list_positions'] == requested + 1
+    assert data.position_book.get('AAB').qty == 10
+    assert [position.symbol for position in data.positions] == ['AAB']
+    # The fill was already in the reconciled positions, so it is not applied again.
+    data.applyOrders(data.requestOrders())
+    assert data.position_book.get('AAB').qty == 10
+    assert data.holdings.qty('AAB') == 10
+
+
+def test_poll_feeds_the_book(api, clock):
+    data = build(api)
+    clock.sleep(1)
+    buy(api, qty=4)
+    clock.sleep(60)
+    assert 'orders' in data.poll()
+    assert data.position_book.get('AAB').qty == 4
+
+
+def test_a_new_session_resets_the_day_trade_state(api, clock):
+    data = build(api)
+    data.risk.onFill('1', 'AAB', 'buy', 10, 1.0)
+    data.applyClock(data.requestClock())
+    assert data.risk.bought_today == {'AAB'}
+    clock.sleep(24 * 3600)
+    assert 'clock' in data.poll()
+    assert data.session == START.date() + datetime.timedelta(days=1)
+    assert data.risk.bought_today == set()
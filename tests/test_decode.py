@@ -0,0 +1,45 @@
+import numpy
+import pytest
+
+from data.clock import NAT, toNs
+from data.decode import decodeOrders
+
+SECOND = 1000000000
+MIDNIGHT = 1559606400 * SECOND  # 2019-06-04T00:00:00Z
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2019-06-04T00:00:00Z', MIDNIGHT),
+    ('2019-06-04T00:00:00.123456789Z', MIDNIGHT + 123456789),
+    ('2019-06-04T00:00:00-04:00', MIDNIGHT + 4 * 3600 * SECOND),
+    ('2019-06-04T00:00:00.5+00:00', MIDNIGHT + SECOND // 2),
+    ('', NAT),
+    (None, NAT),
+    ('not a time', NAT),
+])
+def test_parse_time(value, expected):
+    assert toNs(value, NAT) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2019-06-04 00:00:00-04:00', MIDNIGHT + 4 * 3600 * SECOND),
+    ('2019-06-04 00:00:00.25 -04:00', MIDNIGHT + 4 * 3600 * SECOND + SECOND // 4),
+    ('2019-06-04', MIDNIGHT),
+    (' 2019-06-04 ', MIDNIGHT),
+    ('2019-06-04T01:00:00', MIDNIGHT + 3600 * SECOND),
+])
+def test_parse_time_without_a_t_or_a_time(value, expected):
+    assert toNs(value, NAT) == expected
+
+
+def test_decode_orders():
+    table = decodeOrders([
+        {'id': '1', 'symbol': 'AAPL', 'qty': '10', 'filled_qty': '4', 'submitted_at': '2019-06-04T00:00:00Z'},
+        {'id': '2', 'symbol': 'MSFT', 'qty': '5', 'filled_qty': None, 'submitted_at': None},
+    ])
+    assert len(table) == 2
+    assert list(table['symbol']) == ['AAPL', 'MSFT']
+    assert table['qty'].tolist() == [10.0, 5.0]
+    assert numpy.isnan(table['filled_qty'][1])
+    assert table['submitted_at'].tolist() == [MIDNIGHT, NAT]
+    assert table.row('MSFT').id == '2'
@@ -0,0 +1,81 @@
+import datetime
+
+import numpy
+
+from data.earnings_table import EarningsTable
+
+UTC = datetime.timezone.utc
+
+
+class Asset(object):
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+
+ROWS = [
+    {'ticker': 'MSFT', 'companyshortname': 'Microsoft', 'startdatetime': '2019-07-18T20:00:00.000Z',
+     'startdatetimetype': 'AMC', 'epsestimate': 1.21, 'epsactual': 1.37, 'epssurprisepct': '13.22'},
+    {'ticker': 'AAPL', 'companyshortname': 'Apple', 'startdatetime': '2019-07-30T20:30:00.000Z',
+     'startdatetimetype': 'AMC', 'epsestimate': 2.1, 'epsactual': None, 'epssurprisepct': ''},
+    {'ticker': 'AAPL', 'companyshortname': 'Apple', 'startdatetime': '2019-04-30T20:30:00.000Z',
+     'startdatetimetype': 'AMC', 'epsestimate': 2.37, 'epsactual': 2.46, 'epssurprisepct': 'n/a'},
+    {'ticker': 'XYZ', 'companyshortname': None, 'startdatetime': None,
+     'startdatetimetype': 'TNS', 'epsestimate': None, 'epsactual': None, 'epssurprisepct': None},
+]
+
+
+def at(month, day, hour=0):
+    return datetime.datetime(2019, month, day, hour, tzinfo=UTC)
+
+
+def test_rows_are_sorted_and_parsed():
+    table = EarningsTable.fromRows(ROWS)
+    assert len(table) == 4
+    assert list(table.tickers) == ['XYZ', 'AAPL', 'MSFT', 'AAPL']
+    assert table.start_times[0] == -1
+    assert table.start_times[2] == int(at(7, 18, 20).timestamp()) * 1000000000
+    assert table.eps_surprise_pcts[2] == 13.22
+    assert numpy.isnan(table.eps_actuals[3]) and numpy.isnan(table.eps_surprise_pcts[1])
+    assert table.by_ticker['AAPL'] == [1, 3]
+    assert 'MSFT' in table and 'GOOG' not in table
+
+
+def test_windows():
+    table = EarningsTable.fromRows(ROWS)
+    assert list(table.tickersBetween(at(7, 1), at(8, 1))) == ['MSFT', 'AAPL']
+    # The end is exclusive.
+    assert list(table.tickersBetween(at(7, 1), at(7, 18, 20))) == []
+    assert table.reportsBetween('AAPL', at(4, 1), at(5, 1))
+    assert not table.reportsBetween('MSFT', at(4, 1), at(5, 1))
+    assert not table.reportsBetween('GOOG')
+
+
+def test_next_report():
+    table = EarningsTable.fromRows(ROWS)
+    assert table.nextReport('AAPL') == int(at(4, 30, 20).timestamp()) * 1000000000 + 30 * 60 * 1000000000
+    assert table.nextReport('AAPL', at(5, 1)) == int(at(7, 30, 20).timestamp()) * 1000000000 + 30 * 60 * 1000000000
+    assert table.nextReport('AAPL', at(8, 1)) == None
+    # A row without a time is never the next report.
+    assert table.nextReport('XYZ') == None
+    assert table.nextReport('GOOG') == None
+
+
+def test_exclude_reporting():
+    table = EarningsTable.fromRows(ROWS)
+    assets = [Asset('AAPL'), Asset('GOOG'), Asset('MSFT')]
+    assert list(table.reportingMask(['AAPL', 'GOOG', 'MSFT'], at(7, 15), at(7, 20))) == [False, False, True]
+    assert [asset.symbol for asset in table.excludeReporting(assets, at(7, 15), at(8, 1))] == ['GOOG']
+    assert table.excludeReporting([], at(7, 15), at(8, 1)) == []
+    assert len(EarningsTable.fromRows([]).excludeReporting(assets)) == 3
+
+
+def test_from_earnings_dates_matches_rows():
+    class EarningsDate(object):
+        def __init__(self, row):
+            self.__dict__.update(row)
+
+    table = EarningsTable.fromEarningsDates([EarningsDate(row) for row in ROWS])
+    rows = EarningsTable.fromRows(ROWS)
+    assert list(table.tickers) == list(rows.tickers)
+    assert list(table.start_times) == list(rows.start_times)
@@ -0,0 +1,146 @@
+import datetime
+
+import pytest
+
+from simulator.exchange import Exchange, ExchangeError
+from simulator.market import NY, MarketModel
+
+
+class Time(object):
+    '''Exchange clock the test moves by hand.'''
+
+    def __init__(self, moment):
+        self.epoch = moment.timestamp()
+
+    def now(self):
+        return self.epoch
+
+    def advance(self, seconds):
+        self.epoch += seconds
+
+
+def at(hour, minute=0, second=0, day=2):
+    return datetime.datetime(2019, 7, day, hour, minute, second, tzinfo=NY)
+
+
+@pytest.fixture
+def market():
+    return MarketModel(symbols=50, seed=3, inactive_fraction=0.0)
+
+
+def exchange(market, moment=None, **kwargs):
+    return Exchange(market, Time(moment or at(10)), cash=100000.0, **kwargs)
+
+
+def submit(exchange, side='buy', qty=10, type='market', time_in_force='day', symbol='AAB', **params):
+    params.update({'symbol': symbol, 'qty': qty, 'side': side, 'type': type, 'time_in_force': time_in_force})
+    return exchange.submitOrder(params)
+
+
+def test_market_order_fills_at_the_last_price(market):
+    broker = exchange(market)
+    price = broker.lastPrice('AAB')
+    order = submit(broker)
+    assert order['status'] == 'filled'
+    assert order['filled_qty'] == '10'
+    assert float(order['filled_avg_price']) == pytest.approx(price, abs=1e-4)
+    assert order['filled_at'] != None
+    position = broker.positionJson('AAB')
+    assert position['qty'] == '10'
+    assert broker.cash == pytest.approx(100000.0 - 10 * price, abs=1e-3)
+    assert broker.fills[-1]['order_id'] == order['id']
+
+
+def test_limit_order_waits_for_its_price_and_can_be_canceled(market):
+    broker = exchange(market)
+    limit = round(broker.lastPrice('AAB') * 0.5, 2)
+    order = submit(broker, type='limit', limit_price=limit)
+    assert order['status'] == 'new'
+    assert broker.buyingPower() == pytest.approx(100000.0 - 10 * limit)
+    broker.cancelOrder(order['id'])
+    assert broker.order(order['id'])['status'] == 'canceled'
+    assert broker.buyingPower() == 100000.0
+    with pytest.raises(ExchangeError) as error:
+        broker.cancelOrder(order['id'])
+    assert error.value.status == 422
+
+
+def test_orders_wait_for_the_open_and_day_orders_expire(market):
+    broker = exchange(market, at(8))
+    order = submit(broker)
+    assert broker.match() == 0
+    assert broker.order(order['id'])['status'] == 'new'
+    broker.clock.advance(2 * 3600)
+    assert broker.match() == 1
+    assert broker.order(order['id'])['status'] == 'filled'
+
+    resting = submit(broker, type='limit', limit_price=0.01)
+    broker.clock.epoch = at(16, 0, 1).timestamp()
+    broker.match()
+    assert broker.order(resting['id'])['status'] == 'expired'
+
+
+def test_partial_fills_average_their_prices(market):
+    broker = exchange(market, fill_ratio=0.3)
+    order = submit(broker, qty=10)
+    assert order['status'] == 'partially_filled' and order['filled_qty'] == '3'
+    first = broker.lastPrice('AAB')
+    broker.clock.advance(600)
+    second = broker.lastPrice('AAB')
+    broker.match()
+    order = broker.order(order['id'])
+    assert order['filled_qty'] == '6'
+    assert float(order['filled_avg_price']) == pytest.approx((first + second) / 2, abs=1e-4)
+    broker.match()
+    broker.match()
+    assert broker.order(order['id'])['status'] == 'filled'
+    assert sum(fill['qty'] for fill in broker.fills) == 10
+
+
+def test_sells_need_the_shares_and_close_the_position(market):
+    broker = exchange(market)
+    with pytest.raises(ExchangeError) as error:
+        submit(broker, side='sell')
+    assert error.value.status == 403
+    submit(broker, qty=5)
+    submit(broker, side='sell', qty=5)
+    assert broker.listPositions() == []
+    assert broker.cash == pytest.approx(100000.0, abs=1e-3)
+
+
+def test_rejects_bad_orders(market):
+    broker = exchange(market)
+    for params in ({'qty': 0}, {'side': 'hold'}, {'type': 'limit'}, {'symbol': 'NOPE'}, {'qty': 10 ** 9}):
+        with pytest.raises(ExchangeError):
+            submit(broker, **params)
+    submit(broker, client_order_id='mine')
+    with pytest.raises(ExchangeError):
+        submit(broker, client_order_id='mine')
+    assert broker.orderByClientId('mine')['status'] == 'filled'
+
+
+def test_list_orders_pages_by_submission_time(market):
+    broker = exchange(market)
+    for i in range(5):
+        submit(broker, qty=1)
+        broker.clock.advance(60)
+    assert len(broker.listOrders('all', limit=3)) == 3
+    newest = broker.listOrders('all')
+    assert [order['submitted_at'] for order in newest] == sorted((order['submitted_at'] for order in newest), reverse=True)
+    assert broker.listOrders('open') == []
+    assert len(broker.listOrders('closed')) == 5
+
+    oldest = broker.listOrders('all', limit=2, direction='asc')
+    page = broker.listOrders('all', limit=2, after=oldest[-1]['submitted_at'], direction='asc')
+    assert [order['id'] for order in page] == [order['id'] for order in newest[2::-1][:2]]
+
+
+def test_list_orders_compares_instants_not_strings(market):
+    broker = exchange(market, at(10, 0, 0))
+    first = submit(broker, qty=1)
+    broker.clock.advance(0.5)
+    second = submit(broker, qty=1)
+    # 10:00:00 New York with an offset and no fraction, and the same instant in UTC with a Z.
+    for after in ('2019-07-02T10:00:00-04:00', '2019-07-02T14:00:00Z', '2019-07-02T14:00:00.000000001Z'):
+        assert [order['id'] for order in broker.listOrders('all', after=after)] == [second['id']]
+    assert [order['id'] for order in broker.listOrders('all', until='2019-07-02T10:00:00.25-04:00')] == [first['id']]
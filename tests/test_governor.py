@@ -0,0 +1,124 @@
+import datetime
+
+from data.coalesce import CoalescingAPI
+from data.governor import ACTIVE, CLOSED, EDGE, HOLIDAY, OPEN, PollingGovernor, INTERVALS
+from data.replay import RecordingProxy, ReplaySession, SessionLog
+
+NY = datetime.timezone(datetime.timedelta(hours=-4))
+
+
+class CalendarDate(object):
+
+    def __init__(self, date, open='09:30', close='16:00'):
+        self.date = date
+        self.open = open
+        self.close = close
+
+
+CALENDAR = [
+    CalendarDate('2019-07-02'),
+    CalendarDate('2019-07-03', close='13:00'),
+    CalendarDate('2019-07-05'),
+    CalendarDate('2019-07-08'),
+]
+
+
+def at(day, hour, minute=0):
+    return datetime.datetime(2019, 7, day, hour, minute, tzinfo=NY)
+
+
+def test_market_state_through_a_session():
+    governor = PollingGovernor(CALENDAR)
+    assert governor.marketState(at(2, 8, 59)) == CLOSED
+    assert governor.marketState(at(2, 9)) == EDGE
+    assert governor.marketState(at(2, 9, 30)) == OPEN
+    assert governor.marketState(at(2, 15, 59)) == OPEN
+    assert governor.marketState(at(2, 16)) == EDGE
+    assert governor.marketState(at(2, 16, 15)) == CLOSED
+
+
+def test_early_close():
+    governor = PollingGovernor(CALENDAR)
+    assert governor.marketState(at(3, 12, 59)) == OPEN
+    assert governor.marketState(at(3, 13, 5)) == EDGE
+    # Still the day of the last close, so an ordinary evening.
+    assert governor.marketState(at(3, 20)) == CLOSED
+
+
+def test_holiday_and_weekend():
+    governor = PollingGovernor(CALENDAR)
+    assert governor.marketState(at(4, 12)) == HOLIDAY
+    assert governor.marketState(at(5, 9, 15)) == EDGE
+    assert governor.marketState(at(6, 12)) == HOLIDAY
+    assert governor.marketState(at(8, 9, 1)) == EDGE
+
+
+def test_without_a_calendar_the_clock_decides():
+    class Clock(object):
+        is_open = True
+    governor = PollingGovernor()
+    assert governor.marketState(at(4, 12), Clock()) == OPEN
+    assert governor.marketState(at(4, 12)) == CLOSED
+
+
+def test_interval_by_state():
+    governor = PollingGovernor(CALENDAR)
+    assert governor.interval('orders', at(2, 10), working_orders=2) == INTERVALS['orders'][ACTIVE]
+    assert governor.interval('orders', at(2, 10)) == INTERVALS['orders'][OPEN]
+    # Never sleeps through the warm-up before the next open.
+    assert governor.interval('positions', at(4, 12)) == INTERVALS['positions'][HOLIDAY]
+    assert governor.interval('positions', at(5, 8, 30)) == 1800.0
+
+
+def test_due_and_pause():
+    governor = PollingGovernor(CALENDAR)
+    now = at(2, 10).timestamp()
+    assert governor.due('orders', now)
+    governor.mark('orders', now)
+    assert not governor.due('orders', now + 14)
+    assert governor.due('orders', now + 15)
+    governor.pause(now + 60)
+    assert not governor.due('orders', now + 30)
+    assert governor.secondsUntilDue(now + 30) == 30
+
+
+class Response(object):
+
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class Session(object):
+
+    def __init__(self):
+        self.hooks = {}
+
+    def send(self, status, headers):
+        for hook in self.hooks.get('response', []):
+            hook(Response(status, headers))
+
+
+class REST(object):
+
+    def __init__(self):
+        self._session = Session()
+
+    def get_clock(self):
+        return None
+
+
+def test_watch_reads_rate_limits_through_wrappers(tmp_path):
+    rest = REST()
+    api = RecordingProxy(CoalescingAPI(rest), SessionLog(str(tmp_path / 'session.log')))
+    governor = PollingGovernor(CALENDAR)
+    assert governor.watch(api)
+    rest._session.send(200, {'X-RateLimit-Limit': '200', 'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': '4102444800'})
+    assert governor.rate_remaining == 5
+    assert governor.paused(at(2, 10))
+
+
+def test_watch_without_a_session(tmp_path):
+    (tmp_path / 'session.log').write_bytes(b'')
+    log = SessionLog(str(tmp_path / 'session.log'))
+    assert not PollingGovernor().watch(ReplaySession(log).proxy('api'))
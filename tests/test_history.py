@@ -0,0 +1,118 @@
+import datetime
+import glob
+import os
+
+from data.history import HistoryStore
+from data.risk import OPEN_STATUSES
+
+
+class Order(object):
+
+    def __init__(self, id, status, submitted_at, updated_at, symbol='AAPL', qty=10, filled_qty=0):
+        self.id = id
+        self.client_order_id = 'c-' + id
+        self.status = status
+        self.symbol = symbol
+        self.side = 'buy'
+        self._type = 'limit'
+        self.time_in_force = 'day'
+        self.qty = qty
+        self.filled_qty = filled_qty
+        self.limit_price = 10.0
+        self.stop_price = None
+        self.filled_avg_price = None
+        self.created_at = submitted_at
+        self.submitted_at = submitted_at
+        self.updated_at = updated_at
+        self.filled_at = None
+        self.canceled_at = None
+
+
+def fill(timestamp, order_id, symbol='AAPL', qty=1.0, price=10.0):
+    return (symbol, 'buy', qty, price, timestamp, order_id)
+
+
+def test_watermark_skips_rows_already_stored(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    fills = [fill('2019-06-04T14:00:00Z', 'a'), fill('2019-06-04T14:01:00Z', 'b')]
+    assert store.recordFills(fills) == 2
+    assert store.recordFills(fills) == 0
+    assert store.recordFills(fills + [fill('2019-06-04T14:02:00Z', 'c')]) == 1
+    assert len(store.query('fills')) == 3
+
+
+def test_rows_at_the_watermark_are_deduplicated_by_key(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.recordFills([fill('2019-06-04T14:00:00Z', 'a')])
+    # Same timestamp, different order: new.  Same timestamp and order: already stored.
+    assert store.recordFills([fill('2019-06-04T14:00:00Z', 'a'), fill('2019-06-04T14:00:00Z', 'b')]) == 1
+    assert store.recordFills([fill('2019-06-04T14:00:00Z', 'b')]) == 0
+    # The edge survives a reload from the index.
+    assert HistoryStore(str(tmp_path)).recordFills([fill('2019-06-04T14:00:00Z', 'a')]) == 0
+    assert sorted(store.query('fills')['order_id']) == ['a', 'b']
+
+
+def test_query_by_symbol_and_range(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.recordFills([
+        fill('2019-05-31T14:00:00Z', 'a', 'AAPL'),
+        fill('2019-06-04T14:00:00Z', 'b', 'MSFT'),
+        fill('2019-06-05T14:00:00Z', 'c', 'AAPL')])
+    table = store.query('fills', symbols=['AAPL'], start=datetime.date(2019, 6, 1))
+    assert list(table['order_id']) == ['c']
+    assert len(store.query('fills', end=datetime.date(2019, 6, 5))) == 2
+    assert sorted(os.listdir(os.path.join(str(tmp_path), 'fills'))) == ['2019-05', '2019-06']
+
+
+def test_orders_keep_their_latest_version(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.recordOrders([Order('1', 'new', '2019-06-04T14:00:00Z', '2019-06-04T14:00:00Z')])
+    store.recordOrders([Order('1', 'filled', '2019-06-04T14:00:00Z', '2019-06-04T14:05:00Z', filled_qty=10)])
+    table = store.query('orders')
+    assert list(table['status']) == ['filled']
+    assert len(store.query('orders', latest=False)) == 2
+
+
+def test_orders_after_follows_the_oldest_open_order(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    assert store.ordersAfter() == None
+    store.recordOrders([
+        Order('1', 'new', '2019-06-03T14:00:00Z', '2019-06-03T14:00:00Z'),
+        Order('2', 'filled', '2019-06-04T14:00:00Z', '2019-06-04T14:00:01Z')])
+    assert store.ordersAfter() == '2019-06-03T13:59:59Z'
+    store.recordOrders([Order('1', 'canceled', '2019-06-03T14:00:00Z', '2019-06-04T15:00:00Z')])
+    assert store.ordersAfter() == '2019-06-04T13:59:59Z'
+    # Kept in the index, not recomputed from the parts.
+    for path in glob.glob(os.path.join(str(tmp_path), 'orders', '*', '*.npz')):
+        os.remove(path)
+    assert HistoryStore(str(tmp_path)).ordersAfter() == '2019-06-04T13:59:59Z'
+
+
+def test_order_cursor_is_rebuilt_for_an_old_index(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.recordOrders([Order('1', 'accepted', '2019-06-03T14:00:00Z', '2019-06-03T14:00:00Z')])
+    del store.index['orders']['open']
+    del store.index['orders']['newest_submitted']
+    store._saveIndex()
+    assert HistoryStore(str(tmp_path)).ordersAfter() == '2019-06-03T13:59:59Z'
+    assert 'accepted' in OPEN_STATUSES
+
+
+def test_append_compacts_a_month_with_too_many_parts(tmp_path):
+    store = HistoryStore(str(tmp_path), compact_parts=3)
+    for minute in range(4):
+        store.recordFills([fill('2019-06-04T14:0{}:00Z'.format(minute), str(minute))])
+    parts = glob.glob(os.path.join(str(tmp_path), 'fills', '2019-06', 'part-*.npz'))
+    assert [os.path.basename(path) for path in parts] == ['part-00000.npz']
+    assert store.index['fills']['partitions']['2019-06']['parts'] == 1
+    assert list(store.query('fills')['order_id']) == ['0', '1', '2', '3']
+    assert len(store) == 4
+
+
+def test_compact_drops_superseded_orders(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.recordOrders([Order('1', 'new', '2019-06-04T14:00:00Z', '2019-06-04T14:00:00Z')])
+    store.recordOrders([Order('1', 'filled', '2019-06-04T14:00:00Z', '2019-06-04T14:05:00Z')])
+    store.compact('orders')
+    assert len(store.query('orders', latest=False)) == 1
+    assert list(store.query('orders')['status']) == ['filled']
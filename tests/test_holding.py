@@ -0,0 +1,84 @@
+import collections
+import datetime
+
+from data.holding import HoldingTracker
+
+DAY = 86400 * 1000000000
+Position = collections.namedtuple('Position', 'symbol qty side avg_entry_price')
+
+
+class Order(object):
+
+    def __init__(self, id, status, filled_qty, filled_avg_price=10.0, filled_at='2019-06-04T14:00:00Z', side='buy'):
+        self.id = id
+        self.symbol = 'AAPL'
+        self.side = side
+        self.status = status
+        self.filled_qty = filled_qty
+        self.filled_avg_price = filled_avg_price
+        self.filled_at = filled_at
+        self.updated_at = filled_at
+        self.submitted_at = filled_at
+
+
+def lots(tracker, symbol='AAPL'):
+    return [(lot.qty, lot.opened_at) for lot in tracker.lots.get(symbol, ())]
+
+
+def test_reconcile_shortfall_closes_the_oldest_lots_first():
+    tracker = HoldingTracker()
+    tracker.applyFill('AAPL', 'buy', 10, 10.0, 1 * DAY)
+    tracker.applyFill('AAPL', 'buy', 10, 11.0, 2 * DAY)
+    tracker.reconcile([Position('AAPL', '15', 'long', '10.5')], now=3 * DAY)
+    assert lots(tracker) == [(5.0, 1 * DAY), (10.0, 2 * DAY)]
+    # A surplus goes onto the newest lot.
+    tracker.reconcile([Position('AAPL', '18', 'long', '10.5')], now=3 * DAY)
+    assert lots(tracker) == [(5.0, 1 * DAY), (13.0, 2 * DAY)]
+
+
+def test_reconcile_past_every_lot_reopens_now():
+    tracker = HoldingTracker()
+    tracker.applyFill('AAPL', 'buy', 10, 10.0, 1 * DAY)
+    tracker.reconcile([Position('AAPL', '5', 'short', '10.0')], now=3 * DAY)
+    assert lots(tracker) == [(-5.0, 3 * DAY)]
+    assert tracker.openedAt('AAPL') == 3 * DAY
+    tracker.reconcile([], now=4 * DAY)
+    assert 'AAPL' not in tracker
+
+
+def test_partial_fills_are_applied_once():
+    tracker = HoldingTracker()
+    assert tracker.onOrders([Order('1', 'partially_filled', '4')]) == 1
+    assert tracker.onOrders([Order('1', 'partially_filled', '4')]) == 0
+    assert tracker.onOrders([Order('1', 'filled', '10', 11.0)]) == 1
+    assert tracker.qty('AAPL') == 10
+    # Priced from the change in filled notional.
+    assert tracker.lots['AAPL'][-1].price == (110.0 - 40.0) / 6
+
+
+def test_finished_orders_are_forgotten_once_off_the_list():
+    tracker = HoldingTracker()
+    tracker.onOrders([Order('1', 'filled', '10'), Order('2', 'new', '0')])
+    assert '1' in tracker.seen and '1' in tracker.done
+    tracker.onOrders([Order('1', 'filled', '10')])
+    assert '1' in tracker.seen
+    tracker.onOrders([Order('2', 'new', '0')])
+    assert tracker.seen == {} and tracker.done == set()
+
+
+def test_fill_history_is_bounded_and_released():
+    tracker = HoldingTracker(keep_fills=3)
+    assert not tracker.hasFillHistory()
+    for i in range(5):
+        tracker.applyFill('AAPL', 'buy', 1, 10.0, i * DAY, str(i))
+    assert [fill[-1] for fill in tracker.fills] == ['2', '3', '4']
+    tracker.releaseFills(2)
+    assert [fill[-1] for fill in tracker.fills] == ['4']
+    assert tracker.hasFillHistory()
+
+
+def test_age_counts_calendar_days_without_sessions():
+    tracker = HoldingTracker()
+    opened = datetime.datetime(2019, 6, 3, 14, tzinfo=datetime.timezone.utc)
+    tracker.applyFill('AAPL', 'buy', 1, 10.0, int(opened.timestamp()) * 1000000000)
+    assert tracker.age('AAPL', datetime.date(2019, 6, 5)) == 2
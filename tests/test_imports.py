@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded(statement):
+    '''Heavy modules present after `statement` in a fresh interpreter.'''
+    code = '{}\nimport sys\nprint(" ".join(m for m in ("numpy", "pandas", "requests") if m in sys.modules))'.format(statement)
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, stdout=subprocess.PIPE, check=True)
+    return result.stdout.decode().split()
+
+
+@pytest.mark.parametrize('statement', [
+    'from data import Data',
+    'import data.data',
+    'from data import Clock, HoldingTracker, RiskEngine, PositionBook',
+])
+def test_startup_imports_stay_light(statement):
+    assert loaded(statement) == []
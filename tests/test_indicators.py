@@ -0,0 +1,96 @@
+import collections
+import datetime
+
+import numpy
+import pandas
+import pytest
+
+from data.indicators import EMA, IndicatorBook, RollingSMA, RollingVariance, VWAP, barTime
+
+Bar = collections.namedtuple('Bar', 'timestamp high low close volume')
+
+
+def bar(timestamp, close, volume=100):
+    return Bar(timestamp, close + 1, close - 1, close, volume)
+
+
+def fed(values, cls, **kwargs):
+    indicator = cls(**kwargs)
+    for value in values:
+        indicator.update(value)
+    return indicator
+
+
+def test_rolling_values_match_a_direct_computation():
+    values = numpy.random.RandomState(7).normal(10.0, 2.0, 60)
+    sma = fed(values, RollingSMA, window=45, resync=7)
+    assert sma.value() == pytest.approx(values[-45:].mean())
+    variance = fed(values, RollingVariance, window=20)
+    assert variance.value() == pytest.approx(values[-20:].var(ddof=1))
+    ema = fed(values, EMA, span=12)
+    expected = values[0]
+    for value in values[1:]:
+        expected += 2.0 / 13 * (value - expected)
+    assert ema.value() == pytest.approx(expected)
+
+
+def test_vwap_resets_each_session():
+    vwap = VWAP()
+    vwap.updateBar(bar(1, 10.0))
+    vwap.updateBar(bar(2, 13.0, volume=200))
+    assert vwap.value() == pytest.approx((10.0 * 100 + 13.0 * 200) / 300)
+    vwap.updateBar(bar(VWAP.DAY + 1, 20.0))
+    assert vwap.value() == 20.0
+
+
+def test_book_ignores_old_bars_and_survives_a_reload(tmp_path):
+    book = IndicatorBook()
+    assert book.updateMany('AAPL', [bar(1, 10.0), bar(2, 11.0), bar(3, 12.0)]) == 3
+    assert book.updateMany('AAPL', [bar(1, 10.0), bar(2, 11.0), bar(4, 13.0)]) == 1
+    path = str(tmp_path / 'indicators.pickle')
+    book.save(path)
+    loaded = IndicatorBook.load(path)
+    assert loaded.value('AAPL', 'sma_3') == pytest.approx(12.0)
+    assert loaded.lastTimestamp('AAPL') == 4
+    assert len(IndicatorBook.load(str(tmp_path / 'missing.pickle'))) == 0
+
+
+def test_bar_time():
+    moment = datetime.datetime(2019, 6, 4, 14, tzinfo=datetime.timezone.utc)
+    expected = 1559656800 * 1000000000
+    assert barTime(bar(5, 1.0)) == 5
+    assert barTime(bar(moment, 1.0)) == expected
+    assert barTime(pandas.Timestamp(moment)) == expected
+
+
+@pytest.mark.parametrize('cls, kwargs', [(RollingSMA, {'window': 3}), (EMA, {'span': 3}), (RollingVariance, {'window': 3})])
+def test_replace_matches_feeding_the_revised_value(cls, kwargs):
+    indicator = fed([1.0, 2.0, 3.0, 4.0], cls, **kwargs)
+    indicator.replace(10.0)
+    assert indicator.value() == pytest.approx(fed([1.0, 2.0, 3.0, 10.0], cls, **kwargs).value())
+
+
+def test_replace_first_ema_value():
+    indicator = fed([5.0], EMA, span=3)
+    assert indicator.replace(7.0) == 7.0
+
+
+def test_vwap_replace_bar():
+    vwap = VWAP()
+    vwap.updateBar(bar(1, 10.0))
+    vwap.updateBar(bar(2, 11.0, volume=50))
+    vwap.replaceBar(bar(2, 20.0, volume=300))
+    expected = VWAP()
+    expected.updateBar(bar(1, 10.0))
+    expected.updateBar(bar(2, 20.0, volume=300))
+    assert vwap.value() == pytest.approx(expected.value())
+
+
+def test_same_timestamp_replaces_the_last_bar_and_older_bars_are_ignored():
+    book = IndicatorBook()
+    assert book.updateMany('AAPL', [bar(1, 10.0), bar(2, 11.0), bar(3, 12.0)]) == 3
+    # The intraday partial bar for 3 gives way to the final close.
+    assert not book.update('AAPL', bar(3, 15.0))
+    assert not book.update('AAPL', bar(2, 99.0))
+    assert book.value('AAPL', 'sma_3') == pytest.approx((10.0 + 11.0 + 15.0) / 3)
+    assert book.lastTimestamp('AAPL') == 3
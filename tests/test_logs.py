@@ -0,0 +1,93 @@
+import io
+import logging
+import logging.handlers
+
+import pytest
+
+from data.logs import ThrottledLogger, parseLevels, setupLogging, stopLogging
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        super(Records, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def root():
+    '''setupLogging replaces the root handlers; put pytest's back afterwards.'''
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    yield root
+    stopLogging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    for name in ('test_logs.quiet', 'test_logs.loud'):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+def test_parse_levels():
+    assert parseLevels('data.filter=debug, algos=WARNING,,bad') == {'data.filter': 'DEBUG', 'algos': 'WARNING'}
+    assert parseLevels(None) == {}
+
+
+def test_records_go_through_the_queue(root):
+    stream = io.StringIO()
+    listener = setupLogging('INFO', {'test_logs.quiet': 'WARNING', 'test_logs.loud': 'DEBUG'}, stream=stream)
+    assert [type(handler) for handler in root.handlers] == [logging.handlers.QueueHandler]
+    # A second call only updates levels.
+    assert setupLogging('INFO', {}) is listener
+    logging.getLogger('test_logs.quiet').info('dropped')
+    logging.getLogger('test_logs.quiet').warning('kept %s', 1)
+    logging.getLogger('test_logs.loud').debug('detail', extra={'fields': {'symbol': 'AAPL', 'qty': 5}})
+    stopLogging()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert 'level=WARNING logger=test_logs.quiet msg="kept 1"' in lines[0]
+    assert lines[1].endswith('msg="detail" symbol=AAPL qty=5')
+
+
+def throttled(**kwargs):
+    logger = logging.getLogger('test_logs.throttled')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    records = Records()
+    logger.handlers = [records]
+    return ThrottledLogger(logger, **kwargs), records
+
+
+def test_throttled_logger_rate_limits_and_counts_suppressed():
+    log, records = throttled(rate=0.0, burst=2)
+    for i in range(5):
+        log.info('tick %s', i)
+    assert [record.getMessage() for record in records.records] == ['tick 0', 'tick 1']
+    assert log.suppressed == 3
+    log.tokens = 1
+    log.info('tick %s', 5)
+    assert records.records[-1].getMessage() == 'tick 5'
+    assert records.records[-1].fields == {'suppressed': 3}
+    assert log.suppressed == 0
+
+
+def test_throttled_logger_samples():
+    log, records = throttled(burst=100, sample=3)
+    for i in range(7):
+        log.info('tick %s', i)
+    assert [record.getMessage() for record in records.records] == ['tick 2', 'tick 5']
+    assert records.records[1].fields == {'suppressed': 2}
+
+
+def test_disabled_level_costs_nothing():
+    log, records = throttled()
+    for i in range(5):
+        log.debug('tick %s', i)
+    assert records.records == []
+    assert log.calls == 0
@@ -0,0 +1,96 @@
+import datetime
+
+import numpy
+
+from data.minute_bars import BAR_DTYPE, MinuteBarArchive
+
+UTC = datetime.timezone.utc
+MINUTE_NS = 60 * 1000000000
+
+
+def at(day, hour, minute):
+    return datetime.datetime(2019, 7, day, hour, minute, tzinfo=UTC)
+
+
+def bars(*times):
+    records = numpy.zeros(len(times), dtype=BAR_DTYPE)
+    records['timestamp'] = [int(t.timestamp()) * 1000000000 for t in times]
+    records['close'] = numpy.arange(len(times)) + 10.0
+    return records
+
+
+# Two bars either side of the UTC day boundary between July 2 and July 3.
+SPANNING = (at(2, 23, 58), at(2, 23, 59), at(3, 0, 0), at(3, 0, 1))
+
+
+def test_range_across_a_day_boundary(tmp_path):
+    archive = MinuteBarArchive(str(tmp_path))
+    assert archive.append('AAPL', bars(*SPANNING)) == 4
+    window = archive.bars('AAPL', at(2, 23, 59), at(3, 0, 1))
+    assert list(window['close']) == [11.0, 12.0]
+    assert len(archive.bars('AAPL', datetime.date(2019, 7, 3))) == 2
+    assert len(archive.bars('AAPL', end=datetime.date(2019, 7, 3))) == 2
+    assert len(archive.bars('AAPL', at(2, 0, 0), at(4, 0, 0))) == 4
+    assert len(archive.bars('AAPL', at(4, 0, 0))) == 0
+    assert list(archive.lookback('AAPL', minutes=3)['close']) == [11.0, 12.0, 13.0]
+
+
+def test_appends_extend_the_last_day_and_survive_reopening(tmp_path):
+    archive = MinuteBarArchive(str(tmp_path))
+    archive.append('AAPL', bars(*SPANNING[:3]))
+    # Overlapping bars are skipped; the new one joins July 3 in the index.
+    assert archive.append('AAPL', bars(*SPANNING[1:])) == 1
+    reopened = MinuteBarArchive(str(tmp_path))
+    assert reopened.symbols() == ['AAPL']
+    assert len(reopened.bars('AAPL', datetime.date(2019, 7, 3))) == 2
+    assert reopened.lastTimestamp('AAPL') == int(SPANNING[-1].timestamp()) * 1000000000
+
+
+def test_torn_append_is_dropped(tmp_path):
+    archive = MinuteBarArchive(str(tmp_path))
+    archive.append('AAPL', bars(*SPANNING[:2]))
+    with open(archive._dataPath('AAPL'), 'ab') as f:
+        f.write(b'\x00' * (BAR_DTYPE.itemsize - 3))
+    assert len(MinuteBarArchive(str(tmp_path)).bars('AAPL')) == 2
+
+
+class Polygon(object):
+
+    def __init__(self, times):
+        self.times = times
+        self.requests = []
+
+    def get(self, path, params):
+        self.requests.append((path, params))
+        return {'ticks': [
+            {'t': int(t.timestamp()) * 1000, 'o': 1, 'h': 1, 'l': 1, 'c': 1, 'v': 100}
+            for t in self.times]}
+
+
+class API(object):
+
+    def __init__(self, times):
+        self.polygon = Polygon(times)
+
+
+def test_fill_skips_bars_already_stored(tmp_path):
+    archive = MinuteBarArchive(str(tmp_path))
+    api = API(SPANNING[:3])
+    assert archive.fill(api, 'AAPL', start=datetime.date(2019, 7, 1), end=datetime.date(2019, 7, 3)) == 3
+    assert api.polygon.requests[0][1]['from'] == '2019-07-01'
+    api.polygon.times = SPANNING
+    assert archive.fill(api, 'AAPL', end=datetime.date(2019, 7, 3)) == 1
+    # Resumes from the day of the last stored bar, not the requested start.
+    assert api.polygon.requests[1][1]['from'] == '2019-07-03'
+    assert archive.fill(api, 'AAPL', end=datetime.date(2019, 7, 3)) == 0
+    assert len(archive.bars('AAPL')) == 4
+
+
+def test_fill_logs_failures(tmp_path):
+    class Failing(object):
+        def get(self, path, params):
+            raise IOError('503')
+
+    api = API(())
+    api.polygon = Failing()
+    assert MinuteBarArchive(str(tmp_path)).fill(api, 'AAPL', end=datetime.date(2019, 7, 3)) == 0
@@ -0,0 +1,111 @@
+import datetime
+import threading
+
+import pytest
+
+from algos.pipeline import Pipeline, PreOpenScreen, Stage
+from data.data import Data
+from data.replay import VirtualClock
+from simulator.client import LocalAPI
+from simulator.exchange import Exchange
+from simulator.market import NY, EarningsCalendar, MarketModel
+
+START = datetime.datetime(2019, 7, 2, 9, 15, tzinfo=NY)
+
+
+def run(pipeline, source, timeout=10):
+    '''Runs the pipeline on a thread so a shutdown that never comes fails the test instead of hanging it.'''
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(results=pipeline.run(source)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'pipeline did not shut down'
+    return outcome['results']
+
+
+def test_every_item_comes_out_with_many_workers_and_small_queues():
+    stages = [
+        Stage('double', lambda item: [item, item], workers=3, queue_size=2),
+        Stage('square', lambda item: [item * item], workers=4, queue_size=1),
+        Stage('keep', lambda item: [item], workers=2, queue_size=1),
+    ]
+    results = run(Pipeline(stages), range(200))
+    assert sorted(results) == sorted([item * item for item in range(200)] * 2)
+    assert [stage.processed for stage in stages] == [200, 400, 400]
+    assert stages[0].emitted == 400
+
+
+def test_errors_are_counted_and_the_rest_flows():
+    def check(item):
+        if(item % 3 == 0):
+            raise ValueError(item)
+        return [item]
+    stages = [Stage('check', check, workers=2), Stage('none', lambda item: None, workers=2)]
+    assert run(Pipeline(stages), range(30)) == []
+    assert stages[0].errors == 10
+    assert stages[0].emitted == 20
+    assert stages[1].processed == 20
+
+
+def test_a_failing_source_still_shuts_down():
+    def source():
+        yield 1
+        yield 2
+        raise RuntimeError('page 3 failed')
+    stage = Stage('pass', lambda item: [item], workers=3)
+    assert sorted(run(Pipeline([stage]), source())) == [1, 2]
+
+
+def test_empty_source():
+    pipeline = Pipeline([Stage('a', lambda item: [item], workers=2), Stage('b', lambda item: [item], workers=5)])
+    assert run(pipeline, []) == []
+    assert pipeline.elapsed != None
+
+
+class ExchangeTime(object):
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def now(self):
+        return self.clock.time()
+
+
+class Screen(PreOpenScreen):
+    '''Passes every priced asset, so the tests do not depend on the SMA history.'''
+
+    def sma(self, asset):
+        return [asset]
+
+
+@pytest.fixture
+def data():
+    clock = VirtualClock(int(START.timestamp()) * 1000000000)
+    clock.install()
+    market = MarketModel(symbols=120, seed=5, inactive_fraction=0.0)
+    try:
+        yield Data(LocalAPI(Exchange(market, ExchangeTime(clock))), EarningsCalendar(market, fraction=0.2))
+    finally:
+        clock.uninstall()
+
+
+def test_the_screen_pages_todays_sources_not_the_startup_lists(data, monkeypatch):
+    polygon_symbols = data.polygon_symbols
+    pages = []
+    get = data.api.polygon.get
+    monkeypatch.setattr(data.api.polygon, 'get', lambda *args, **kwargs: pages.append(kwargs) or get(*args, **kwargs))
+    data.assets, data.polygon_symbols, data.earnings = [], [], []
+    result = Screen.fromData(data).run(0.0, 1000.0)
+    assert len([page for page in pages if page.get('path') == '/meta/symbols']) == len(polygon_symbols) // 50 + 1
+    assert [symbol.symbol for symbol in result.polygon_symbols] == [symbol.symbol for symbol in polygon_symbols]
+    assert len(result.assets) > len(result.candidates) > 0
+    assert result.earnings
+
+
+def test_exclude_reporting_drops_symbols_with_earnings(data):
+    kept = Screen.fromData(data).run(0.0, 1000.0)
+    reporting = set(ed.ticker for ed in kept.earnings)
+    assert reporting & set(asset.symbol for asset in kept.candidates)
+    screened = Screen.fromData(data).run(0.0, 1000.0, exclude_reporting=True)
+    assert [asset.symbol for asset in screened.candidates] == [
+        asset.symbol for asset in kept.candidates if asset.symbol not in reporting]
@@ -0,0 +1,24 @@
+from data.positions import PositionBook
+
+
+def test_fills_update_exposure_and_realized_pl():
+    book = PositionBook()
+    book.applyFill('AAPL', 'buy', 10, 100.0)
+    book.applyFill('AAPL', 'buy', 10, 110.0)
+    assert book.get('AAPL').avg_entry_price == 105.0
+    assert book.applyFill('AAPL', 'sell', 5, 115.0) == 50.0
+    assert book.net_exposure == 15 * 115.0
+    book.applyFill('AAPL', 'sell', 20, 120.0)
+    assert book.get('AAPL').qty == -5
+    assert book.get('AAPL').avg_entry_price == 120.0
+
+
+def test_zero_fill_is_a_no_op():
+    book = PositionBook()
+    assert book.applyFill('AAPL', 'buy', 0, 100.0) == 0.0
+    assert 'AAPL' not in book
+    book.applyFill('AAPL', 'buy', 10, 100.0)
+    assert book.applyFill('AAPL', 'sell', '0', 90.0) == 0.0
+    position = book.get('AAPL')
+    assert (position.qty, position.avg_entry_price, position.current_price) == (10, 100.0, 100.0)
+    assert book.gross_exposure == 1000.0
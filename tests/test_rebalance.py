@@ -0,0 +1,97 @@
+import numpy
+
+from algos.rebalance import Rebalancer, clientOrderId, weightsFromSignals
+from data.tracing import OrderTracer
+
+
+def planned(plan):
+    return {order.symbol: (order.side, order.qty, order.limit_price) for order in plan}
+
+
+def test_whole_shares_and_limit_prices():
+    plan = Rebalancer().plan(['A', 'B'], [.5, .5], [10.0, 3.0], equity=1000)
+    assert planned(plan) == {'A': ('buy', 50, 9.9), 'B': ('buy', 166, 2.97)}
+
+
+def test_lot_size_rounds_down():
+    plan = Rebalancer(lot_size=10).plan(['A', 'B'], [.5, .5], [10.0, 3.0], equity=1000)
+    assert planned(plan) == {'A': ('buy', 50, 9.9), 'B': ('buy', 160, 2.97)}
+
+
+def test_buys_are_scaled_to_buying_power():
+    plan = Rebalancer().plan(['A', 'B'], [.5, .5], [10.0, 3.0], equity=1000, buying_power=500)
+    assert planned(plan) == {'A': ('buy', 25, 9.9), 'B': ('buy', 84, 2.97)}
+    assert plan.buyNotional() <= 500
+
+
+def test_scaled_buys_keep_whole_lots():
+    plan = Rebalancer(lot_size=10).plan(['A', 'B'], [.5, .5], [10.0, 3.0], equity=1000, buying_power=500)
+    assert [qty % 10 for qty in plan.qty] == [0, 0]
+    assert plan.buyNotional() <= 500
+
+
+def test_cash_buffer_holds_back_buying_power():
+    plan = Rebalancer(cash_buffer=.5).plan(['A'], [1.0], [10.0], equity=1000, buying_power=1000)
+    assert planned(plan) == {'A': ('buy', 50, 9.9)}
+
+
+def test_sells_come_first_and_never_exceed_holdings():
+    plan = Rebalancer().plan(
+        ['A', 'B', 'C'], [0.0, .5, -.5], [10.0, 3.0, 5.0], current_qty=[20, 0, 10], equity=1000)
+    assert list(plan.side) == ['sell', 'sell', 'buy']
+    assert planned(plan) == {'A': ('sell', 20, 10.1), 'C': ('sell', 10, 5.05), 'B': ('buy', 166, 2.97)}
+    assert list(plan.target_qty) == [0, 0, 166]
+
+
+def test_unpriced_symbols_are_left_alone():
+    plan = Rebalancer().plan(['A', 'B'], [.5, .5], [numpy.nan, 3.0], current_qty=[5, 0], equity=1000)
+    assert list(plan.symbol) == ['B']
+
+
+def test_weights_from_signals():
+    assert list(weightsFromSignals([1.0, -1.0, 3.0])) == [.25, 0.0, .75]
+    assert list(weightsFromSignals([0.0, 0.0])) == [0.0, 0.0]
+
+
+class Submitted(object):
+
+    def __init__(self, id, symbol, client_order_id):
+        self.id = id
+        self.symbol = symbol
+        self.client_order_id = client_order_id
+        self.status = 'accepted'
+        self.filled_qty = '0'
+
+
+class FakeAPI(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def submit_order(self, symbol, qty, side, type, time_in_force, limit_price=None, client_order_id=None):
+        self.calls.append(client_order_id)
+        if(symbol == 'BAD'):
+            raise ValueError('rejected')
+        return Submitted('order-{}'.format(len(self.calls)), symbol, client_order_id)
+
+
+def test_batch_submission_is_not_repeated():
+    plan = Rebalancer().plan(['A', 'B', 'BAD'], [.4, .4, .2], [10.0, 3.0, 5.0], equity=1000)
+    api = FakeAPI()
+    tracer = OrderTracer()
+    results = plan.submit(api, tracer=tracer, batch='trade_stocks:2019-06-04')
+    assert sorted(api.calls) == sorted(clientOrderId('trade_stocks:2019-06-04', symbol, 'buy') for symbol in 'A B BAD'.split())
+    assert [isinstance(result, Exception) for order, result in results] == [False, False, True]
+
+    # The same batch again: acknowledged orders are skipped; the rejected one is retried.
+    api.calls = []
+    results = plan.submit(api, tracer=tracer, batch='trade_stocks:2019-06-04')
+    assert api.calls == [clientOrderId('trade_stocks:2019-06-04', 'BAD', 'buy')]
+    assert len(results) == 1
+
+
+def test_client_order_id_is_stable_and_short():
+    first = clientOrderId('trade_stocks:2019-06-04', 'AAPL', 'buy')
+    assert first == clientOrderId('trade_stocks:2019-06-04', 'AAPL', 'buy')
+    assert first != clientOrderId('trade_stocks:2019-06-05', 'AAPL', 'buy')
+    assert len(first) <= 48
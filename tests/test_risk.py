@@ -0,0 +1,89 @@
+from data.risk import RiskEngine
+
+
+class Order(object):
+
+    def __init__(self, id, status, qty, filled_qty, filled_avg_price=None, side='buy'):
+        self.id = id
+        self.symbol = 'AAPL'
+        self.side = side
+        self.status = status
+        self.qty = qty
+        self.filled_qty = filled_qty
+        self.filled_avg_price = filled_avg_price
+
+
+def engine():
+    risk = RiskEngine()
+    risk.buying_power = 1000.0
+    risk.onOrderSubmitted('1', 'AAPL', 'buy', 10, 10.0)
+    return risk
+
+
+def test_polled_partial_fills_are_applied_once():
+    risk = engine()
+    assert risk.availableBuyingPower() == 900.0
+    risk.onOrders([Order('1', 'partially_filled', '10', '4', '9.5')])
+    risk.onOrders([Order('1', 'partially_filled', '10', '4', '9.5')])
+    assert risk.buying_power == 1000.0 - 4 * 9.5
+    assert risk.reservations['1'].qty == 6
+    assert risk.availableBuyingPower() == 1000.0 - 4 * 9.5 - 60.0
+
+
+def test_closed_order_releases_the_rest():
+    risk = engine()
+    risk.onOrders([Order('1', 'canceled', '10', '4', '9.5')])
+    assert '1' not in risk.reservations
+    assert risk.reserved == 0.0
+    assert risk.buying_power == 1000.0 - 4 * 9.5
+
+
+def test_orders_without_a_reservation_are_ignored():
+    risk = engine()
+    risk.onOrders([Order('2', 'filled', '10', '10', '9.5')])
+    assert risk.buying_power == 1000.0
+
+
+class Intended(object):
+
+    def __init__(self, symbol, side, qty, limit_price):
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.limit_price = limit_price
+
+
+def test_validate_spends_buying_power_in_order():
+    risk = engine()
+    decisions = risk.validate([
+        Intended('MSFT', 'buy', 50, 10.0), Intended('IBM', 'buy', 50, 10.0), Intended('GE', 'buy', 30, 10.0)])
+    assert [decision.approved for decision in decisions] == [True, False, True]
+    assert decisions[1].reason == 'insufficient buying power'
+
+
+def test_fills_spend_the_reservation():
+    risk = engine()
+    risk.onFill('1', 'AAPL', 'buy', 10, 10.0)
+    assert risk.reservations == {}
+    assert risk.reserved == 0.0
+    assert risk.buying_power == 900.0
+    risk.blocked = True
+    assert not risk.validate([Intended('MSFT', 'buy', 1, 1.0)])[0].approved
+
+
+def test_partial_sell_fills_count_one_day_trade():
+    risk = engine()
+    risk.onFill('1', 'AAPL', 'buy', 10, 10.0)
+    risk.onOrderSubmitted('2', 'AAPL', 'sell', 10, 11.0)
+    risk.onOrders([Order('2', 'partially_filled', '10', '4', '11.0', side='sell')])
+    risk.onOrders([Order('2', 'filled', '10', '10', '11.0', side='sell')])
+    assert risk.daytrade_count == 1
+
+
+def test_new_session_forgets_yesterdays_buys():
+    risk = engine()
+    risk.onFill('1', 'AAPL', 'buy', 10, 10.0)
+    risk.newSession()
+    assert risk.bought_today == set()
+    risk.onFill('2', 'AAPL', 'sell', 10, 11.0)
+    assert risk.daytrade_count == 0
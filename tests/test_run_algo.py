@@ -0,0 +1,86 @@
+import datetime
+import types
+
+import pytest
+
+from algos import run_algo
+from algos.algo1 import PennyAlgo
+from algos.supervisor import Checkpoint
+from data.data import Data
+from data.indicators import IndicatorBook
+from data.minute_bars import MinuteBarArchive
+from data.replay import VirtualClock
+from data.universe import UniverseStore
+from simulator.client import LocalAPI
+from simulator.exchange import Exchange
+from simulator.market import NY, EarningsCalendar, MarketModel
+
+START = datetime.datetime(2019, 7, 2, 9, 14, 30, tzinfo=NY)
+
+
+class Stop(Exception):
+    pass
+
+
+class ExchangeTime(object):
+    '''The exchange reads the same virtual clock as the worker.'''
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def now(self):
+        return self.clock.time()
+
+
+@pytest.fixture
+def world(tmp_path, monkeypatch):
+    clock = VirtualClock(int(START.timestamp()) * 1000000000)
+    clock.install()
+    market = MarketModel(symbols=40, seed=5)
+    api = LocalAPI(Exchange(market, ExchangeTime(clock)))
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if(len(sleeps) >= 120):
+            raise Stop()
+        clock.sleep(seconds)
+
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    monkeypatch.setattr(run_algo, '_api', api)
+    monkeypatch.setattr(run_algo, 'RECORD_PATH', None)
+    monkeypatch.setattr(run_algo, 'REPLAY_PATH', None)
+    monkeypatch.setattr(run_algo, 'YahooEarningsCalendar', lambda: EarningsCalendar(market, fraction=0.1))
+    monkeypatch.setattr(run_algo, 'time', types.SimpleNamespace(sleep=sleep))
+    for name, file_name in (
+        ('INDICATORS_PATH', 'indicators.pkl'), ('PHASE_STATS_PATH', 'phase_stats.json'),
+        ('CHECKPOINT_PATH', 'checkpoint.pkl'), ('HOLDINGS_PATH', 'holdings.pkl'),
+        ('UNIVERSE_DIR', 'universe'), ('HISTORY_DIR', 'history'), ('MINUTE_BARS_DIR', 'minute_bars')):
+        monkeypatch.setattr(run_algo, name, str(tmp_path / file_name))
+    try:
+        yield types.SimpleNamespace(clock=clock, api=api, sleeps=sleeps, path=tmp_path)
+    finally:
+        clock.uninstall()
+
+
+def test_main_runs_the_morning_against_the_simulator(world, caplog):
+    with pytest.raises(Stop):
+        run_algo.main()
+    # Through the pre-open screen and the first trade window without a failed loop.
+    assert datetime.datetime.fromtimestamp(world.clock.time(), NY) > START + datetime.timedelta(minutes=17)
+    assert not [record for record in caplog.records if record.getMessage().startswith('Exception')]
+    completed = Checkpoint.load(run_algo.CHECKPOINT_PATH).completedOn(START.date())
+    assert {'screen', 'trade+0h:prefetch', 'trade+0h'} <= completed
+    assert (world.path / 'holdings.pkl').exists()
+    assert (world.path / 'universe').exists()
+
+
+def test_screen_records_the_universe_it_ran_against(world):
+    data = Data(world.api, EarningsCalendar(world.api.exchange.market))
+    data.filter.indicators = IndicatorBook.load(run_algo.INDICATORS_PATH)
+    # Left over from start-up; the screen replaces them with today's lists.
+    data.assets, data.polygon_symbols = [], []
+    run_algo.screen(PennyAlgo(world.api, MinuteBarArchive(run_algo.MINUTE_BARS_DIR)), data)
+    universe = UniverseStore(run_algo.UNIVERSE_DIR).asOf(START.date())
+    assert len(universe) == len(data.assets) > 0
+    assert len(universe.polygon_symbols) == len(data.polygon_symbols) > 0
@@ -0,0 +1,111 @@
+import datetime
+import time
+
+from algos.scheduler import PhaseScheduler, PhaseStats
+
+NY = datetime.timezone(datetime.timedelta(hours=-4))
+
+
+class Clock(object):
+
+    def __init__(self, close=16):
+        self.next_open = datetime.datetime(2019, 7, 2, 9, 30, tzinfo=NY)
+        self.next_close = datetime.datetime(2019, 7, 2, close, 0, tzinfo=NY)
+
+
+def at(hour, minute=0, second=0):
+    return datetime.datetime(2019, 7, 2, hour, minute, second, tzinfo=NY)
+
+
+def names(windows):
+    return [window.name for window in windows]
+
+
+def test_windows_for_a_day():
+    scheduler = PhaseScheduler()
+    windows = scheduler.buildWindows(Clock(), at(8))
+    assert names(windows)[:4] == ['screen', 'trade+0h:prefetch', 'trade+0h', 'trade+1h:prefetch']
+    assert names(windows)[-2:] == ['update', 'close']
+    assert 'trade+6h' in names(windows)
+    by_name = {window.name: window.at for window in windows}
+    assert by_name['screen'] == at(9, 15)
+    assert by_name['trade+0h'] == at(9, 31)
+    # The default 30s prefetch estimate plus the 5s margin.
+    assert by_name['trade+0h:prefetch'] == at(9, 30, 25)
+
+
+def test_no_trade_windows_after_an_early_close():
+    windows = PhaseScheduler().buildWindows(Clock(close=13), at(8))
+    assert 'trade+3h' in names(windows) and 'trade+4h' not in names(windows)
+    assert windows[-1].at == at(13, 30)
+
+
+def test_prefetch_lead_follows_measured_durations():
+    scheduler = PhaseScheduler()
+    for seconds in (50, 55, 60):
+        scheduler.statsFor('prefetch').record(seconds)
+    by_name = {window.name: window.at for window in scheduler.buildWindows(Clock(), at(8))}
+    # The recent 80th percentile (55s) is above the weighted mean, plus the margin.
+    assert (by_name['trade+0h'] - by_name['trade+0h:prefetch']).total_seconds() == 55 + 5
+
+
+def test_due_in_order_through_the_day():
+    scheduler = PhaseScheduler()
+    assert scheduler.due(Clock(), at(9)) == []
+    assert names(scheduler.due(Clock(), at(9, 15))) == ['screen']
+    assert scheduler.due(Clock(), at(9, 16)) == []
+    assert names(scheduler.due(Clock(), at(9, 31))) == ['trade+0h:prefetch', 'trade+0h']
+    assert scheduler.nextWindow(at(9, 31)).name == 'trade+1h:prefetch'
+    assert scheduler.secondsUntilNext(at(10, 30)) == 25.0
+    assert scheduler.missed == []
+
+
+def test_missed_windows_are_reported_and_skipped():
+    scheduler = PhaseScheduler()
+    scheduler.due(Clock(), at(9, 15))
+    due = scheduler.due(Clock(), at(11, 30))
+    assert names(due) == []
+    assert names(scheduler.missed) == ['trade+0h:prefetch', 'trade+0h', 'trade+1h:prefetch', 'trade+1h']
+    # A window just inside the tolerance still runs.
+    assert names(scheduler.due(Clock(), at(11, 35, 20))) == ['trade+2h:prefetch', 'trade+2h']
+
+
+def test_a_late_start_is_not_a_miss_but_screens_first():
+    scheduler = PhaseScheduler()
+    due = scheduler.due(Clock(), at(11, 30))
+    assert names(due) == ['screen']
+    assert scheduler.missed == []
+
+
+def test_completed_windows_are_not_rerun():
+    scheduler = PhaseScheduler()
+    assert names(scheduler.due(Clock(), at(9, 31), completed={'screen', 'trade+0h:prefetch'})) == ['trade+0h']
+
+
+def test_no_windows_on_a_holiday():
+    scheduler = PhaseScheduler()
+    assert scheduler.due(Clock(), at(9, 31), trading_days={'2019-07-03'}) == []
+    assert scheduler.secondsUntilNext(at(9, 31)) == 30.0
+
+
+def test_overrun_is_reported(tmp_path):
+    scheduler = PhaseScheduler(str(tmp_path / 'stats.json'))
+    scheduler.due(Clock(), at(9, 31))
+    windows = {window.name: window for window in scheduler.windows}
+    assert scheduler.run(windows['trade+0h'], lambda: 'done', now=at(9, 31)) == 'done'
+    assert scheduler.overruns == []
+    # Finishing after the next window's start is an overrun.
+    started = windows['trade+1h:prefetch'].at - datetime.timedelta(seconds=0.01)
+    scheduler.run(windows['trade+0h'], lambda: time.sleep(0.05), now=started)
+    assert [(window.name, elapsed >= 0.05) for window, elapsed in scheduler.overruns] == [('trade+0h', True)]
+    assert len(PhaseScheduler(str(tmp_path / 'stats.json')).statsFor('trade_stocks').recent) == 2
+
+
+def test_phase_stats_estimate():
+    stats = PhaseStats(default=30.0)
+    assert stats.expected() == 30.0
+    for seconds in (10, 10, 10, 10, 40):
+        stats.record(seconds)
+    assert stats.expected() == max(stats.mean, 10)
+    stats.record(40)
+    assert stats.expected() == 40
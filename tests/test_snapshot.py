@@ -0,0 +1,82 @@
+from data.snapshot import SNAPSHOT_PATH, SnapshotTable
+
+
+def ticker(symbol, price, prev_close=None):
+    return {
+        'ticker': symbol,
+        'lastTrade': {'p': price, 't': 1562076000000000000},
+        'lastQuote': {'p': price - 0.01, 'P': price + 0.01},
+        'prevDay': {'c': prev_close},
+        'day': {'c': price},
+    }
+
+
+class Polygon(object):
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+        self.failing = set()
+
+    def get(self, path, params=None, version='v1'):
+        assert path == SNAPSHOT_PATH and version == 'v2'
+        self.requests.append(params)
+        symbols = params['tickers'].split(',') if params else sorted(self.prices)
+        if(self.failing.intersection(symbols) or (params == None and self.failing)):
+            raise IOError('502 Bad Gateway')
+        return {'tickers': [ticker(symbol, self.prices[symbol], 1.0) for symbol in symbols if symbol in self.prices]}
+
+
+class API(object):
+
+    def __init__(self, prices):
+        self.polygon = Polygon(prices)
+
+
+def test_full_refresh():
+    api = API({'AAPL': 200.0, 'MSFT': 135.5})
+    table = SnapshotTable(api)
+    assert table.isStale()
+    assert table.refresh() == 2
+    assert not table.isStale()
+    assert api.polygon.requests == [None]
+    assert table.lastPrice('AAPL') == 200.0
+    assert table.prevClose('MSFT') == 1.0
+    assert table.get('AAPL').bid_price == 199.99
+    assert 'MSFT' in table and len(table) == 2
+
+
+def test_partial_refresh_in_chunks():
+    api = API({'A': 1.0, 'B': 2.0, 'C': 3.0, 'D': 4.0, 'E': 5.0})
+    table = SnapshotTable(api, chunk_size=2)
+    assert table.refresh(['A', 'B', 'C', 'X', 'E']) == 4
+    assert api.polygon.requests == [{'tickers': 'A,B'}, {'tickers': 'C,X'}, {'tickers': 'E'}]
+    assert 'D' not in table
+    assert table.prices(['A', 'C', 'D', 'X']) == {'A': 1.0, 'C': 3.0}
+    assert table.prices(['A', 'B'], field='prev_close') == {'A': 1.0, 'B': 1.0}
+
+
+def test_a_failed_chunk_keeps_the_rest():
+    api = API({'A': 1.0, 'B': 2.0, 'C': 3.0})
+    table = SnapshotTable(api, chunk_size=1)
+    table.refresh()
+    api.polygon.prices = {'A': 1.5, 'B': 2.5, 'C': 3.5}
+    api.polygon.failing = {'B'}
+    assert table.refresh(['A', 'B', 'C']) == 2
+    # The failed chunk keeps its previous snapshot.
+    assert table.prices(['A', 'B', 'C']) == {'A': 1.5, 'B': 2.0, 'C': 3.5}
+
+
+def test_a_failed_full_refresh_is_still_marked_fetched():
+    api = API({'A': 1.0})
+    api.polygon.failing = {'A'}
+    table = SnapshotTable(api, max_age=60)
+    assert table.refresh() == 0
+    # Not stale, so callers fall back to per-symbol requests instead of retrying at once.
+    assert not table.isStale()
+    assert table.lastPrice('A') == None
+    table.ensureFresh()
+    assert len(api.polygon.requests) == 1
+    assert table.isStale(max_age=-1)
+    table.ensureFresh(max_age=-1)
+    assert len(api.polygon.requests) == 2
@@ -0,0 +1,88 @@
+import collections
+import datetime
+import threading
+
+import pytest
+
+from algos.supervisor import Checkpoint, PhaseFailed, RetryPolicy, Supervisor
+
+Window = collections.namedtuple('Window', 'name phase')
+NOW = datetime.datetime(2019, 6, 4, 10, 0)
+
+
+class Scheduler(object):
+
+    def run(self, window, function, now):
+        return function()
+
+
+def supervisor(slept=None, **policies):
+    sleep = slept.append if slept != None else (lambda seconds: None)
+    return Supervisor(Scheduler(), Checkpoint(), policies=policies, sleep=sleep)
+
+
+def test_errors_are_retried_with_backoff():
+    slept = []
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if(len(calls) < 3):
+            raise ValueError('flaky')
+        return 'done'
+    runner = supervisor(slept, prefetch=RetryPolicy(attempts=3, initial=2.0))
+    assert runner.run(Window('prefetch', 'prefetch'), flaky, NOW) == 'done'
+    assert slept == [2.0, 4.0]
+    assert runner.checkpoint.completedOn(NOW.date()) == {'prefetch'}
+
+
+def test_exhausted_attempts_are_not_checkpointed():
+    def broken():
+        raise ValueError('broken')
+    runner = supervisor(prefetch=RetryPolicy(attempts=2))
+    with pytest.raises(PhaseFailed):
+        runner.run(Window('prefetch', 'prefetch'), broken, NOW)
+    assert runner.checkpoint.completedOn(NOW.date()) == set()
+
+
+def test_a_timed_out_order_phase_is_not_retried_while_it_runs():
+    release = threading.Event()
+    calls = []
+
+    def trade():
+        calls.append(1)
+        release.wait(5)
+    runner = supervisor(trade_stocks=RetryPolicy(attempts=2, timeout=0.05, retry_timeout=False))
+    window = Window('trade', 'trade_stocks')
+    with pytest.raises(PhaseFailed):
+        runner.run(window, trade, NOW)
+    assert len(calls) == 1
+    # The next window is skipped while the abandoned attempt is still running.
+    with pytest.raises(PhaseFailed, match='still running'):
+        runner.run(window, trade, NOW)
+    assert len(calls) == 1
+    release.set()
+    runner.abandoned['trade_stocks'].join(5)
+    assert runner.run(window, lambda: 'ok', NOW) == 'ok'
+    assert runner.abandoned == {}
+
+
+def test_a_timed_out_phase_is_retried_after_its_thread_finishes():
+    calls = []
+
+    def slow():
+        calls.append(threading.current_thread())
+        if(len(calls) == 1):
+            threading.Event().wait(0.2)
+        return 'done'
+    runner = supervisor(prefetch=RetryPolicy(attempts=2, timeout=0.1))
+    assert runner.run(Window('prefetch', 'prefetch'), slow, NOW) == 'done'
+    assert len(calls) == 2
+    assert not calls[0].is_alive()
+
+
+def test_loop_backoff():
+    runner = supervisor()
+    assert [runner.loopFailed() for _ in range(3)] == [1.0, 2.0, 4.0]
+    runner.loopSucceeded()
+    assert runner.loopFailed() == 1.0
@@ -0,0 +1,96 @@
+import pytest
+
+from data.tracing import OrderTracer
+
+SECOND = 1000000000
+# The local clock reads 0 at this wall time.
+EPOCH = 1559656800 * SECOND  # 2019-06-04T14:00:00Z
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def wall(self):
+        return EPOCH + self.now
+
+
+class Order(object):
+
+    def __init__(self, id, client_order_id, status, filled_qty='0', filled_at=None):
+        self.id = id
+        self.client_order_id = client_order_id
+        self.status = status
+        self.filled_qty = filled_qty
+        self.filled_avg_price = '10.1' if float(filled_qty) else None
+        self.submitted_at = '2019-06-04T14:00:01Z'
+        self.filled_at = filled_at
+
+
+def test_fill_is_timed_by_the_broker_and_observed_separately():
+    clock = Clock()
+    tracer = OrderTracer(clock, wall=clock.wall)
+    trace = tracer.decide('AAPL', 'buy', 10, 10.0, 'penny', 9.9)
+    clock.now = 1 * SECOND
+    tracer.submitting(trace)
+    clock.now = 2 * SECOND
+    tracer.submitted(trace, Order('o1', trace.client_order_id, 'accepted'))
+    # Filled at 5s, noticed by a poll at 30s.
+    clock.now = 30 * SECOND
+    assert tracer.onOrders([Order('o1', trace.client_order_id, 'filled', '10', '2019-06-04T14:00:05Z')]) == 1
+    assert trace.events['filled'] == 5 * SECOND
+    assert trace.events['observed'] == 30 * SECOND
+    assert trace.latency('ack', 'filled') == 3.0
+    assert trace.latency('filled', 'observed') == 25.0
+    assert tracer.report()['penny']['filled'] == 1
+    assert tracer.open == {}
+
+
+def test_a_broker_fill_ahead_of_the_local_clock_is_clamped():
+    clock = Clock()
+    tracer = OrderTracer(clock, wall=clock.wall)
+    trace = tracer.decide('AAPL', 'buy', 10, 10.0)
+    tracer.submitted(trace, Order('o1', trace.client_order_id, 'accepted'))
+    clock.now = 2 * SECOND
+    tracer.onOrder(Order('o1', trace.client_order_id, 'filled', '10', '2019-06-04T14:00:09Z'))
+    assert trace.events['filled'] == 2 * SECOND
+
+
+def test_decide_with_a_known_client_order_id_returns_the_open_trace():
+    tracer = OrderTracer()
+    trace = tracer.decide('AAPL', 'buy', 10, 10.0, client_order_id='batch-1')
+    assert tracer.decide('AAPL', 'buy', 10, 10.0, client_order_id='batch-1') is trace
+    assert tracer.report()['default']['decided'] == 1
+
+
+def test_lifecycle_latencies_and_slippage():
+    clock = Clock()
+    tracer = OrderTracer(clock)
+    trace = tracer.decide('AAPL', 'buy', 10, 10.0, 'penny', 9.9)
+    clock.now = 1 * SECOND
+    tracer.submitting(trace)
+    clock.now = 3 * SECOND
+    tracer.submitted(trace, Order('o1', trace.client_order_id, 'accepted'))
+    assert (trace.latency('decision', 'submit'), trace.latency('submit', 'ack')) == (1.0, 2.0)
+    clock.now = 4 * SECOND
+    # Looked up by client_order_id when the order id is not known yet.
+    assert tracer.onOrder(Order('o1', trace.client_order_id, 'filled', '10'))
+    assert trace.slippage() == pytest.approx(100.0)
+    summary = tracer.report()['penny']
+    assert (summary['filled'], summary['fill_rate']) == (1, 1.0)
+    assert summary['slippage_bps'] == pytest.approx(100.0)
+
+
+def test_rejected_and_canceled_orders_count_as_unfilled():
+    tracer = OrderTracer()
+    first = tracer.decide('AAPL', 'buy', 10, 10.0)
+    tracer.rejected(first, 'insufficient buying power')
+    second = tracer.decide('MSFT', 'buy', 10, 10.0)
+    tracer.submitted(second, Order('o2', second.client_order_id, 'new'))
+    tracer.onOrder(Order('o2', second.client_order_id, 'canceled'))
+    assert tracer.report()['default']['unfilled'] == 2
+    assert tracer.open == {} and len(tracer.closed) == 2
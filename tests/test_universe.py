@@ -0,0 +1,102 @@
+import datetime
+
+import pytest
+
+from data.alpaca_data import Asset
+from data.universe import UniverseStore
+
+DAY = datetime.date(2019, 6, 3)
+
+
+def asset(symbol, tradable=True, status='active'):
+    return Asset('id-' + symbol, 'us_equity', 'NASDAQ', symbol, status, tradable, True, True, True)
+
+
+def assets(*symbols):
+    return [asset(symbol) for symbol in symbols]
+
+
+def universe(count):
+    return assets(*['S{:03d}'.format(i) for i in range(count)])
+
+
+def test_first_day_is_a_keyframe_then_deltas(tmp_path):
+    store = UniverseStore(str(tmp_path), keyframe_every=3)
+    days = [DAY + datetime.timedelta(days=i) for i in range(4)]
+    base = universe(10)
+    assert store.record(days[0], base) == 'key'
+    assert store.record(days[1], base + assets('NEW')) == 'delta'
+    assert store.record(days[2], base[1:] + assets('NEW')) == 'delta'
+    assert store.record(days[3], base) == 'key'
+    assert [kind for day, kind in store.index] == ['key', 'delta', 'delta', 'key']
+
+
+def test_large_change_is_stored_as_a_keyframe(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    store.record(DAY, assets('A', 'B'))
+    assert store.record(DAY + datetime.timedelta(days=1), assets('C', 'D')) == 'key'
+
+
+def test_as_of_rebuilds_from_the_keyframe(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    base = universe(10)
+    store.record(DAY, base)
+    store.record(DAY + datetime.timedelta(days=1), base + assets('NEW'))
+    store.record(DAY + datetime.timedelta(days=3), base[1:] + assets('NEW'))
+
+    # A fresh store has no cursor, so every date is rebuilt from disk.
+    fresh = UniverseStore(str(tmp_path))
+    assert fresh.asOf(DAY - datetime.timedelta(days=1)) == None
+    later = fresh.asOf(DAY + datetime.timedelta(days=3))
+    assert 'NEW' in later and 'S000' not in later
+    # Going backwards rebuilds from the keyframe, and the earlier result is untouched.
+    earlier = fresh.asOf(DAY + datetime.timedelta(days=2))
+    assert earlier.date == DAY + datetime.timedelta(days=1)
+    assert 'S000' in earlier and 'NEW' in earlier
+    assert 'S000' not in later
+    assert fresh.asOf(DAY).symbols() == sorted(asset.symbol for asset in base)
+
+
+def test_rows_round_trip_to_assets(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    store.record(DAY, [asset('A'), asset('B', tradable=False), asset('C', status='inactive')])
+    result = UniverseStore(str(tmp_path)).asOf(DAY)
+    assert [item.symbol for item in result.assets] == ['A', 'B', 'C']
+    assert result.assets[0].exchange == 'NASDAQ'
+    assert result.tradableSymbols() == ['A']
+    assert result.polygon_symbols == []
+
+
+def test_iterate_walks_each_recorded_day(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    base = universe(10)
+    for i in range(5):
+        store.record(DAY + datetime.timedelta(days=i), base + assets(*['X{}'.format(n) for n in range(i)]))
+    sizes = [(day, len(result)) for day, result in UniverseStore(str(tmp_path)).iterate(
+        DAY + datetime.timedelta(days=1), DAY + datetime.timedelta(days=3))]
+    assert sizes == [(DAY + datetime.timedelta(days=i), 10 + i) for i in (1, 2, 3)]
+
+
+def test_record_replaces_only_the_latest_day(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    base = universe(10)
+    store.record(DAY, base)
+    store.record(DAY + datetime.timedelta(days=1), base)
+    store.record(DAY + datetime.timedelta(days=1), base + assets('NEW'))
+    assert len(store) == 2
+    assert 'NEW' in store.asOf(DAY + datetime.timedelta(days=1))
+    with pytest.raises(ValueError):
+        store.record(DAY, base)
+
+
+def test_rerecording_a_day_as_the_other_kind_removes_the_old_file(tmp_path):
+    store = UniverseStore(str(tmp_path))
+    base = universe(10)
+    next_day = DAY + datetime.timedelta(days=1)
+    store.record(DAY, base)
+    assert store.record(next_day, base) == 'delta'
+    assert store.record(next_day, universe(30)) == 'key'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['2019-06-03.key', '2019-06-04.key', 'index.json']
+    assert store.record(next_day, base) == 'delta'
+    assert not (tmp_path / '2019-06-04.key').exists()
+    assert len(UniverseStore(str(tmp_path)).asOf(next_day)) == 10